@@ -0,0 +1,366 @@
+"""Batches of API requests, run in-process by the batch endpoint.
+
+Each request of a batch is sent through the ASGI app, as if it had been received
+on its own, with the headers of the batch request and its own. They skip the
+network round trip, and share the db session of the batch and the Users
+authenticated from their tokens, through a BatchContext set in request.state.
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from fastapi import Request, status
+from fastapi.concurrency import run_in_threadpool
+from starlette.types import Message
+
+from users_api import schemas
+from users_api.db import session
+from users_api.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Headers of the batch request that don't apply to the requests it holds
+SKIPPED_HEADERS = {b"content-length", b"content-type", b"transfer-encoding"}
+# Scope keys of the batch request copied to the requests it holds
+INHERITED_SCOPE_KEYS = ("asgi", "http_version", "scheme", "server", "client")
+# Paths of the endpoints streaming their responses, which a batch would have to
+# hold in memory, relative to the path of the batch endpoint's router
+STREAMING_PATHS = {"/users/export"}
+
+
+class ResponseTooLargeError(Exception):
+    """Raised when the responses of a batch take more memory than allowed."""
+
+
+class BatchContext:
+    """State shared by the requests of a batch."""
+
+    def __init__(self, db: Any):
+        """Create the context of a batch.
+
+        Args:
+            db (Any): The session shared by the requests of the batch
+        """
+        self.db = db
+        self.response_bytes = 0
+        self._users: dict[str, Any] = {}
+        self._lock = asyncio.Lock()
+
+    async def authenticate(
+        self, token: str, authenticate: Callable[[Any], Awaitable[Any]]
+    ) -> Any:
+        """Authenticate a token once for the whole batch.
+
+        Tokens are authenticated one at a time with the session of the batch, as
+        requests running concurrently have their own sessions. Failures aren't
+        remembered.
+
+        Args:
+            token (str): The JWT Bearer
+            authenticate (Callable[[Any], Awaitable[Any]]): Gets the User of a
+                token, given a session
+
+        Returns:
+            Any: The authenticated User
+        """
+        async with self._lock:
+            if token not in self._users:
+                self._users[token] = await authenticate(self.db)
+            return self._users[token]
+
+    def count_response_bytes(self, size: int) -> None:
+        """Count bytes of a response held in memory until the batch ends.
+
+        Args:
+            size (int): Bytes of a response
+
+        Raises:
+            ResponseTooLargeError: If the responses of the batch now take more
+                than BATCH_MAX_TOTAL_BYTES
+        """
+        self.response_bytes += size
+        if self.response_bytes > settings.BATCH_MAX_TOTAL_BYTES:
+            raise ResponseTooLargeError(
+                f"The responses of the batch take more than "
+                f"{settings.BATCH_MAX_TOTAL_BYTES} bytes"
+            )
+
+    def forget_users(self) -> None:
+        """Forget the authenticated Users, after rolling back the session."""
+        self._users.clear()
+
+
+def get_batch_context(request: Request) -> BatchContext | None:
+    """Get the context of the batch a request belongs to, if any."""
+    return getattr(request.state, "batch", None)
+
+
+def get_batch_db(request: Request) -> Any | None:
+    """Get the session a request of a batch shares with the others, if any."""
+    return getattr(request.state, "batch_db", None)
+
+
+class RollbackBatchError(Exception):
+    """Raised to roll back the transaction of a batch."""
+
+
+async def _run(method: Callable[[], Any]) -> Any:
+    """Call a method of a session or connection, in a threadpool if it's sync."""
+    if settings.DB_ASYNC:
+        return await method()
+    return await run_in_threadpool(method)
+
+
+@asynccontextmanager
+async def joined_transaction(db: Any) -> AsyncIterator[Any]:
+    """Open a session whose commits are all part of a single transaction.
+
+    The session is bound to a connection already in a transaction, so its
+    commits don't end it. The transaction is committed on exit, or rolled back
+    if an exception is raised.
+
+    Args:
+        db (Any): A session of the engine to connect to
+
+    Raises:
+        BaseException: Any exception raised by the block, after rolling back
+
+    Yields:
+        Any: The session
+    """
+    if settings.DB_ASYNC:
+        connection = await db.bind.connect()
+        session_factory = session.AsyncSessionLocal
+    else:
+        connection = await run_in_threadpool(db.get_bind().connect)
+        session_factory = session.SessionLocal
+    try:
+        transaction = await _run(connection.begin)
+        transaction_db = session_factory(bind=connection)
+        try:
+            yield transaction_db
+        except BaseException:
+            await _run(transaction_db.close)
+            if transaction.is_active:
+                await _run(transaction.rollback)
+            raise
+        await _run(transaction_db.close)
+        await _run(transaction.commit)
+    finally:
+        await _run(connection.close)
+
+
+def _decode_body(body: bytes, content_type: str) -> Any:
+    """Decode the body of a response: JSON if it is, else text, or None."""
+    if not body:
+        return None
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    return body.decode("utf-8", errors="replace")
+
+
+async def send_request(
+    request: Request, item: schemas.BatchRequest, state: dict[str, Any]
+) -> schemas.BatchResponse:
+    """Run a request of a batch through the app, and get its response.
+
+    Responses are held in memory, so they may take up to
+    BATCH_MAX_RESPONSE_BYTES each, and BATCH_MAX_TOTAL_BYTES for the batch.
+
+    Args:
+        request (Request): The batch request
+        item (schemas.BatchRequest): The request to run, relative to the path of
+            the batch endpoint's router
+        state (dict[str, Any]): The request.state of the request, with the
+            BatchContext of the batch
+
+    Raises:
+        ResponseTooLargeError: If the response takes more memory than allowed
+
+    Returns:
+        schemas.BatchResponse: Its response
+    """
+    base_path = request.scope["path"].rsplit("/", 1)[0]
+    path, _, query = item.path.partition("?")
+    path = base_path + path
+    body = b"" if item.body is None else json.dumps(item.body).encode()
+    extra_headers = {
+        name.lower().encode("latin-1"): value.encode("latin-1")
+        for name, value in item.headers.items()
+    }
+    if item.body is not None:
+        extra_headers.setdefault(b"content-type", b"application/json")
+    extra_headers[b"content-length"] = str(len(body)).encode()
+    headers = [
+        (name, value)
+        for name, value in request.scope["headers"]
+        if name not in SKIPPED_HEADERS and name not in extra_headers
+    ]
+    headers.extend(extra_headers.items())
+    scope = {
+        key: request.scope[key] for key in INHERITED_SCOPE_KEYS if key in request.scope
+    }
+    scope.update(
+        type="http",
+        method=item.method.value,
+        root_path=request.scope.get("root_path", ""),
+        path=path,
+        raw_path=path.encode(),
+        query_string=query.encode(),
+        headers=headers,
+        state=state,
+    )
+
+    body_sent = False
+
+    async def receive() -> Message:
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # There's nothing else to receive, until the response is sent
+        await asyncio.Event().wait()
+
+    context: BatchContext = state["batch"]
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    response_headers: dict[str, str] = {}
+    chunks: list[bytes] = []
+    size = 0
+
+    async def send(message: Message) -> None:
+        nonlocal status_code, size
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            for name, value in message.get("headers", []):
+                name, value = name.decode("latin-1"), value.decode("latin-1")
+                if name in response_headers:
+                    value = f"{response_headers[name]}, {value}"
+                response_headers[name] = value
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > settings.BATCH_MAX_RESPONSE_BYTES:
+                raise ResponseTooLargeError(
+                    f"The response of {item.method.value} {item.path} takes more "
+                    f"than {settings.BATCH_MAX_RESPONSE_BYTES} bytes"
+                )
+            context.count_response_bytes(len(chunk))
+            chunks.append(chunk)
+
+    try:
+        await request.app(scope, receive, send)
+    except ResponseTooLargeError:
+        raise
+    except Exception:
+        # A 500 response was already sent, as for any other request
+        logger.exception("Error in a request of a batch: %s %s", item.method, path)
+    response_headers.pop("content-length", None)
+    return schemas.BatchResponse(
+        status=status_code,
+        headers=response_headers,
+        body=_decode_body(b"".join(chunks), response_headers.get("content-type", "")),
+    )
+
+
+def _failed(response: schemas.BatchResponse) -> bool:
+    """Check whether the response of a request is an error."""
+    return response.status >= status.HTTP_400_BAD_REQUEST
+
+
+def _not_run(detail: str) -> schemas.BatchResponse:
+    """Build the response of a request discarded by the failure of another."""
+    return schemas.BatchResponse(
+        status=status.HTTP_424_FAILED_DEPENDENCY,
+        headers={"content-type": "application/json"},
+        body={"detail": detail},
+    )
+
+
+async def run_in_transaction(
+    request: Request, items: list[schemas.BatchRequest], db: Any
+) -> list[schemas.BatchResponse]:
+    """Run the requests of a batch one by one, in a single transaction.
+
+    The first request that fails rolls back the transaction. The responses of
+    the other requests are replaced by 424 responses.
+
+    Args:
+        request (Request): The batch request
+        items (list[schemas.BatchRequest]): The requests to run
+        db (Any): A session of the engine to run them with
+
+    Returns:
+        list[schemas.BatchResponse]: The response of each request
+    """
+    responses: list[schemas.BatchResponse] = []
+    try:
+        async with joined_transaction(db) as transaction_db:
+            context = BatchContext(transaction_db)
+            state = {"batch": context, "batch_db": transaction_db}
+            for item in items:
+                responses.append(await send_request(request, item, state))
+                if _failed(responses[-1]):
+                    raise RollbackBatchError
+    except RollbackBatchError:
+        failed = len(responses) - 1
+        return [
+            responses[i]
+            if i == failed
+            else _not_run(
+                f"Rolled back, as request {failed} failed"
+                if i < failed
+                else f"Not run, as request {failed} failed"
+            )
+            for i in range(len(items))
+        ]
+    return responses
+
+
+async def run_batch(
+    request: Request, items: list[schemas.BatchRequest], db: Any
+) -> list[schemas.BatchResponse]:
+    """Run the requests of a batch in order, sharing a session.
+
+    With DB_ASYNC, consecutive GET requests run concurrently instead, each with
+    its own session, as a session can't run queries concurrently. A failed
+    request doesn't stop the others.
+
+    Args:
+        request (Request): The batch request
+        items (list[schemas.BatchRequest]): The requests to run
+        db (Any): The session to share
+
+    Returns:
+        list[schemas.BatchResponse]: The response of each request
+    """
+    context = BatchContext(db)
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+
+    async def send_concurrently(item: schemas.BatchRequest) -> schemas.BatchResponse:
+        async with semaphore:
+            return await send_request(request, item, {"batch": context})
+
+    responses: list[schemas.BatchResponse] = []
+    while len(responses) < len(items):
+        start = end = len(responses)
+        if settings.DB_ASYNC:
+            while end < len(items) and items[end].method == schemas.BatchMethodEnum.get:
+                end += 1
+        if end - start > 1:
+            responses.extend(
+                await asyncio.gather(*map(send_concurrently, items[start:end]))
+            )
+            continue
+        response = await send_request(
+            request, items[start], {"batch": context, "batch_db": db}
+        )
+        responses.append(response)
+        if _failed(response):
+            # The session may be left in a failed transaction
+            await _run(db.rollback)
+            context.forget_users()
+    return responses
@@ -0,0 +1,143 @@
+"""Conditional GET requests, answered with 304 Not Modified when possible.
+
+Responses returning Users carry a strong ETag, derived from the uuid and
+updated_at of each User, and from anything else changing the response, like the
+returned fields. Responses returning a single User also carry a Last-Modified
+header, from its updated_at. Lists don't, as removing a User from a page doesn't
+change the latest updated_at of the page. When the If-None-Match or
+If-Modified-Since header of a request shows the client already has the current
+version, endpoints only need these two columns to answer, without loading or
+serializing the Users.
+"""
+
+import hashlib
+from collections.abc import Iterable, Mapping
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, NamedTuple
+
+from fastapi import Request, Response, status
+
+# Columns the validators of a response are derived from
+VALIDATOR_COLUMNS = ("uuid", "updated_at")
+
+
+class Validators(NamedTuple):
+    """The validators of a response."""
+
+    etag: str
+    last_modified: datetime | None
+
+    @property
+    def headers(self) -> dict[str, str]:
+        """Get the headers of the validators."""
+        headers = {"ETag": self.etag}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(
+                self.last_modified.replace(microsecond=0), usegmt=True
+            )
+        return headers
+
+
+def get_validators(
+    rows: Iterable[Any],
+    *,
+    variant: Iterable[Any] = (),
+    with_last_modified: bool = True,
+) -> Validators:
+    """Get the validators of a response returning some rows.
+
+    Args:
+        rows (Iterable[Any]): The rows, or mappings, with a uuid and an updated_at
+        variant (Iterable[Any]): Anything else changing the response, like the
+            returned fields. Defaults to nothing.
+        with_last_modified (bool): Whether to derive a modification date from
+            the latest updated_at. Lists shouldn't, as it doesn't change when a
+            row leaves them. Defaults to True.
+
+    Returns:
+        Validators: The validators
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(tuple(variant)).encode())
+    last_modified = None
+    for row in rows:
+        if isinstance(row, Mapping):
+            uuid, updated_at = row["uuid"], row["updated_at"]
+        else:
+            uuid, updated_at = row.uuid, row.updated_at
+        digest.update(uuid.bytes)
+        digest.update(updated_at.isoformat().encode())
+        if last_modified is None or updated_at > last_modified:
+            last_modified = updated_at
+    if not with_last_modified:
+        last_modified = None
+    return Validators(etag=f'"{digest.hexdigest()}"', last_modified=last_modified)
+
+
+def with_validator_columns(columns: Iterable[str]) -> tuple[str, ...]:
+    """Add the columns validators are derived from to the columns of a response."""
+    return tuple(dict.fromkeys([*columns, *VALIDATOR_COLUMNS]))
+
+
+def is_conditional(request: Request) -> bool:
+    """Check whether a request has any header a 304 response could answer."""
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag, with a weak comparison."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    """Check an If-Modified-Since header against a modification date."""
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        # Invalid dates are ignored
+        return False
+    if since.tzinfo is None:
+        return False
+    # Last-Modified has a resolution of a second
+    return last_modified.replace(microsecond=0) <= since
+
+
+def is_not_modified(request: Request, validators: Validators) -> bool:
+    """Check whether the client already has the current version of a response.
+
+    If-Modified-Since is ignored when If-None-Match is given, as the ETag is
+    more precise.
+
+    Args:
+        request (Request): The incoming request
+        validators (Validators): The validators of the current version
+
+    Returns:
+        bool: Whether a 304 response can be returned
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, validators.etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and validators.last_modified is not None:
+        return _not_modified_since(if_modified_since, validators.last_modified)
+    return False
+
+
+def not_modified(validators: Validators) -> Response:
+    """Build a 304 response, with the validators of the current version.
+
+    Args:
+        validators (Validators): The validators
+
+    Returns:
+        Response: The response
+    """
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers=validators.headers
+    )
@@ -1,28 +1,39 @@
 """API FastAPI dependencies."""
 
-from typing import Generator
+from typing import Any, AsyncGenerator, Generator
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
 from users_api import crud, schemas
-from users_api.db.session import SessionLocal
+from users_api.api import batch, security
+from users_api.db.session import AsyncSessionLocal, SessionLocal
 from users_api.models.user import User
 from users_api.settings import get_settings
 
 settings = get_settings()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="v1/auth/login")
 
+# Authenticated User: the User row, or a Principal with AUTH_STATELESS
+CurrentUser = User | schemas.Principal
 
-def get_db() -> Generator:
-    """Get a db Session.
+
+def get_sync_db(request: Request) -> Generator:
+    """Get a db Session, or the one shared by the requests of a batch.
+
+    Args:
+        request (Request): The incoming request
 
     Yields:
         Generator: A db Session as a generator
     """
+    batch_db = batch.get_batch_db(request)
+    if batch_db is not None:
+        yield batch_db
+        return
     try:
         db = SessionLocal()
         yield db
@@ -30,50 +41,199 @@ def get_db() -> Generator:
         db.close()
 
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
-    """Get current User based on JWT Bearer.
+async def get_async_db(request: Request) -> AsyncGenerator:
+    """Get an async db Session, or the one shared by the requests of a batch.
+
+    Args:
+        request (Request): The incoming request
+
+    Yields:
+        AsyncGenerator: An AsyncSession as an async generator
+    """
+    batch_db = batch.get_batch_db(request)
+    if batch_db is not None:
+        yield batch_db
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Session used by the API, AsyncSession when DB_ASYNC is enabled
+get_db = get_async_db if settings.DB_ASYNC else get_sync_db
+
+
+def decode_access_token(token: str) -> schemas.TokenData:
+    """Decode and validate a JWT Bearer.
 
     Args:
-        db (Session): A database session
         token (str): The JWT Bearer
 
     Raises:
-        HTTPException: When a resource with the given id is not found,
-            or invalid credentials were provided
+        HTTPException: If the token is invalid or expired
 
     Returns:
-        User: Current User
+        schemas.TokenData: The claims of the token
     """
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        token_data = schemas.TokenData(**payload)
+        return schemas.TokenData(**security.decode_access_token(token))
     except (jwt.JWTError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = crud.user.get_by_uuid(db, uuid=token_data.sub)
+
+
+async def load_user(db: Session, uuid: Any) -> User:
+    """Load a User from the cache, or from the db on a miss.
+
+    Args:
+        db (Session): A database session
+        uuid (Any): The uuid of the User
+
+    Raises:
+        HTTPException: If the User doesn't exist
+
+    Returns:
+        User: The User
+    """
+    user = await crud.user_cache.get_async(uuid)
+    if user is not None:
+        return user
+    # Taken before loading the User, so a write committed meanwhile keeps the
+    # outdated row out of the cache
+    lease = await crud.user_cache.lease_async(uuid)
+    user = await crud.async_user.get_by_uuid(db, uuid=uuid)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    if lease is not None:
+        await crud.user_cache.fill_async(lease, user)
     return user
 
 
-def get_current_superuser(current_user: User = Depends(get_current_user)) -> User:
+async def get_token_version(db: Session, uuid: Any) -> int:
+    """Get the token version of a User from the cache, or from the db on a miss.
+
+    Args:
+        db (Session): A database session
+        uuid (Any): The uuid of the User
+
+    Raises:
+        HTTPException: If the User doesn't exist
+
+    Returns:
+        int: The token version
+    """
+    version = await crud.token_version_cache.get_async(uuid)
+    if version is not None:
+        return version
+    # Taken before reading the version, so a password change committed meanwhile
+    # keeps the outdated version out of the cache
+    lease = await crud.token_version_cache.lease_async(uuid)
+    version = await crud.async_user.get_token_version(db, uuid=uuid)
+    if version is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if lease is not None:
+        await crud.token_version_cache.fill_async(uuid, lease, version)
+    return version
+
+
+async def authenticate(db: Session, token: str) -> CurrentUser:
+    """Get the User of a JWT Bearer.
+
+    With AUTH_STATELESS, a Principal built from the claims of the token is
+    returned instead of the User row.
+
+    Args:
+        db (Session): A database session
+        token (str): The JWT Bearer
+
+    Raises:
+        HTTPException: When a resource with the given id is not found,
+            or invalid credentials were provided
+
+    Returns:
+        CurrentUser: The User
+    """
+    token_data = decode_access_token(token)
+    if not settings.AUTH_STATELESS:
+        current_user = await load_user(db, token_data.sub)
+        version = current_user.token_version
+    elif token_data.is_superuser is None or token_data.token_version is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    else:
+        current_user = schemas.Principal(
+            uuid=token_data.sub,
+            is_superuser=token_data.is_superuser,
+            token_version=token_data.token_version,
+        )
+        version = token_data.token_version
+        if settings.AUTH_CHECK_TOKEN_VERSION:
+            version = await get_token_version(db, token_data.sub)
+    # Tokens issued before the version was bumped, e.g. by a password change, are
+    # revoked. Tokens without a version predate versioning
+    if token_data.token_version is not None and token_data.token_version != version:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    return current_user
+
+
+async def get_current_user(
+    request: Request, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> CurrentUser:
+    """Get current User based on JWT Bearer.
+
+    With AUTH_STATELESS, a Principal built from the claims of the token is
+    returned instead of the User row. Use get_user_row when the row is needed.
+    The requests of a batch authenticate each token once.
+
+    Args:
+        request (Request): The incoming request
+        db (Session): A database session
+        token (str): The JWT Bearer
+
+    Returns:
+        CurrentUser: Current User
+    """
+    context = batch.get_batch_context(request)
+    if context is not None:
+        return await context.authenticate(token, lambda db: authenticate(db, token))
+    return await authenticate(db, token)
+
+
+async def get_user_row(db: Session, current_user: CurrentUser) -> User:
+    """Get the User row of the current User, loading it if it's a Principal.
+
+    Args:
+        db (Session): A database session
+        current_user (CurrentUser): Current User
+
+    Returns:
+        User: The User row
+    """
+    if isinstance(current_user, User):
+        return current_user
+    return await load_user(db, current_user.uuid)
+
+
+def get_current_superuser(
+    current_user: CurrentUser = Depends(get_current_user),
+) -> CurrentUser:
     """Get current superuser based on JWT Bearer.
 
     Args:
-        current_user (User): Current User based on JWT Bearer.
+        current_user (CurrentUser): Current User based on JWT Bearer.
 
     Raises:
         HTTPException: When a resource with the given id is not found,
             or invalid credentials for superuser were provided
 
     Returns:
-        User: Current superuser
+        CurrentUser: Current superuser
     """
     if not current_user.is_superuser:
         raise HTTPException(
@@ -0,0 +1,101 @@
+"""Serialization of streamed rows, used by the export endpoints."""
+
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator
+from uuid import UUID
+
+from sqlalchemy.engine import Row
+
+
+class ExportFormatEnum(str, Enum):
+    """Formats that rows can be exported as."""
+
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormatEnum.ndjson: "application/x-ndjson",
+    ExportFormatEnum.csv: "text/csv",
+}
+
+# Leading characters making spreadsheets read a CSV cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _to_text(value: Any) -> Any:
+    """Convert the values JSON and CSV can't represent as the API does."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _to_csv_cell(value: Any) -> Any:
+    """Convert a value to a CSV cell, quoting text that would read as a formula."""
+    value = _to_text(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def encode_ndjson(
+    partitions: AsyncIterator[list[Row]], fields: dict[str, str]
+) -> AsyncIterator[str]:
+    """Encode batches of rows as newline delimited JSON.
+
+    Args:
+        partitions (AsyncIterator[list[Row]]): Batches of rows
+        fields (dict[str, str]): Output names, by column name
+
+    Yields:
+        str: One chunk of lines per batch
+    """
+    async for rows in partitions:
+        yield "".join(
+            json.dumps(
+                {alias: _to_text(getattr(row, name)) for name, alias in fields.items()},
+                separators=(",", ":"),
+            )
+            + "\n"
+            for row in rows
+        )
+
+
+async def encode_csv(
+    partitions: AsyncIterator[list[Row]], fields: dict[str, str]
+) -> AsyncIterator[str]:
+    """Encode batches of rows as CSV, with a header line.
+
+    Text starting like a formula is prefixed with a quote, so spreadsheets
+    opening the export show it as is instead of evaluating it.
+
+    Args:
+        partitions (AsyncIterator[list[Row]]): Batches of rows
+        fields (dict[str, str]): Output names, by column name
+
+    Yields:
+        str: The header, then one chunk of lines per batch
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields.values())
+    yield buffer.getvalue()
+    async for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            [_to_csv_cell(getattr(row, name)) for name in fields] for row in rows
+        )
+        yield buffer.getvalue()
+
+
+ENCODERS = {
+    ExportFormatEnum.ndjson: encode_ndjson,
+    ExportFormatEnum.csv: encode_csv,
+}
@@ -1,23 +1,299 @@
 """JWT Generation and password hashing."""
 
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import secrets
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
 from datetime import datetime, timedelta
-from typing import Any
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
 
-from jose import jwt
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
 from passlib.context import CryptContext
 
-from users_api.settings import get_settings
+from users_api.metrics import PASSWORD_HASHER_DURATION
+from users_api.settings import (
+    PasswordHasherExecutorEnum,
+    PasswordHashSchemeEnum,
+    get_settings,
+)
 
 settings = get_settings()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
-def create_access_token(data: str | Any, expires_delta: timedelta = None) -> str:
+def build_crypt_context(
+    scheme: PasswordHashSchemeEnum,
+    *,
+    bcrypt_rounds: int = 12,
+    argon2_time_cost: int = 3,
+    argon2_memory_cost: int = 65536,
+    argon2_parallelism: int = 4,
+) -> CryptContext:
+    """Build a CryptContext hashing new passwords with scheme and these costs.
+
+    Hashes of the other schemes are deprecated, and the costs are both the
+    minimum and the maximum allowed, so needs_update and verify_and_update flag
+    any hash that doesn't match the current configuration.
+
+    Args:
+        scheme (PasswordHashSchemeEnum): Scheme of new hashes
+        bcrypt_rounds (int): Log2 of the bcrypt iterations. Defaults to 12.
+        argon2_time_cost (int): Argon2 iterations. Defaults to 3.
+        argon2_memory_cost (int): Argon2 memory, in KiB. Defaults to 65536.
+        argon2_parallelism (int): Argon2 lanes. Defaults to 4.
+
+    Returns:
+        CryptContext: The context
+    """
+    schemes = [scheme.value] + [
+        other.value for other in PasswordHashSchemeEnum if other != scheme
+    ]
+    return CryptContext(
+        schemes=schemes,
+        default=scheme.value,
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__max_rounds=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+
+
+pwd_context = build_crypt_context(
+    settings.PASSWORD_HASH_SCHEME,
+    bcrypt_rounds=settings.BCRYPT_ROUNDS,
+    argon2_time_cost=settings.ARGON2_TIME_COST,
+    argon2_memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2_parallelism=settings.ARGON2_PARALLELISM,
+)
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised when too many password hashing jobs are already pending."""
+
+
+class PasswordHasher:
+    """Bounded worker pool used to run password hashing jobs.
+
+    Hashing is CPU bound, so running it in the event loop blocks every other
+    request handled by the same worker. Jobs are sent to a thread or process pool
+    instead, and new jobs are rejected when the queue is full.
+    """
+
+    def __init__(
+        self,
+        executor_type: PasswordHasherExecutorEnum = PasswordHasherExecutorEnum.thread,
+        max_workers: int | None = None,
+        max_queue: int = 0,
+    ):
+        """Create a PasswordHasher. The pool itself is started on first use.
+
+        Args:
+            executor_type (PasswordHasherExecutorEnum): Kind of pool to use
+            max_workers (int | None): Jobs that may run at once.
+                Defaults to the CPU count.
+            max_queue (int): Jobs that may wait for a free worker
+        """
+        self.executor_type = executor_type
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        """Get the worker pool, creating it if needed."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_type == PasswordHasherExecutorEnum.process:
+                        self._executor = ProcessPoolExecutor(self.max_workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            self.max_workers, thread_name_prefix="password-hasher"
+                        )
+        return self._executor
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        """Submit a job to the pool.
+
+        Args:
+            fn (Callable): Function to run. It must be picklable for process pools.
+            *args (Any): Arguments passed to fn
+
+        Raises:
+            PasswordHasherBusyError: If the queue is full
+
+        Returns:
+            Future: The submitted job
+        """
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusyError("Too many pending password hashing jobs")
+        future = None
+        start = time.perf_counter()
+        try:
+            future = self.executor.submit(fn, *args)
+        finally:
+            if future is None:
+                self._slots.release()
+
+        def job_done(_: Future) -> None:
+            self._slots.release()
+            elapsed = time.perf_counter() - start
+            PASSWORD_HASHER_DURATION.labels(fn.__name__.lstrip("_")).observe(elapsed)
+
+        future.add_done_callback(job_done)
+        return future
+
+    def run(self, fn: Callable, *args: Any) -> Any:
+        """Run a job in the pool and block until it finishes.
+
+        Args:
+            fn (Callable): Function to run
+            *args (Any): Arguments passed to fn
+
+        Returns:
+            Any: The value returned by fn
+        """
+        return self.submit(fn, *args).result()
+
+    async def run_async(self, fn: Callable, *args: Any) -> Any:
+        """Run a job in the pool without blocking the event loop.
+
+        Args:
+            fn (Callable): Function to run
+            *args (Any): Arguments passed to fn
+
+        Returns:
+            Any: The value returned by fn
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def shutdown(self) -> None:
+        """Stop the worker pool. It will be started again if used afterwards."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+hasher = PasswordHasher(
+    executor_type=settings.PASSWORD_HASHER_EXECUTOR,
+    max_workers=settings.PASSWORD_HASHER_WORKERS,
+    max_queue=settings.PASSWORD_HASHER_MAX_QUEUE,
+)
+
+
+# Members of each key type hashed into its RFC 7638 thumbprint
+THUMBPRINT_MEMBERS = {"RSA": ("e", "kty", "n"), "EC": ("crv", "kty", "x", "y")}
+
+
+class KeySet(NamedTuple):
+    """Keys signing and verifying access tokens, parsed once per process."""
+
+    signing_key: Key
+    # Key id of the signing key, sent in the kid header of tokens
+    kid: str | None
+    # Keys verifying tokens, by kid. Tokens without a kid use the None key
+    verification_keys: dict[str | None, Key]
+    # The public keys as a JSON encoded JWK Set, and its ETag
+    jwks: bytes
+    jwks_etag: str
+
+
+def jwk_thumbprint(key: Key) -> str:
+    """Get the RFC 7638 thumbprint of a public key, used as its key id.
+
+    Args:
+        key (Key): An RSA or EC public key
+
+    Returns:
+        str: The base64url encoded SHA-256 thumbprint
+    """
+    values = key.to_dict()
+    members = {name: values[name] for name in THUMBPRINT_MEMBERS[values["kty"]]}
+    encoded = json.dumps(members, separators=(",", ":"), sort_keys=True)
+    digest = hashlib.sha256(encoded.encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def _public_key(key: Key) -> Key:
+    """Get the public key of a key pair, so private values are never published."""
+    return key if key.is_public() else key.public_key()
+
+
+def _etag(content: bytes) -> str:
+    """Build a strong ETag from a hash of some content."""
+    return '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+
+@lru_cache(maxsize=1)
+def get_key_set() -> KeySet:
+    """Load the keys of settings.ALGORITHM.
+
+    Keys are parsed on the first call only, instead of on every encode and
+    decode.
+
+    Returns:
+        KeySet: The keys
+    """
+    algorithm = settings.ALGORITHM.value
+    if settings.ALGORITHM.is_symmetric:
+        key = jwk.construct(settings.SECRET_KEY, algorithm)
+        jwks = b'{"keys":[]}'
+        return KeySet(key, None, {None: key}, jwks, _etag(jwks))
+
+    signing_key = jwk.construct(settings.JWT_PRIVATE_KEY_FILE.read_text(), algorithm)
+    public_keys = [_public_key(signing_key)] + [
+        _public_key(jwk.construct(path.read_text(), algorithm))
+        for path in settings.JWT_PUBLIC_KEY_FILES
+    ]
+    kids = [jwk_thumbprint(key) for key in public_keys]
+    verification_keys: dict[str | None, Key] = dict(zip(kids, public_keys))
+    verification_keys[None] = public_keys[0]
+    jwks = json.dumps(
+        {
+            "keys": [
+                {**key.to_dict(), "kid": kid, "use": "sig"}
+                for kid, key in zip(kids, public_keys)
+            ]
+        },
+        separators=(",", ":"),
+    ).encode()
+    return KeySet(signing_key, kids[0], verification_keys, jwks, _etag(jwks))
+
+
+def create_access_token(
+    data: str | Any,
+    expires_delta: timedelta = None,
+    claims: dict[str, Any] | None = None,
+) -> str:
     """Create access token.
 
     Args:
         data (str | Any): Data to be encoded in token
         expires_delta (timedelta): Access token expire time
+        claims (dict[str, Any] | None): Extra claims, like is_superuser and
+            token_version, used by stateless authorization
 
     Returns:
         str: The generated access token
@@ -29,16 +305,104 @@ def create_access_token(data: str | Any, expires_delta: timedelta = None) -> str
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     to_encode = {"exp": expire, "sub": str(data)}
+    if claims:
+        to_encode.update(claims)
+    key_set = get_key_set()
     return jwt.encode(
         to_encode,
-        settings.SECRET_KEY,
-        algorithm=settings.ALGORITHM,
+        key_set.signing_key,
+        algorithm=settings.ALGORITHM.value,
+        headers={"kid": key_set.kid} if key_set.kid else None,
     )
 
 
+def decode_access_token(token: str) -> dict[str, Any]:
+    """Verify an access token, with the key matching its kid header.
+
+    Args:
+        token (str): The access token
+
+    Raises:
+        JWTError: If the token is invalid or expired, or its key is unknown
+
+    Returns:
+        dict[str, Any]: The claims of the token
+    """
+    key_set = get_key_set()
+    kid = jwt.get_unverified_header(token).get("kid")
+    key = key_set.verification_keys.get(kid)
+    if key is None:
+        raise JWTError(f"Unknown key id: {kid}")
+    return jwt.decode(token, key, algorithms=[settings.ALGORITHM.value])
+
+
+def generate_refresh_token() -> str:
+    """Generate an opaque refresh token.
+
+    Returns:
+        str: A random URL-safe token
+    """
+    return secrets.token_urlsafe(32)
+
+
+def hash_refresh_token(token: str) -> str:
+    """Hash a refresh token before storing or looking it up.
+
+    Refresh tokens are random and long, so a fast hash is enough to keep them
+    from being usable if the database leaks, and bcrypt isn't needed.
+
+    Args:
+        token (str): The refresh token
+
+    Returns:
+        str: Its SHA-256 hash, in hexadecimal
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Run pwd_context.verify. Defined at module level so process pools can use it."""
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Run pwd_context.verify_and_update. Defined at module level for process pools."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _dummy_verify_password() -> bool:
+    """Run pwd_context.dummy_verify. Defined at module level for process pools."""
+    return pwd_context.dummy_verify()
+
+
+def _get_password_hash(password: str) -> str:
+    """Run pwd_context.hash. Defined at module level so process pools can use it."""
+    return pwd_context.hash(password)
+
+
+def _get_password_hashes(passwords: list[str]) -> list[str]:
+    """Hash many passwords. Defined at module level so process pools can use it."""
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def _split(items: list, n: int) -> list[list]:
+    """Split items in up to n chunks of about the same size."""
+    size, extra = divmod(len(items), n)
+    chunks, start = [], 0
+    for i in range(min(n, len(items))):
+        end = start + size + (i < extra)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Compare plain_password vs hashed_password using pwd_context.
 
+    The comparison runs in the password hasher pool, blocking until it finishes.
+
     Args:
         plain_password (str): Password in plain text
         hashed_password (str): Previously hashed password
@@ -46,16 +410,233 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: Whether the password was successfully verified or not
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return hasher.run(_verify_password, plain_password, hashed_password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Compare plain_password vs hashed_password, rehashing it if it's outdated.
+
+    The comparison runs in the password hasher pool, blocking until it finishes.
+
+    Args:
+        plain_password (str): Password in plain text
+        hashed_password (str): Previously hashed password
+
+    Returns:
+        tuple[bool, str | None]: Whether the password was verified, and a new
+            hash if the previous one used another scheme or other costs
+    """
+    return hasher.run(_verify_and_update_password, plain_password, hashed_password)
+
+
+def dummy_verify_password() -> bool:
+    """Spend as long as verifying a password, when there's no hash to verify.
+
+    Used when a username doesn't exist, so failed logins take about the same time
+    whether it exists or not.
+
+    Returns:
+        bool: Always False
+    """
+    return hasher.run(_dummy_verify_password)
 
 
 def get_password_hash(password: str) -> str:
     """Return a hashed password using pwd_context.
 
+    The hash is computed in the password hasher pool, blocking until it finishes.
+
     Args:
         password (str): Password in plain text
 
     Returns:
         str: Hashed password using pwd_context
     """
-    return pwd_context.hash(password)
+    return hasher.run(_get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Compare plain_password vs hashed_password without blocking the event loop.
+
+    Args:
+        plain_password (str): Password in plain text
+        hashed_password (str): Previously hashed password
+
+    Returns:
+        bool: Whether the password was successfully verified or not
+    """
+    return await hasher.run_async(_verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Compare plain_password vs hashed_password without blocking the event loop.
+
+    Args:
+        plain_password (str): Password in plain text
+        hashed_password (str): Previously hashed password
+
+    Returns:
+        tuple[bool, str | None]: Whether the password was verified, and a new
+            hash if the previous one used another scheme or other costs
+    """
+    return await hasher.run_async(
+        _verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def dummy_verify_password_async() -> bool:
+    """Spend as long as verifying a password, without blocking the event loop.
+
+    Returns:
+        bool: Always False
+    """
+    return await hasher.run_async(_dummy_verify_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Return a hashed password without blocking the event loop.
+
+    Args:
+        password (str): Password in plain text
+
+    Returns:
+        str: Hashed password using pwd_context
+    """
+    return await hasher.run_async(_get_password_hash, password)
+
+
+def get_password_hashes(passwords: list[str]) -> list[str]:
+    """Return many hashed passwords, computed in parallel in the password hasher pool.
+
+    Passwords are split in one job per worker, so big batches don't fill the queue.
+
+    Args:
+        passwords (list[str]): Passwords in plain text
+
+    Returns:
+        list[str]: Hashed passwords, in the same order
+    """
+    futures = [
+        hasher.submit(_get_password_hashes, chunk)
+        for chunk in _split(passwords, hasher.max_workers)
+    ]
+    return [hashed for future in futures for hashed in future.result()]
+
+
+async def get_password_hashes_async(passwords: list[str]) -> list[str]:
+    """Return many hashed passwords without blocking the event loop.
+
+    Args:
+        passwords (list[str]): Passwords in plain text
+
+    Returns:
+        list[str]: Hashed passwords, in the same order
+    """
+    chunks = await asyncio.gather(
+        *(
+            hasher.run_async(_get_password_hashes, chunk)
+            for chunk in _split(passwords, hasher.max_workers)
+        )
+    )
+    return [hashed for chunk in chunks for hashed in chunk]
+
+
+def iter_password_hashes(
+    batches: Iterable[list[str]], password_hasher: PasswordHasher = hasher
+) -> Iterator[list[str]]:
+    """Hash batches of passwords in parallel, yielding the hashes in order.
+
+    Up to one batch per worker is hashed at once, so batches are read lazily and
+    the queue never fills up.
+
+    Args:
+        batches (Iterable[list[str]]): Batches of passwords in plain text
+        password_hasher (PasswordHasher): Pool to hash them in.
+            Defaults to the shared one.
+
+    Yields:
+        list[str]: The hashed passwords of each batch
+    """
+    pending: deque[Future] = deque()
+    for batch in batches:
+        if len(pending) >= password_hasher.max_workers:
+            yield pending.popleft().result()
+        pending.append(password_hasher.submit(_get_password_hashes, batch))
+    while pending:
+        yield pending.popleft().result()
+
+
+class HashCalibration(NamedTuple):
+    """Costs chosen by calibrate_password_hash, and how long a hash takes."""
+
+    params: dict[str, int]
+    seconds: float
+
+
+def measure_hash_time(context: CryptContext, samples: int = 3) -> float:
+    """Measure how long hashing a password takes in this process.
+
+    Args:
+        context (CryptContext): The context hashing the password
+        samples (int): Hashes to measure. Defaults to 3.
+
+    Returns:
+        float: The median time, in seconds
+    """
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration-password")
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def calibrate_password_hash(
+    scheme: PasswordHashSchemeEnum,
+    target: float,
+    *,
+    samples: int = 3,
+    argon2_memory_cost: int = 65536,
+    argon2_parallelism: int = 4,
+) -> HashCalibration:
+    """Find the highest cost hashing a password in at most target seconds.
+
+    The bcrypt rounds, or the Argon2 time cost with a fixed memory cost and
+    parallelism, are increased until hashing takes longer than target. If even
+    the lowest cost takes longer, it's returned anyway.
+
+    Args:
+        scheme (PasswordHashSchemeEnum): The scheme to calibrate
+        target (float): Time a hash may take, in seconds
+        samples (int): Hashes measured for each cost. Defaults to 3.
+        argon2_memory_cost (int): Argon2 memory, in KiB. Defaults to 65536.
+        argon2_parallelism (int): Argon2 lanes. Defaults to 4.
+
+    Returns:
+        HashCalibration: The costs, as build_crypt_context arguments, and the
+            time a hash takes with them
+    """
+    if scheme == PasswordHashSchemeEnum.bcrypt:
+        fixed: dict[str, int] = {}
+        cost_name, cost, max_cost = "bcrypt_rounds", 4, 31
+    else:
+        fixed = {
+            "argon2_memory_cost": argon2_memory_cost,
+            "argon2_parallelism": argon2_parallelism,
+        }
+        cost_name, cost, max_cost = "argon2_time_cost", 1, 1000
+    best = None
+    while cost <= max_cost:
+        params = {**fixed, cost_name: cost}
+        seconds = measure_hash_time(build_crypt_context(scheme, **params), samples)
+        if seconds > target and best is not None:
+            break
+        best = HashCalibration(params, seconds)
+        if seconds > target:
+            break
+        cost += 1
+    return best
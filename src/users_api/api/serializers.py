@@ -0,0 +1,201 @@
+"""Fast JSON serialization of rows, used by the endpoints returning Users.
+
+FastAPI validates the value returned by an endpoint into its response_model,
+converts it with jsonable_encoder, then encodes it with json.dumps, which takes
+most of the time of the endpoints returning many rows. A Serializer is compiled
+once from a response schema, and encodes rows straight to the same JSON, with
+the schema's camelCase aliases. Endpoints keep their response_model, which still
+documents the responses in the OpenAPI schema.
+"""
+
+import json
+from collections.abc import Iterable, Mapping
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Callable
+from uuid import UUID
+
+from fastapi import Response
+from pydantic import BaseModel
+
+from users_api.settings import get_settings
+
+try:
+    # orjson is an optional dependency, installed with the `json` extra
+    import orjson
+except ImportError:
+    orjson = None
+
+settings = get_settings()
+
+
+def _default(value: Any) -> Any:
+    """Convert the values JSON can't represent as jsonable_encoder does."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content as JSON, like JSONResponse, with orjson if it's installed.
+
+    Args:
+        content (Any): The content, made of JSON types, datetimes and UUIDs
+
+    Returns:
+        bytes: The UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+def _attrs_getter(names: list[str]) -> Callable[[Any], tuple]:
+    """Build a function getting the attributes of an object, as a tuple."""
+    get = attrgetter(*names)
+    if len(names) == 1:
+        return lambda obj: (get(obj),)
+    return get
+
+
+class Serializer:
+    """Encodes objects as JSON like a response schema, without validating them.
+
+    Objects may be ORM objects or rows, with a value for each field of the
+    schema, or mappings, where missing fields take their default value.
+    """
+
+    def __init__(
+        self,
+        schema: type[BaseModel],
+        many: bool = False,
+        fields: Iterable[str] | None = None,
+    ):
+        """Compile a Serializer for a schema.
+
+        Args:
+            schema (type[BaseModel]): The response schema. Its fields must not be
+                schemas themselves.
+            many (bool): Whether to encode lists of objects. Defaults to False.
+            fields (Iterable[str] | None): Names of the fields to encode.
+                Defaults to all the fields of the schema.
+
+        Raises:
+            ValueError: If a field of the schema is another schema
+        """
+        schema_fields = list(schema.__fields__.values())
+        for field in schema_fields:
+            if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+                raise ValueError(f"Nested schema in field {field.name} of {schema}")
+        if fields is not None:
+            selected = set(fields)
+            schema_fields = [field for field in schema_fields if field.name in selected]
+        self.schema = schema
+        self.many = many
+        # Names of the encoded fields, which objects must have as attributes
+        self.names = tuple(field.name for field in schema_fields)
+        self.partial = fields is not None
+        self._aliases = tuple(field.alias for field in schema_fields)
+        self._get_attrs = _attrs_getter(list(self.names))
+        self._defaults = tuple((field.name, field.default) for field in schema_fields)
+        self._projections: dict[tuple[str, ...], Serializer] = {}
+
+    def project(self, fields: str | None) -> "Serializer":
+        """Get a Serializer encoding only some of the fields, for sparse responses.
+
+        Args:
+            fields (str | None): Comma separated names or aliases of the fields,
+                as given by clients. Defaults to all the fields.
+
+        Raises:
+            ValueError: If a field is not in the schema
+
+        Returns:
+            Serializer: The Serializer of these fields
+        """
+        if fields is None:
+            return self
+        names = {}
+        for field in self.schema.__fields__.values():
+            names[field.name] = names[field.alias] = field.name
+        selected = set()
+        for name in filter(None, (name.strip() for name in fields.split(","))):
+            if name not in names:
+                raise ValueError(f"Unknown field: {name}")
+            selected.add(names[name])
+        if not selected:
+            raise ValueError("No fields requested")
+        key = tuple(name for name in self.names if name in selected)
+        if key not in self._projections:
+            self._projections[key] = Serializer(self.schema, self.many, fields=key)
+        return self._projections[key]
+
+    def to_dict(self, obj: Any) -> dict[str, Any]:
+        """Get the values of an object, by field alias.
+
+        Args:
+            obj (Any): The object
+
+        Returns:
+            dict[str, Any]: Its values
+        """
+        if isinstance(obj, Mapping):
+            values = tuple(obj.get(name, default) for name, default in self._defaults)
+        else:
+            values = self._get_attrs(obj)
+        return dict(zip(self._aliases, values))
+
+    def render(self, content: Any) -> bytes:
+        """Encode an object, or a list of them, as JSON.
+
+        Args:
+            content (Any): The object, or an iterable of them if many is set
+
+        Returns:
+            bytes: The UTF-8 encoded JSON
+        """
+        if self.many:
+            return dumps([self.to_dict(obj) for obj in content])
+        return dumps(self.to_dict(content))
+
+    def respond(
+        self,
+        content: Any,
+        response: Response | None = None,
+        *,
+        status_code: int = 200,
+    ) -> Any:
+        """Build the response of an endpoint.
+
+        When FAST_JSON_RESPONSES is disabled, content is returned as is, to be
+        validated and encoded by FastAPI, unless only some fields are encoded,
+        as the response then doesn't match the schema.
+
+        Args:
+            content (Any): What the endpoint returns
+            response (Response | None): The Response parameter of the endpoint,
+                whose headers and status code are kept. Defaults to None.
+            status_code (int): Status code of the endpoint. Defaults to 200.
+
+        Returns:
+            Any: The response, or content
+        """
+        if not settings.FAST_JSON_RESPONSES and not self.partial:
+            return content
+        fast_response = Response(
+            self.render(content), status_code=status_code, media_type="application/json"
+        )
+        if response is not None:
+            fast_response.headers.raw.extend(response.headers.raw)
+            if response.status_code:
+                fast_response.status_code = response.status_code
+        return fast_response
@@ -1,10 +1,10 @@
 """Endpoints related to Authentication."""
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from users_api import crud, schemas
+from users_api import crud, ratelimit, schemas
 from users_api.api import deps
 from users_api.api.security import create_access_token
 from users_api.models.user import User
@@ -15,22 +15,34 @@ router = APIRouter()
 @router.post(
     "/login",
     response_model=schemas.Token,
+    responses={status.HTTP_429_TOO_MANY_REQUESTS: {"model": schemas.APIMessage}},
     summary="Login",
-    description="Login",
+    description=(
+        "Login. Attempts are rate limited by client IP and by username, and "
+        "rejected with 429 and a `Retry-After` header beyond the limits."
+    ),
 )
 async def login_for_access_token(
-    db: Session = Depends(deps.get_db), form_data: OAuth2PasswordRequestForm = Depends()
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    form_data: OAuth2PasswordRequestForm = Depends(),
 ) -> schemas.Token:
     """Retrieve an existing User.
 
     Args:
+        request (Request): The request
         db (Session): A database session
         form_data (OAuth2PasswordRequestForm): form data containing User credentials
 
     Raises:
         HTTPException: If the User cannot be authenticated
     """
-    user: User = crud.user.authenticate(
+    # Checked before the password is hashed, so rejecting attempts is cheap
+    await ratelimit.login_limiter.check_async(
+        client_ip=request.client.host if request.client else None,
+        username=form_data.username,
+    )
+    user: User = await crud.async_user.authenticate(
         db, username=form_data.username, password=form_data.password
     )
     if not user:
@@ -39,5 +51,57 @@ async def login_for_access_token(
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data=user.uuid)
-    return schemas.Token(access_token=access_token, token_type="bearer")
+    access_token = create_access_token(
+        data=user.uuid,
+        claims={
+            "is_superuser": bool(user.is_superuser),
+            "token_version": user.token_version,
+        },
+    )
+    refresh_token = await crud.async_refresh_token.issue(db, user_id=user.id)
+    return schemas.Token(
+        access_token=access_token, token_type="bearer", refresh_token=refresh_token
+    )
+
+
+@router.post(
+    "/refresh",
+    response_model=schemas.Token,
+    responses={status.HTTP_401_UNAUTHORIZED: {"model": schemas.APIMessage}},
+    summary="Refresh an access token",
+    description=(
+        "Exchange a refresh token for a new access token and a new refresh token. "
+        "Each refresh token can only be used once."
+    ),
+)
+async def refresh_access_token(
+    token_in: schemas.RefreshTokenIn, db: Session = Depends(deps.get_db)
+) -> schemas.Token:
+    """Rotate a refresh token, without checking the User's password.
+
+    Args:
+        token_in (schemas.RefreshTokenIn): The refresh token
+        db (Session): A database session
+
+    Raises:
+        HTTPException: If the refresh token is unknown, expired or already used
+    """
+    rotated = await crud.async_refresh_token.rotate(db, token=token_in.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    access_token = create_access_token(
+        data=rotated.user_uuid,
+        claims={
+            "is_superuser": rotated.is_superuser,
+            "token_version": rotated.token_version,
+        },
+    )
+    return schemas.Token(
+        access_token=access_token,
+        token_type="bearer",
+        refresh_token=rotated.refresh_token,
+    )
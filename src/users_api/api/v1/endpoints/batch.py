@@ -0,0 +1,76 @@
+"""Endpoint running many requests at once."""
+
+from typing import Any
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, status
+from sqlalchemy.orm import Session
+
+from users_api import schemas
+from users_api.api import batch, deps
+from users_api.settings import get_settings
+
+settings = get_settings()
+router = APIRouter()
+
+
+@router.post(
+    "",
+    response_model=list[schemas.BatchResponse],
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"model": schemas.APIMessage},
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE: {"model": schemas.APIMessage},
+    },
+    summary="Run many requests at once",
+    description=(
+        "Run requests to any endpoint under /v1 in a single HTTP request, and get "
+        "the response of each one, in order. They're sent with the headers of "
+        "this request, share its database session, and authenticate each token "
+        "once. With `transaction`, they run in a single database transaction, "
+        "which is rolled back as soon as one of them fails."
+    ),
+)
+async def run_batch(
+    *,
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    requests: list[schemas.BatchRequest] = Body(
+        ..., min_items=1, max_items=settings.BATCH_MAX_REQUESTS
+    ),
+    transaction: bool = Body(False),
+) -> Any:
+    """Run many requests.
+
+    Args:
+        request (Request): The incoming request
+        db (Session): A database session
+        requests (list[schemas.BatchRequest]): The requests to run
+        transaction (bool): Whether to run them in a single transaction
+
+    Raises:
+        HTTPException: List of exceptions:
+            - HTTP_400_BAD_REQUEST: If a request is another batch, or streams
+                its response.
+            - HTTP_413_REQUEST_ENTITY_TOO_LARGE: If the responses take more
+                memory than allowed.
+    """
+    for item in requests:
+        path = item.path.partition("?")[0]
+        if path == "/batch" or path.startswith("/batch/"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Batches can't be nested",
+            )
+        if path.rstrip("/") in batch.STREAMING_PATHS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Streamed responses can't be batched",
+            )
+
+    try:
+        if transaction:
+            return await batch.run_in_transaction(request, requests, db)
+        return await batch.run_batch(request, requests, db)
+    except batch.ResponseTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
@@ -1,83 +1,285 @@
 """Endpoints related to Users."""
 
 import uuid
+from datetime import datetime
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from users_api import crud, models, schemas
-from users_api.api import deps
+from users_api import crud, schemas
+from users_api.api import conditional, deps
+from users_api.api.export import ENCODERS, MEDIA_TYPES, ExportFormatEnum
+from users_api.api.serializers import Serializer, dumps
+from users_api.crud.pagination import InvalidCursorError, OrderByEnum
+from users_api.settings import get_settings
 
+settings = get_settings()
 router = APIRouter()
 
+# Columns included in exports, and their output names
+EXPORT_FIELDS = {
+    name: field.alias for name, field in schemas.UserList.__fields__.items()
+}
+
+# Encoders of the Users returned by each endpoint, skipping their validation
+USER_GET = Serializer(schemas.UserGet)
+USER_LIST = Serializer(schemas.UserList, many=True)
+USER_CREATE_OUT = Serializer(schemas.UserCreateOut)
+USER_UPDATE_OUT = Serializer(schemas.UserUpdateOut)
+
+FIELDS_DESCRIPTION = (
+    "Comma separated fields to return, e.g. `uuid,username`. Defaults to all."
+)
+
+
+def project(serializer: Serializer, fields: str | None) -> Serializer:
+    """Get the Serializer of the fields requested by a client.
+
+    Args:
+        serializer (Serializer): Serializer of every field
+        fields (str | None): The fields query parameter
+
+    Raises:
+        HTTPException: HTTP_400_BAD_REQUEST if a field is unknown
+
+    Returns:
+        Serializer: The Serializer of the requested fields
+    """
+    try:
+        return serializer.project(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {media_type: {} for media_type in MEDIA_TYPES.values()}
+        }
+    },
+    summary="Export all Users",
+    description=(
+        "Stream every User as newline delimited JSON or CSV. Rows are read from a "
+        "server-side cursor, so memory use doesn't grow with the number of Users."
+    ),
+)
+async def export(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_superuser: deps.CurrentUser = Depends(deps.get_current_superuser),
+    export_format: ExportFormatEnum = Query(ExportFormatEnum.ndjson, alias="format"),
+) -> Any:
+    """Export all users.
+
+    Args:
+        db (Session): A database session
+        current_superuser (deps.CurrentUser): Currently logged in superuser
+        export_format (ExportFormatEnum): Output format
+    """
+    partitions = crud.async_user.stream(
+        db, columns=EXPORT_FIELDS, batch_size=settings.EXPORT_BATCH_SIZE
+    )
+    return StreamingResponse(
+        ENCODERS[export_format](partitions, EXPORT_FIELDS),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="users.{export_format.value}"'
+        },
+    )
+
 
 @router.get(
     "/{user_id}",
     response_model=schemas.UserGet,
     responses={
+        status.HTTP_400_BAD_REQUEST: {"model": schemas.APIMessage},
         status.HTTP_403_FORBIDDEN: {"model": schemas.APIMessage},
         status.HTTP_404_NOT_FOUND: {"model": schemas.APIMessage},
     },
     summary="Retrieve a single User by UUID",
-    description="Retrieve single a User by UUID",
+    description=(
+        "Retrieve single a User by UUID. Responses have `ETag` and `Last-Modified` "
+        "headers. Requests with a matching `If-None-Match` or `If-Modified-Since` "
+        "header get a 304 response instead."
+    ),
 )
 async def get(
     *,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: deps.CurrentUser = Depends(deps.get_current_user),
     user_id: uuid.UUID,
+    fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
 ) -> Any:
     """Retrieve an existing User.
 
     Args:
+        request (Request): The incoming request
+        response (Response): The outgoing response
         db (Session): A database session
-        current_user (models.User): Logged in User
+        current_user (deps.CurrentUser): Logged in User
         user_id (uuid.UUID): The uuid of the user to retrieve
+        fields (str | None): Comma separated fields to return
 
     Raises:
         HTTPException: List of exceptions:
+            - HTTP_400_BAD_REQUEST: If a field is unknown.
             - HTTP_403_FORBIDDEN: If the user doesn't have enough privileges.
             - HTTP_404_NOT_FOUND: If the user does not exist.
     """
+    serializer = project(USER_GET, fields)
     if current_user.uuid == user_id:
-        return current_user
-
-    if not current_user.is_superuser:
+        db_user = await deps.get_user_row(db, current_user)
+    elif not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough privileges",
         )
-
-    db_user = crud.user.get_by_uuid(db, uuid=user_id)
-    if db_user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
+    else:
+        if conditional.is_conditional(request):
+            # Check the validators first, without loading the whole row
+            db_user = await crud.async_user.get_row_by_uuid(
+                db, uuid=user_id, columns=conditional.VALIDATOR_COLUMNS
+            )
+            if db_user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found",
+                )
+            validators = conditional.get_validators([db_user], variant=serializer.names)
+            if conditional.is_not_modified(request, validators):
+                return conditional.not_modified(validators)
+
+        # Only the columns of the response, without loading an ORM object
+        db_user = await crud.async_user.get_row_by_uuid(
+            db,
+            uuid=user_id,
+            columns=conditional.with_validator_columns(serializer.names),
         )
+        if db_user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found",
+            )
 
-    return db_user
+    validators = conditional.get_validators([db_user], variant=serializer.names)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    response.headers.update(validators.headers)
+    return serializer.respond(db_user, response)
 
 
 @router.get(
     "",
     response_model=list[schemas.UserList],
+    responses={status.HTTP_400_BAD_REQUEST: {"model": schemas.APIMessage}},
     summary="List Users",
-    description="Get a list of Users",
+    description=(
+        "Get a page of Users. If there are more Users, the response includes a "
+        '`Link` header with `rel="next"`, pointing to the next page. Pages have '
+        "`ETag` and `Last-Modified` headers, as single Users do."
+    ),
 )
-def retrieve_many(
+async def retrieve_many(
+    *,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-    current_superuser: models.User = Depends(deps.get_current_superuser),
+    current_superuser: deps.CurrentUser = Depends(deps.get_current_superuser),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: str | None = Query(None, description="Cursor to the requested page"),
+    order_by: OrderByEnum = OrderByEnum.created_at,
+    descending: bool = False,
+    username: str | None = Query(None, description="Username prefix"),
+    is_superuser: bool | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
 ) -> Any:
-    """Retrieve many users.
+    """Retrieve a page of users.
 
     Args:
+        request (Request): The incoming request
+        response (Response): The outgoing response
         db (Session): A database session
-        current_superuser (models.User): Currently logged in superuser
+        current_superuser (deps.CurrentUser): Currently logged in superuser
+        limit (int): Page size
+        cursor (str | None): Cursor to the requested page, taken from a
+            previous page's `Link` header
+        order_by (OrderByEnum): Ordering key
+        descending (bool): Whether to sort in descending order
+        username (str | None): Only list Users whose username starts with this
+        is_superuser (bool | None): Only list Users with this superuser status
+        created_after (datetime | None): Only list Users created at or after this
+        created_before (datetime | None): Only list Users created before this
+        fields (str | None): Comma separated fields to return
+
+    Raises:
+        HTTPException: List of exceptions:
+            - HTTP_400_BAD_REQUEST: If the cursor or a field is invalid.
     """
-    instance_list = crud.user.get_multi(db)
-    return instance_list
+    serializer = project(USER_LIST, fields)
+    page_query = {
+        "limit": limit,
+        "cursor": cursor,
+        "order_by": order_by,
+        "descending": descending,
+        "filters": {
+            "username__startswith": username,
+            "is_superuser": is_superuser,
+            "created_at__gte": created_after,
+            "created_at__lt": created_before,
+        },
+    }
+    try:
+        if conditional.is_conditional(request):
+            # Check the validators first, without loading the whole rows
+            page = await crud.async_user.get_page(
+                db, **page_query, columns=conditional.VALIDATOR_COLUMNS
+            )
+            validators = conditional.get_validators(
+                page.items,
+                variant=(*serializer.names, page.next_cursor),
+                with_last_modified=False,
+            )
+            if conditional.is_not_modified(request, validators):
+                return conditional.not_modified(validators)
+
+        page = await crud.async_user.get_page(
+            db,
+            **page_query,
+            columns=conditional.with_validator_columns(serializer.names),
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    validators = conditional.get_validators(
+        page.items,
+        variant=(*serializer.names, page.next_cursor),
+        with_last_modified=False,
+    )
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    response.headers.update(validators.headers)
+    if page.next_cursor is not None:
+        next_url = request.url.include_query_params(cursor=page.next_cursor)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return serializer.respond(page.items, response)
 
 
 @router.post(
@@ -104,13 +306,122 @@ async def create(
             - HTTP_400_BAD_REQUEST: If username already exists.
     """
     try:
-        db_user = crud.user.create(db, obj_in=user_in)
+        db_user = await crud.async_user.create(db, obj_in=user_in)
     except IntegrityError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"User with username '{user_in.username}' already exists",
         )
-    return db_user
+    return USER_CREATE_OUT.respond(db_user, status_code=status.HTTP_201_CREATED)
+
+
+@router.post(
+    "/bulk",
+    response_model=list[schemas.UserBulkCreateOut],
+    summary="Create many Users",
+    description=(
+        "Create many Users at once. Users whose username is already taken are "
+        "reported as duplicates instead of failing the whole batch."
+    ),
+)
+async def create_many(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_superuser: deps.CurrentUser = Depends(deps.get_current_superuser),
+    users_in: list[schemas.UserCreateIn] = Body(
+        ..., min_items=1, max_items=settings.BULK_CREATE_MAX_ITEMS
+    ),
+) -> Any:
+    """Create many new users.
+
+    Args:
+        db (Session): A database session
+        current_superuser (deps.CurrentUser): Currently logged in superuser
+        users_in (list[schemas.UserCreateIn]): Input data
+    """
+    db_users = await crud.async_user.create_multi(db, objs_in=users_in)
+    return [
+        schemas.UserBulkCreateOut(
+            index=i,
+            username=user_in.username,
+            status=(
+                schemas.UserBulkCreateStatusEnum.duplicate
+                if db_user is None
+                else schemas.UserBulkCreateStatusEnum.created
+            ),
+            user=db_user and schemas.UserCreateOut.from_orm(db_user),
+        )
+        for i, (user_in, db_user) in enumerate(zip(users_in, db_users))
+    ]
+
+
+@router.post(
+    "/lookup",
+    response_model=list[schemas.UserLookupOut],
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"model": schemas.APIMessage},
+        status.HTTP_403_FORBIDDEN: {"model": schemas.APIMessage},
+    },
+    summary="Retrieve many Users by UUID",
+    description=(
+        "Retrieve many Users at once, with a single query. Results are in the order "
+        "of the given UUIDs, and UUIDs without a User are reported as not found. "
+        "Users who aren't superusers can only look up themselves."
+    ),
+)
+async def lookup(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: deps.CurrentUser = Depends(deps.get_current_user),
+    user_ids: list[uuid.UUID] = Body(
+        ..., min_items=1, max_items=settings.LOOKUP_MAX_ITEMS
+    ),
+    fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
+) -> Any:
+    """Retrieve many existing Users.
+
+    Args:
+        db (Session): A database session
+        current_user (deps.CurrentUser): Logged in User
+        user_ids (list[uuid.UUID]): The uuids of the users to retrieve
+        fields (str | None): Comma separated fields to return
+
+    Raises:
+        HTTPException: List of exceptions:
+            - HTTP_400_BAD_REQUEST: If a field is unknown.
+            - HTTP_403_FORBIDDEN: If the user doesn't have enough privileges.
+    """
+    serializer = project(USER_GET, fields)
+    if not current_user.is_superuser and any(
+        user_id != current_user.uuid for user_id in user_ids
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough privileges",
+        )
+
+    # uuid is needed to match rows with user_ids, even if it wasn't requested
+    rows = await crud.async_user.get_rows_by_uuids(
+        db,
+        uuids=set(user_ids),
+        columns=tuple(dict.fromkeys([*serializer.names, "uuid"])),
+    )
+    users = {row.uuid: serializer.to_dict(row) for row in rows}
+    results = [
+        {
+            "uuid": user_id,
+            "status": (
+                schemas.UserLookupStatusEnum.found.value
+                if user_id in users
+                else schemas.UserLookupStatusEnum.not_found.value
+            ),
+            "user": users.get(user_id),
+        }
+        for user_id in user_ids
+    ]
+    if not settings.FAST_JSON_RESPONSES and not serializer.partial:
+        return results
+    return Response(dumps(results), media_type="application/json")
 
 
 @router.put(
@@ -126,7 +437,7 @@ async def create(
 async def update(
     *,
     db: Session = Depends(deps.get_db),
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: deps.CurrentUser = Depends(deps.get_current_user),
     user_id: uuid.UUID,
     user_in: schemas.UserUpdateIn,
 ) -> Any:
@@ -134,7 +445,7 @@ async def update(
 
     Args:
         db (Session): A database session
-        current_user (models.User): Logged in User
+        current_user (deps.CurrentUser): Logged in User
         user_id (uuid.UUID): The uuid of the user to modify
         user_in (schemas.UserUpdateIn): The new data
 
@@ -143,24 +454,26 @@ async def update(
             - HTTP_403_FORBIDDEN: If the user doesn't have enough privileges.
             - HTTP_404_NOT_FOUND: If the user does not exist.
     """
-    if current_user.uuid == user_id:
-        db_user = current_user
-    elif current_user.is_superuser:
-        db_user = crud.user.get_by_uuid(db, uuid=user_id)
-    else:
+    if current_user.uuid != user_id and not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough privileges",
         )
 
-    if db_user is None:
+    # A single UPDATE ... RETURNING, no need to load the User first
+    updated_instance = await crud.async_user.update_by_uuid(
+        db,
+        uuid=user_id,
+        obj_in=user_in,
+        columns=schemas.UserUpdateOut.__fields__,
+    )
+    if updated_instance is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-    updated_instance = crud.user.update(db, db_obj=db_user, obj_in=user_in)
 
-    return updated_instance
+    return USER_UPDATE_OUT.respond(updated_instance)
 
 
 @router.put(
@@ -177,7 +490,7 @@ async def update(
 async def update_password(
     *,
     db: Session = Depends(deps.get_db),
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: deps.CurrentUser = Depends(deps.get_current_user),
     user_id: uuid.UUID,
     update_password_data: schemas.UserUpdatePasswordIn,
 ) -> Any:
@@ -185,7 +498,7 @@ async def update_password(
 
     Args:
         db (Session): A database session
-        current_user (models.User): Logged in User
+        current_user (deps.CurrentUser): Logged in User
         user_id (uuid.UUID): The uuid of the user to modify
         update_password_data (schemas.UserUpdatePasswordIn): The update password data
 
@@ -195,23 +508,21 @@ async def update_password(
             - HTTP_403_FORBIDDEN: If the user doesn't have enough privileges.
             - HTTP_404_NOT_FOUND: If the user does not exist.
     """
-    if current_user.uuid == user_id:
-        db_user = current_user
-    elif current_user.is_superuser:
-        db_user = crud.user.get_by_uuid(db, uuid=user_id)
-    else:
+    if current_user.uuid != user_id and not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough privileges",
         )
 
+    # Loaded from the db, as cached Users have no password hash
+    db_user = await crud.async_user.get_by_uuid(db, uuid=user_id)
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
 
-    if not current_user.is_superuser and not db_user.verify_password(
+    if not current_user.is_superuser and not await db_user.verify_password_async(
         update_password_data.old_password
     ):
         raise HTTPException(
@@ -219,9 +530,12 @@ async def update_password(
             detail="Submitted password does not match",
         )
 
-    crud.user.update_password(
+    await crud.async_user.update_password(
         db, db_user=db_user, new_password=update_password_data.new_password
     )
+    if update_password_data.new_password:
+        # Sessions started with the old password can't be extended anymore
+        await crud.async_refresh_token.revoke_user_tokens(db, user_id=db_user.id)
 
     return schemas.UserUpdatePasswordOut(detail="Password updated successfully")
 
@@ -239,14 +553,14 @@ async def update_password(
 async def delete(
     *,
     db: Session = Depends(deps.get_db),
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: deps.CurrentUser = Depends(deps.get_current_user),
     user_id: uuid.UUID,
 ) -> Any:
     """Update an existing User.
 
     Args:
         db (Session): A database session
-        current_user (models.User): Logged in User
+        current_user (deps.CurrentUser): Logged in User
         user_id (uuid.UUID): The uuid of the user to modify
 
     Raises:
@@ -254,20 +568,19 @@ async def delete(
             - HTTP_403_FORBIDDEN: If the user doesn't have enough privileges.
             - HTTP_404_NOT_FOUND: If provided user_id doesn't exist.
     """
-    if current_user.uuid == user_id:
-        db_user = current_user
-    elif current_user.is_superuser:
-        db_user = crud.user.get_by_uuid(db, uuid=user_id)
-    else:
+    if current_user.uuid != user_id and not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough privileges",
         )
 
-    if db_user is None:
+    # A single DELETE ... RETURNING, no need to load the User first
+    removed_id = await crud.async_user.remove_by_uuid(db, uuid=user_id)
+    if removed_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
 
-    crud.user.remove(db, id=db_user.id)
+    # Returning None would send a "null" body, which 204 responses can't have
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
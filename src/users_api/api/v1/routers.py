@@ -2,8 +2,9 @@
 
 from fastapi import APIRouter
 
-from users_api.api.v1.endpoints import auth, users
+from users_api.api.v1.endpoints import auth, batch, users
 
 router = APIRouter()
 router.include_router(users.router, prefix="/users", tags=["users"])
 router.include_router(auth.router, prefix="/auth", tags=["auth"])
+router.include_router(batch.router, prefix="/batch", tags=["batch"])
@@ -1,12 +1,21 @@
 """API initialization and setup file."""
 
-from fastapi import FastAPI
+import logging
+import math
 
+from fastapi import Depends, FastAPI, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from users_api import crud, metrics, ratelimit
+from users_api.api import deps, security
 from users_api.api.v1.routers import router
-from users_api.schemas import ApiVersionModel
+from users_api.db import session
+from users_api.schemas import ApiVersionModel, CacheStats
 from users_api.settings import EnvironmentEnum, Settings, get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Users API",
@@ -16,6 +25,85 @@ app = FastAPI(
     root_path=settings.ROOT_PATH,
 )
 app.include_router(router, prefix="/v1")
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.PrometheusMiddleware)
+
+
+@app.exception_handler(security.PasswordHasherBusyError)
+async def password_hasher_busy_handler(
+    request: Request, exc: security.PasswordHasherBusyError
+) -> JSONResponse:
+    """Ask clients to retry later when the password hashing queue is full."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server busy, please try again later"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(ratelimit.RateLimitExceededError)
+async def rate_limit_exceeded_handler(
+    request: Request, exc: ratelimit.RateLimitExceededError
+) -> JSONResponse:
+    """Tell clients when they may try again after exceeding a rate limit."""
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many attempts, please try again later"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
+@app.on_event("startup")
+async def warm_up_db_pool():
+    """Open DB_POOL_WARMUP connections, so the first requests don't wait for them."""
+    if not settings.DB_POOL_WARMUP:
+        return
+    try:
+        if settings.DB_ASYNC:
+            await session.warm_up_async_pool(
+                session.async_engine, settings.DB_POOL_WARMUP
+            )
+        else:
+            await run_in_threadpool(
+                session.warm_up_pool, session.engine, settings.DB_POOL_WARMUP
+            )
+    except Exception:
+        # Requests will open connections as needed if the database isn't up yet
+        logger.exception("Could not warm up the database connection pool")
+
+
+def _build_username_filter() -> None:
+    """Load every username into the username filter, with a sync session."""
+    with session.SessionLocal() as db:
+        crud.user.refresh_username_filter(db)
+
+
+@app.on_event("startup")
+async def build_username_filter():
+    """Load every username into the username filter, if it's enabled."""
+    if crud.username_filter is None:
+        return
+    try:
+        if settings.DB_ASYNC:
+            async with session.AsyncSessionLocal() as db:
+                await crud.async_user.refresh_username_filter(db)
+        else:
+            await run_in_threadpool(_build_username_filter)
+    except Exception:
+        # Logins query the db for every username until the worker is restarted
+        logger.exception("Could not build the username filter")
+
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    """Stop the password hashing pool."""
+    security.hasher.shutdown()
+
+
+@app.on_event("shutdown")
+def mark_metrics_process_dead():
+    """Remove the live gauges of this worker from multiprocess metrics."""
+    metrics.mark_process_dead()
 
 
 @app.get("/version", tags=["version"], response_model=ApiVersionModel)
@@ -26,6 +114,41 @@ def get_api_version():
     )
 
 
+@app.get("/.well-known/jwks.json", tags=["auth"], response_class=Response)
+def get_jwks(request: Request):
+    """Get the public keys verifying access tokens, as a JWK Set."""
+    key_set = security.get_key_set()
+    headers = {
+        "Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE}",
+        "ETag": key_set.jwks_etag,
+    }
+    if request.headers.get("if-none-match") == key_set.jwks_etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(
+        content=key_set.jwks, media_type="application/json", headers=headers
+    )
+
+
+@app.get(
+    "/cache",
+    tags=["cache"],
+    response_model=CacheStats,
+    dependencies=[Depends(deps.get_current_superuser)],
+)
+def get_cache_stats():
+    """Get the hit and miss counters of the User cache. Superusers only."""
+    return crud.user_cache.stats()
+
+
+if settings.METRICS_ENABLED:
+
+    @app.get("/metrics", tags=["metrics"], response_class=Response)
+    def get_metrics():
+        """Get Prometheus metrics."""
+        data, content_type = metrics.generate_metrics()
+        return Response(content=data, media_type=content_type)
+
+
 if settings.ENVIRONMENT == EnvironmentEnum.development:
 
     @app.get("/settings", tags=["settings"], response_model=Settings)
@@ -0,0 +1,10 @@
+"""Benchmarks of the API endpoints.
+
+Seeds the database with Users, drives a mixed workload against a running API
+with concurrent async clients, and reports throughput and latency percentiles
+per route as JSON. Run it with `manage bench`. The workload, in
+`users_api.bench.workload`, requires the `bench` extra, so it isn't imported here.
+"""
+
+from .report import Recorder, compare_reports, summarize
+from .seed import Seed, SeedUser, seed_users
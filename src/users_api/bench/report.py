@@ -0,0 +1,136 @@
+"""Collect request latencies and summarize them as comparable JSON reports."""
+
+import math
+from collections import Counter, defaultdict
+from typing import Any
+
+# Bumped when the layout of reports changes, so old baselines aren't compared
+REPORT_VERSION = 1
+
+# Latency statistics of each route, compared by compare_reports
+LATENCY_STATS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+class Recorder:
+    """Latencies and errors of the requests sent to each route."""
+
+    def __init__(self):
+        """Create an empty Recorder."""
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.errors: Counter[str] = Counter()
+
+    def record(self, route: str, seconds: float, ok: bool) -> None:
+        """Record a request.
+
+        Args:
+            route (str): The route, like "GET /v1/users/{user_id}"
+            seconds (float): Time until the whole response was received
+            ok (bool): Whether the response had the expected status code
+        """
+        self.latencies[route].append(seconds)
+        if not ok:
+            self.errors[route] += 1
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Get a percentile of sorted values, using the nearest-rank method.
+
+    Args:
+        values (list[float]): Sorted values. Must not be empty.
+        q (float): The percentile, between 0 and 100
+
+    Returns:
+        float: The smallest value greater than or equal to q% of the values
+    """
+    rank = max(math.ceil(q / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def _route_stats(latencies: list[float], errors: int, elapsed: float) -> dict:
+    """Summarize the latencies of a route, in milliseconds."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2),
+    }
+
+
+def summarize(
+    recorder: Recorder, elapsed: float, config: dict[str, Any]
+) -> dict[str, Any]:
+    """Build the report of a benchmark run.
+
+    Args:
+        recorder (Recorder): The recorded requests
+        elapsed (float): Seconds the requests were recorded for
+        config (dict[str, Any]): Benchmark parameters, included in the report
+
+    Returns:
+        dict[str, Any]: The report, ready to be encoded as JSON
+    """
+    routes = {
+        route: _route_stats(latencies, recorder.errors[route], elapsed)
+        for route, latencies in sorted(recorder.latencies.items())
+    }
+    all_latencies = [
+        value for values in recorder.latencies.values() for value in values
+    ]
+    return {
+        "version": REPORT_VERSION,
+        "config": config,
+        "duration_s": round(elapsed, 2),
+        "total": _route_stats(all_latencies, sum(recorder.errors.values()), elapsed)
+        if all_latencies
+        else None,
+        "routes": routes,
+    }
+
+
+def compare_reports(
+    baseline: dict[str, Any], current: dict[str, Any], *, max_regression: float = 0.1
+) -> list[str]:
+    """Find the routes that got slower, or failed more, than in a baseline report.
+
+    Args:
+        baseline (dict[str, Any]): Report of a previous run
+        current (dict[str, Any]): Report of the run to check
+        max_regression (float): Tolerated relative change, 0.1 meaning 10%.
+            Defaults to 0.1.
+
+    Returns:
+        list[str]: A description of each regression. Empty if there are none.
+    """
+    if baseline.get("version") != current.get("version"):
+        return [
+            f"Report version {current.get('version')} can't be compared "
+            f"with version {baseline.get('version')}"
+        ]
+
+    regressions = []
+    for route, stats in current["routes"].items():
+        base = baseline["routes"].get(route)
+        if base is None:
+            continue
+        for stat in LATENCY_STATS:
+            if stats[stat] > base[stat] * (1 + max_regression):
+                regressions.append(
+                    f"{route}: {stat} went from {base[stat]} to {stats[stat]}"
+                )
+        if stats["rps"] < base["rps"] * (1 - max_regression):
+            regressions.append(
+                f"{route}: rps went from {base['rps']} to {stats['rps']}"
+            )
+        error_rate = stats["errors"] / stats["requests"]
+        base_error_rate = base["errors"] / base["requests"]
+        if error_rate > base_error_rate:
+            regressions.append(
+                f"{route}: error rate went from {base_error_rate:.2%} "
+                f"to {error_rate:.2%}"
+            )
+    return regressions
@@ -0,0 +1,76 @@
+"""Seed the database with the Users used by benchmarks."""
+
+from typing import NamedTuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from users_api import crud
+from users_api.api import security
+from users_api.crud.base import insert_multi_stmt
+from users_api.crud.crud_user import build_users
+from users_api.models.user import User
+
+# Rows inserted per INSERT statement
+SEED_BATCH_SIZE = 1000
+
+
+class SeedUser(NamedTuple):
+    """A User created by seed_users."""
+
+    username: str
+    uuid: UUID
+
+
+class Seed(NamedTuple):
+    """The Users created by seed_users, and their password."""
+
+    admin: SeedUser
+    users: list[SeedUser]
+    password: str
+
+
+def seed_users(
+    db: Session, *, count: int, password: str = "benchmark", prefix: str = "bench_"
+) -> Seed:
+    """Replace the benchmark Users with count new Users and a superuser.
+
+    Every User gets the same password, hashed once, so that seeding many Users
+    doesn't take longer than the benchmark itself.
+
+    Args:
+        db (Session): A database session
+        count (int): Number of regular Users to create
+        password (str): Password of every User. Defaults to "benchmark".
+        prefix (str): Prefix of every username. Users whose username starts with
+            it are deleted first. Defaults to "bench_".
+
+    Returns:
+        Seed: The created Users
+    """
+    db.query(User).filter(User.username.startswith(prefix, autoescape=True)).delete(
+        synchronize_session=False
+    )
+    db.commit()
+    crud.user_cache.clear()
+
+    admin_username = f"{prefix}admin"
+    values = [{"username": admin_username, "is_superuser": True}]
+    values += [{"username": f"{prefix}{i}"} for i in range(count)]
+    password_hash = security.get_password_hash(password)
+
+    seeded = []
+    for start in range(0, len(values), SEED_BATCH_SIZE):
+        end = start + SEED_BATCH_SIZE
+        chunk = values[start:end]
+        stmt = insert_multi_stmt(
+            User,
+            build_users(chunk, [password_hash] * len(chunk)),
+            conflict_column="username",
+        )
+        seeded += [SeedUser(row.username, row.uuid) for row in db.execute(stmt)]
+        db.commit()
+
+    admin = next(user for user in seeded if user.username == admin_username)
+    users = [user for user in seeded if user.username != admin_username]
+    return Seed(admin=admin, users=users, password=password)
@@ -0,0 +1,93 @@
+"""Micro-benchmark of the encoding of User responses.
+
+Compares FastAPI's path, validating ORM objects into the response_model, then
+calling jsonable_encoder and JSONResponse, with a Serializer encoding them
+directly. No database nor server is involved, only the encoding of a page.
+"""
+
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from users_api import schemas
+from users_api.api import serializers
+from users_api.models.user import User
+
+
+def build_page(rows: int) -> list[User]:
+    """Build transient Users, like a page returned by GET /v1/users.
+
+    Args:
+        rows (int): How many Users to build
+
+    Returns:
+        list[User]: The Users
+    """
+    now = datetime.now(timezone.utc)
+    return [
+        User(
+            id=i,
+            uuid=uuid.uuid4(),
+            username=f"user_{i}",
+            first_name="Jöhn",
+            last_name=None if i % 2 else "Doe",
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(rows)
+    ]
+
+
+async def _best_time(encode: Callable[[], Awaitable[bytes]], repeat: int) -> float:
+    """Get the shortest time an encoding takes, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await encode()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_serialization(rows: int = 1000, repeat: int = 20) -> dict[str, Any]:
+    """Time the encoding of a page of Users, by FastAPI and by a Serializer.
+
+    Args:
+        rows (int): Users in the page. Defaults to 1000.
+        repeat (int): Times each encoding is run, keeping the best one.
+            Defaults to 20.
+
+    Returns:
+        dict[str, Any]: The report, with the best time of each encoding in
+            milliseconds, the speedup, and whether they output the same bytes
+    """
+    page = build_page(rows)
+    field = create_response_field(name="Response_list", type_=list[schemas.UserList])
+    serializer = serializers.Serializer(schemas.UserList, many=True)
+
+    async def encode_fastapi() -> bytes:
+        content = await serialize_response(field=field, response_content=page)
+        return JSONResponse(content).body
+
+    async def encode_serializer() -> bytes:
+        return serializer.render(page)
+
+    async def run() -> dict[str, Any]:
+        identical = await encode_fastapi() == await encode_serializer()
+        fastapi_seconds = await _best_time(encode_fastapi, repeat)
+        serializer_seconds = await _best_time(encode_serializer, repeat)
+        return {
+            "rows": rows,
+            "encoder": "json" if serializers.orjson is None else "orjson",
+            "fastapi_ms": round(fastapi_seconds * 1000, 3),
+            "serializer_ms": round(serializer_seconds * 1000, 3),
+            "speedup": round(fastapi_seconds / serializer_seconds, 1),
+            "identical": identical,
+        }
+
+    return asyncio.run(run())
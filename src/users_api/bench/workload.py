@@ -0,0 +1,242 @@
+"""Mixed workload, driven against the API by concurrent async clients."""
+
+import asyncio
+import itertools
+import random
+import time
+from typing import Any
+
+import httpx
+
+from users_api.bench.report import Recorder, summarize
+from users_api.bench.seed import Seed
+
+# Route of each operation, named like the route labels of the API metrics
+ROUTES = {
+    "login": "POST /v1/auth/login",
+    "get": "GET /v1/users/{user_id}",
+    "list": "GET /v1/users",
+    "create": "POST /v1/users",
+    "update": "PUT /v1/users/{user_id}",
+    "delete": "DELETE /v1/users/{user_id}",
+}
+
+# Status code each operation is expected to get. Anything else is an error
+EXPECTED_STATUS = {
+    "login": 200,
+    "get": 200,
+    "list": 200,
+    "create": 201,
+    "update": 200,
+    "delete": 204,
+}
+
+DEFAULT_MIX = "login=1,get=10,list=2,create=1,update=2,delete=1"
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    """Parse the relative weights of the operations of a workload.
+
+    Args:
+        mix (str): Comma separated weights, like "get=10,list=2". Operations that
+            aren't listed aren't run.
+
+    Raises:
+        ValueError: If an operation or weight is invalid, or all weights are 0
+
+    Returns:
+        dict[str, int]: Weight of each operation
+    """
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in ROUTES:
+            raise ValueError(f"Unknown operation '{name}'. Valid ones: {list(ROUTES)}")
+        if not weight.isdigit():
+            raise ValueError(f"Invalid weight '{weight}' for operation '{name}'")
+        weights[name] = int(weight)
+    if not any(weights.values()):
+        raise ValueError("At least one operation must have a positive weight")
+    return weights
+
+
+class Workload:
+    """Run randomly chosen operations against the API, recording their latency.
+
+    Users are picked from the seeded ones. Users created by the workload are the
+    ones it deletes, so the seeded Users are never deleted.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        seed: Seed,
+        mix: dict[str, int],
+        recorder: Recorder,
+        random_seed: int | None = None,
+    ):
+        """Create a Workload.
+
+        Args:
+            client (httpx.AsyncClient): Client sending requests to the API
+            seed (Seed): The seeded Users
+            mix (dict[str, int]): Weight of each operation
+            recorder (Recorder): Where latencies are recorded
+            random_seed (int | None): Seed of the operation and User choices
+        """
+        self.client = client
+        self.seed = seed
+        self.recorder = recorder
+        self.recording = True
+        self._operations = [name for name, weight in mix.items() if weight]
+        self._weights = [mix[name] for name in self._operations]
+        self._random = random.Random(random_seed)
+        self._created: list[str] = []
+        self._counter = itertools.count()
+        self._admin_headers: dict[str, str] = {}
+
+    async def login(self, username: str) -> httpx.Response:
+        """Log in as a User.
+
+        Args:
+            username (str): The username
+
+        Returns:
+            httpx.Response: The response
+        """
+        return await self.client.post(
+            "/v1/auth/login",
+            data={"username": username, "password": self.seed.password},
+        )
+
+    async def setup(self) -> None:
+        """Log in as the seeded superuser, used to send every other request.
+
+        Raises:
+            RuntimeError: If the login fails
+        """
+        response = await self.login(self.seed.admin.username)
+        if response.status_code != 200:
+            raise RuntimeError(f"Could not log in as superuser: {response.text}")
+        token = response.json()["access_token"]
+        self._admin_headers = {"Authorization": f"Bearer {token}"}
+
+    def _random_user_id(self) -> str:
+        """Pick a seeded User, falling back to the superuser if there are none."""
+        users = self.seed.users or [self.seed.admin]
+        return str(self._random.choice(users).uuid)
+
+    async def _send(self, name: str) -> httpx.Response:
+        """Send the request of an operation."""
+        headers = self._admin_headers
+        if name == "login":
+            users = self.seed.users or [self.seed.admin]
+            return await self.login(self._random.choice(users).username)
+        if name == "get":
+            return await self.client.get(
+                f"/v1/users/{self._random_user_id()}", headers=headers
+            )
+        if name == "list":
+            return await self.client.get("/v1/users", headers=headers)
+        if name == "update":
+            return await self.client.put(
+                f"/v1/users/{self._random_user_id()}",
+                json={"firstName": f"bench {next(self._counter)}"},
+                headers=headers,
+            )
+        if name == "delete":
+            return await self.client.delete(
+                f"/v1/users/{self._created.pop()}", headers=headers
+            )
+        response = await self.client.post(
+            "/v1/users",
+            json={
+                "username": f"{self.seed.admin.username}_{next(self._counter)}",
+                "password": self.seed.password,
+            },
+        )
+        if response.status_code == 201:
+            self._created.append(response.json()["uuid"])
+        return response
+
+    async def run_operation(self, name: str) -> None:
+        """Run an operation, recording its latency and whether it failed.
+
+        Deleting requires a User created by this workload, so Users are created
+        instead until there is one.
+
+        Args:
+            name (str): The operation, one of ROUTES
+        """
+        if name == "delete" and not self._created:
+            name = "create"
+        start = time.perf_counter()
+        try:
+            response = await self._send(name)
+            ok = response.status_code == EXPECTED_STATUS[name]
+        except httpx.HTTPError:
+            ok = False
+        if self.recording:
+            self.recorder.record(ROUTES[name], time.perf_counter() - start, ok)
+
+    async def run(self, concurrency: int, duration: float) -> None:
+        """Run operations with concurrent clients until the duration elapses.
+
+        Args:
+            concurrency (int): Number of clients sending requests at once
+            duration (float): Seconds to run for
+        """
+        deadline = time.monotonic() + duration
+
+        async def run_client():
+            while time.monotonic() < deadline:
+                operation = self._random.choices(self._operations, self._weights)[0]
+                await self.run_operation(operation)
+
+        await asyncio.gather(*(run_client() for _ in range(concurrency)))
+
+
+async def run_benchmark(
+    client: httpx.AsyncClient,
+    seed: Seed,
+    *,
+    mix: dict[str, int],
+    concurrency: int,
+    duration: float,
+    warmup: float = 0,
+    random_seed: int | None = None,
+) -> dict[str, Any]:
+    """Run a workload against the API and report its results.
+
+    Args:
+        client (httpx.AsyncClient): Client sending requests to the API
+        seed (Seed): The seeded Users
+        mix (dict[str, int]): Weight of each operation
+        concurrency (int): Number of clients sending requests at once
+        duration (float): Seconds to record requests for
+        warmup (float): Seconds to send requests for before recording them
+        random_seed (int | None): Seed of the operation and User choices
+
+    Returns:
+        dict[str, Any]: The report built by summarize
+    """
+    recorder = Recorder()
+    workload = Workload(client, seed, mix, recorder, random_seed=random_seed)
+    await workload.setup()
+    if warmup:
+        workload.recording = False
+        await workload.run(concurrency, warmup)
+        workload.recording = True
+
+    start = time.perf_counter()
+    await workload.run(concurrency, duration)
+    elapsed = time.perf_counter() - start
+
+    config = {
+        "users": len(seed.users),
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "warmup_s": warmup,
+        "mix": mix,
+    }
+    return summarize(recorder, elapsed, config)
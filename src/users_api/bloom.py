@@ -0,0 +1,238 @@
+"""Counting Bloom filter of the usernames in the db.
+
+Most failed logins are for usernames that don't exist. Each worker process keeps
+every username in a counting Bloom filter of a fixed size, so those logins are
+ruled out without querying Postgres. The filter is never wrong about a username
+that is absent from it. A username that is present in it may still be missing
+from the db, which only costs the query the filter could not skip.
+
+The filter is built with a streaming scan of the users table, and refreshed with
+the Users created since by any worker, scanning the ids above the highest one
+loaded. Users created or removed through this process are added or removed
+right away.
+"""
+
+import threading
+import time
+from typing import Iterable, Iterator
+
+# Counters saturate at this value, and are never decremented afterwards
+MAX_COUNT = 255
+
+
+class CountingBloomFilter:
+    """Bloom filter with a one byte counter per slot, so items can be removed."""
+
+    def __init__(self, size: int, hashes: int):
+        """Create an empty CountingBloomFilter.
+
+        Args:
+            size (int): Number of counters, which is also its size in bytes
+            hashes (int): Number of counters set by each item
+        """
+        self.size = size
+        self.hashes = hashes
+        self._counters = bytearray(size)
+
+    def _indexes(self, item: str) -> Iterator[int]:
+        """Get the counters of an item, by double hashing its 64-bit hash.
+
+        Python's hash of strings is randomized for each process, so the counters
+        of a username can't be predicted.
+
+        Args:
+            item (str): The item
+
+        Yields:
+            int: The index of each of its counters
+        """
+        h = hash(item) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        size = self.size
+        for _ in range(self.hashes):
+            yield h1 % size
+            h1 += h2
+
+    def __contains__(self, item: str) -> bool:
+        """Check whether an item may have been added."""
+        counters = self._counters
+        return all(counters[i] for i in self._indexes(item))
+
+    def add(self, item: str) -> None:
+        """Add an item.
+
+        Args:
+            item (str): The item
+        """
+        counters = self._counters
+        for i in self._indexes(item):
+            if counters[i] < MAX_COUNT:
+                counters[i] += 1
+
+    def remove(self, item: str) -> None:
+        """Remove an item. It must have been added before.
+
+        Args:
+            item (str): The item
+        """
+        counters = self._counters
+        for i in self._indexes(item):
+            if 0 < counters[i] < MAX_COUNT:
+                counters[i] -= 1
+
+    def clear(self) -> None:
+        """Remove every item."""
+        self._counters = bytearray(self.size)
+
+
+class UsernameFilter:
+    """Counting Bloom filter of the usernames in the db, and how fresh it is.
+
+    Scans load (id, username) rows in id order. Ids are taken from a sequence
+    when rows are inserted, but transactions may commit in another order, so the
+    ids skipped by a refresh are scanned again by the next ones for `overlap`,
+    in case their transaction commits late.
+    """
+
+    # Longest a transaction creating Users may take to commit
+    overlap = 60
+    # Most skipped ids scanned again, the oldest ones being forgotten first
+    max_gaps = 10000
+
+    def __init__(self, size: int, hashes: int, refresh_seconds: float):
+        """Create an empty UsernameFilter.
+
+        Args:
+            size (int): Size of the Bloom filter, in bytes
+            hashes (int): Number of counters set by each username
+            refresh_seconds (float): Seconds until it may be refreshed again
+        """
+        self.refresh_seconds = refresh_seconds
+        self.refresh_lock = threading.Lock()
+        self._bloom = CountingBloomFilter(size, hashes)
+        self._lock = threading.Lock()
+        # Highest id loaded by a scan
+        self.last_id = 0
+        # Ids skipped by scans, and when they were skipped
+        self._gaps: dict[int, float] = {}
+        # Ids above last_id added by this process, not scanned yet
+        self._created: set[int] = set()
+        self._refreshed_at: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether a full scan was loaded, so it can rule out usernames."""
+        return self._refreshed_at is not None
+
+    @property
+    def stale(self) -> bool:
+        """Whether it's time to refresh it, or to build it."""
+        return (
+            self._refreshed_at is None
+            or time.monotonic() - self._refreshed_at >= self.refresh_seconds
+        )
+
+    @property
+    def gap_ids(self) -> list[int]:
+        """Get the skipped ids the next refresh must scan again."""
+        with self._lock:
+            return list(self._gaps)
+
+    def might_exist(self, username: str) -> bool:
+        """Check whether a username may be in the db.
+
+        Args:
+            username (str): The username
+
+        Returns:
+            bool: False if it's certainly not in the db, or if it's not built yet
+        """
+        return not self.ready or username in self._bloom
+
+    def add(self, id: int, username: str) -> None:
+        """Add the username of a User created by this process.
+
+        Args:
+            id (int): Id of the User
+            username (str): Its username
+        """
+        with self._lock:
+            if id in self._gaps:
+                del self._gaps[id]
+            elif id > self.last_id and id not in self._created:
+                self._created.add(id)
+            else:
+                return
+            self._bloom.add(username)
+
+    def load(self, rows: Iterable[tuple[int, str]]) -> None:
+        """Add the usernames of scanned rows, unless they were already added.
+
+        Args:
+            rows (Iterable[tuple[int, str]]): (id, username) of Users in the db,
+                in id order
+        """
+        now = time.monotonic()
+        with self._lock:
+            for id, username in rows:
+                if id in self._gaps:
+                    del self._gaps[id]
+                elif id <= self.last_id:
+                    continue
+                else:
+                    # The first scan skips the ids of rows removed long ago
+                    if self.ready:
+                        self._skip(range(self.last_id + 1, id), now)
+                    self.last_id = id
+                if id in self._created:
+                    self._created.discard(id)
+                else:
+                    self._bloom.add(username)
+
+    def discard(self, id: int, username: str) -> None:
+        """Remove the username of a removed User, if it was added.
+
+        Users that were never added are ignored, as removing them could remove
+        another username.
+
+        Args:
+            id (int): Id of the User
+            username (str): Its username
+        """
+        with self._lock:
+            if id in self._created:
+                self._created.discard(id)
+            elif id > self.last_id or id in self._gaps:
+                return
+            self._bloom.remove(username)
+
+    def mark_refreshed(self) -> None:
+        """Record that a scan was loaded, forgetting the gaps too old to fill."""
+        now = time.monotonic()
+        with self._lock:
+            self._gaps = {
+                id: skipped_at
+                for id, skipped_at in self._gaps.items()
+                if now - skipped_at < self.overlap
+            }
+            self._created = {id for id in self._created if id > self.last_id}
+            self._refreshed_at = now
+
+    def clear(self) -> None:
+        """Remove every username, so it must be built again."""
+        with self._lock:
+            self._bloom.clear()
+            self.last_id = 0
+            self._gaps.clear()
+            self._created.clear()
+            self._refreshed_at = None
+
+    def _skip(self, ids: range, now: float) -> None:
+        """Record skipped ids, except the ones added by this process."""
+        if len(ids) > self.max_gaps:
+            ids = range(ids.stop - self.max_gaps, ids.stop)
+        for id in ids:
+            if id not in self._created:
+                self._gaps[id] = now
+        while len(self._gaps) > self.max_gaps:
+            del self._gaps[next(iter(self._gaps))]
@@ -0,0 +1,670 @@
+"""Caches of database rows, keyed by uuid.
+
+Used to avoid loading the authenticated User, or only its token version, from
+Postgres on every request.
+Rows are stored as JSON, in this process (LocalCache) or in a backend shared by
+every worker (RedisCache). Writes done through the CRUD classes invalidate the
+cached rows of this process, or of every process with a shared backend. The TTL
+bounds how long other processes may serve stale rows from a LocalCache.
+
+A row read from the db after a miss may be changed by a write before it's cached.
+So before reading it, a lease is taken on the missing key: the row is only cached
+if the key still holds that lease, which invalidating the key removes.
+"""
+
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Generic, Iterable, TypeVar
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import DateTime
+from sqlalchemy.orm import make_transient_to_detached
+
+from users_api.db.base_class import Base
+from users_api.settings import CacheBackendEnum, get_settings
+
+settings = get_settings()
+
+ModelType = TypeVar("ModelType", bound=Base)
+
+# Prefix of the values holding a lease on a missing key, which are never returned
+LEASE_PREFIX = "lease:"
+
+
+def _new_lease() -> str:
+    """Create a lease value, unique to the caller."""
+    return LEASE_PREFIX + secrets.token_hex(8)
+
+
+class CacheBackend:
+    """Base cache backend. It caches nothing."""
+
+    # Whether operations do network I/O, and must not run in the event loop
+    blocking = False
+
+    def get(self, key: str) -> str | None:
+        """Get a cached value.
+
+        Args:
+            key (str): The key of the value
+
+        Returns:
+            Optional[str]: The value, or None if it isn't cached
+        """
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        """Cache a value.
+
+        Args:
+            key (str): The key of the value
+            value (str): The value
+        """
+
+    def delete(self, key: str) -> None:
+        """Remove a value from the cache.
+
+        Args:
+            key (str): The key of the value
+        """
+
+    def lease(self, key: str) -> str | None:
+        """Take a lease on a missing key, before reading the value to cache.
+
+        Args:
+            key (str): The key of the value
+
+        Returns:
+            Optional[str]: The lease, or None if the key is cached or leased
+        """
+        return None
+
+    def fill(self, key: str, lease: str, value: str) -> bool:
+        """Cache a value, if the key still holds a lease.
+
+        Args:
+            key (str): The key of the value
+            lease (str): The lease taken on the key
+            value (str): The value
+
+        Returns:
+            bool: Whether the value was cached
+        """
+        return False
+
+    def clear(self) -> None:
+        """Remove every value from the cache."""
+
+
+class LocalCache(CacheBackend):
+    """In-process cache, with a TTL and a maximum size.
+
+    When full, the least recently used values are evicted first.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        """Create an empty LocalCache.
+
+        Args:
+            max_size (int): How many values to keep at most
+            ttl (float): Seconds a value is kept
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Get how many values are cached, including the expired ones."""
+        return len(self._data)
+
+    def get(self, key: str) -> str | None:
+        """Get a cached value, unless it has expired.
+
+        Args:
+            key (str): The key of the value
+
+        Returns:
+            Optional[str]: The value, or None if it isn't cached
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            if value.startswith(LEASE_PREFIX):
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        """Cache a value, evicting the least recently used ones if full."""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def set(self, key: str, value: str) -> None:
+        """Cache a value, evicting the least recently used ones if full.
+
+        Args:
+            key (str): The key of the value
+            value (str): The value
+        """
+        with self._lock:
+            self._set(key, value)
+
+    def delete(self, key: str) -> None:
+        """Remove a value from the cache.
+
+        Args:
+            key (str): The key of the value
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def lease(self, key: str) -> str | None:
+        """Take a lease on a missing key, before reading the value to cache.
+
+        Args:
+            key (str): The key of the value
+
+        Returns:
+            Optional[str]: The lease, or None if the key is cached or leased
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > time.monotonic():
+                return None
+            lease = _new_lease()
+            self._set(key, lease)
+            return lease
+
+    def fill(self, key: str, lease: str, value: str) -> bool:
+        """Cache a value, if the key still holds a lease.
+
+        Args:
+            key (str): The key of the value
+            lease (str): The lease taken on the key
+            value (str): The value
+
+        Returns:
+            bool: Whether the value was cached
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic() or item[1] != lease:
+                return False
+            self._set(key, value)
+            return True
+
+    def clear(self) -> None:
+        """Remove every value from the cache."""
+        with self._lock:
+            self._data.clear()
+
+
+# Replaces the lease on a key by a value, atomically
+FILL_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    redis.call("SET", KEYS[1], ARGV[2], "EX", ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class RedisCache(CacheBackend):
+    """Cache shared by every worker, stored in Redis.
+
+    Any client with redis-py's get, set, delete, eval and scan_iter methods can
+    be used.
+    """
+
+    blocking = True
+
+    def __init__(self, client: Any, ttl: int, prefix: str = "users_api:"):
+        """Create a RedisCache.
+
+        Args:
+            client (Any): A Redis client
+            ttl (int): Seconds a value is kept
+            prefix (str): Prefix of every key. Defaults to "users_api:".
+        """
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, ttl: int, prefix: str = "users_api:") -> "RedisCache":
+        """Create a RedisCache connected to a Redis server.
+
+        Requires the `cache` extra.
+
+        Args:
+            url (str): The Redis URL
+            ttl (int): Seconds a value is kept
+            prefix (str): Prefix of every key. Defaults to "users_api:".
+
+        Returns:
+            RedisCache: The cache
+        """
+        import redis
+
+        return cls(redis.Redis.from_url(url), ttl, prefix)
+
+    def get(self, key: str) -> str | None:
+        """Get a cached value.
+
+        Args:
+            key (str): The key of the value
+
+        Returns:
+            Optional[str]: The value, or None if it isn't cached
+        """
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode()
+        if value is None or value.startswith(LEASE_PREFIX):
+            return None
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Cache a value.
+
+        Args:
+            key (str): The key of the value
+            value (str): The value
+        """
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def delete(self, key: str) -> None:
+        """Remove a value from the cache.
+
+        Args:
+            key (str): The key of the value
+        """
+        self.client.delete(self.prefix + key)
+
+    def lease(self, key: str) -> str | None:
+        """Take a lease on a missing key, before reading the value to cache.
+
+        Args:
+            key (str): The key of the value
+
+        Returns:
+            Optional[str]: The lease, or None if the key is cached or leased
+        """
+        lease = _new_lease()
+        if self.client.set(self.prefix + key, lease, ex=self.ttl, nx=True):
+            return lease
+        return None
+
+    def fill(self, key: str, lease: str, value: str) -> bool:
+        """Cache a value, if the key still holds a lease.
+
+        Args:
+            key (str): The key of the value
+            lease (str): The lease taken on the key
+            value (str): The value
+
+        Returns:
+            bool: Whether the value was cached
+        """
+        filled = self.client.eval(
+            FILL_SCRIPT, 1, self.prefix + key, lease, value, self.ttl
+        )
+        return bool(filled)
+
+    def clear(self) -> None:
+        """Remove every value with this cache's prefix."""
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class ModelCache(Generic[ModelType]):
+    """Cache of a model's rows, keyed by uuid.
+
+    Cached rows are returned as detached ORM objects, so they can be added to a
+    session like rows loaded from the db. Excluded columns are never stored:
+    they are left unloaded on cached rows, and loaded from the db if accessed
+    once the row is added to a session.
+    """
+
+    def __init__(
+        self,
+        model: type[ModelType],
+        backend: CacheBackend,
+        exclude: Iterable[str] = (),
+    ):
+        """Create a ModelCache.
+
+        Args:
+            model (type[ModelType]): A SQLAlchemy model class
+            backend (CacheBackend): Where rows are stored
+            exclude (Iterable[str]): Names of the columns not to store, like
+                secrets. Defaults to none.
+        """
+        self.model = model
+        self.backend = backend
+        excluded = set(exclude)
+        self.columns = [
+            column for column in model.__table__.columns if column.key not in excluded
+        ]
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _dump(self, db_obj: ModelType) -> str:
+        """Encode the column values of an ORM object as JSON."""
+        values = {}
+        for column in self.columns:
+            value = getattr(db_obj, column.key)
+            if isinstance(value, UUID):
+                value = str(value)
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            values[column.key] = value
+        return json.dumps(values, separators=(",", ":"))
+
+    def _load(self, value: str) -> ModelType:
+        """Build a detached ORM object from values encoded by _dump."""
+        values = json.loads(value)
+        for column in self.columns:
+            if values.get(column.key) is None:
+                continue
+            if isinstance(column.type, DateTime):
+                values[column.key] = datetime.fromisoformat(values[column.key])
+            elif column.type.python_type is UUID:
+                values[column.key] = UUID(values[column.key])
+        db_obj = self.model(**values)
+        make_transient_to_detached(db_obj)
+        return db_obj
+
+    def get(self, uuid: Any) -> ModelType | None:
+        """Get a cached row.
+
+        Args:
+            uuid (Any): The uuid of the row
+
+        Returns:
+            Optional[ModelType]: A detached ORM object, or None if it isn't cached
+        """
+        value = self.backend.get(str(uuid))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if value is None else self._load(value)
+
+    def set(self, db_obj: ModelType) -> None:
+        """Cache a row. All of its columns that aren't excluded must be loaded.
+
+        Args:
+            db_obj (ModelType): The ORM object to cache
+        """
+        self.backend.set(str(db_obj.uuid), self._dump(db_obj))
+
+    def delete(self, uuid: Any) -> None:
+        """Remove a row from the cache.
+
+        Args:
+            uuid (Any): The uuid of the row
+        """
+        self.backend.delete(str(uuid))
+
+    def lease(self, uuid: Any) -> str | None:
+        """Take a lease on a missing row, before loading it from the db.
+
+        Args:
+            uuid (Any): The uuid of the row
+
+        Returns:
+            Optional[str]: The lease, or None if the row is cached or leased
+        """
+        return self.backend.lease(str(uuid))
+
+    def fill(self, lease: str, db_obj: ModelType) -> None:
+        """Cache a row, unless it was invalidated since the lease was taken.
+
+        Args:
+            lease (str): The lease taken before loading the row
+            db_obj (ModelType): The ORM object to cache
+        """
+        self.backend.fill(str(db_obj.uuid), lease, self._dump(db_obj))
+
+    def clear(self) -> None:
+        """Remove every row from the cache."""
+        self.backend.clear()
+
+    async def get_async(self, uuid: Any) -> ModelType | None:
+        """Get a cached row without blocking the event loop.
+
+        Args:
+            uuid (Any): The uuid of the row
+
+        Returns:
+            Optional[ModelType]: A detached ORM object, or None if it isn't cached
+        """
+        if self.backend.blocking:
+            return await run_in_threadpool(self.get, uuid)
+        return self.get(uuid)
+
+    async def set_async(self, db_obj: ModelType) -> None:
+        """Cache a row without blocking the event loop.
+
+        Args:
+            db_obj (ModelType): The ORM object to cache
+        """
+        if self.backend.blocking:
+            await run_in_threadpool(self.set, db_obj)
+        else:
+            self.set(db_obj)
+
+    async def delete_async(self, uuid: Any) -> None:
+        """Remove a row from the cache without blocking the event loop.
+
+        Args:
+            uuid (Any): The uuid of the row
+        """
+        if self.backend.blocking:
+            await run_in_threadpool(self.delete, uuid)
+        else:
+            self.delete(uuid)
+
+    async def lease_async(self, uuid: Any) -> str | None:
+        """Take a lease on a missing row without blocking the event loop.
+
+        Args:
+            uuid (Any): The uuid of the row
+
+        Returns:
+            Optional[str]: The lease, or None if the row is cached or leased
+        """
+        if self.backend.blocking:
+            return await run_in_threadpool(self.lease, uuid)
+        return self.lease(uuid)
+
+    async def fill_async(self, lease: str, db_obj: ModelType) -> None:
+        """Cache a leased row without blocking the event loop.
+
+        Args:
+            lease (str): The lease taken before loading the row
+            db_obj (ModelType): The ORM object to cache
+        """
+        if self.backend.blocking:
+            await run_in_threadpool(self.fill, lease, db_obj)
+        else:
+            self.fill(lease, db_obj)
+
+    def stats(self) -> dict[str, Any]:
+        """Get the hit and miss counters of this process.
+
+        Returns:
+            dict[str, Any]: The backend name, hits and misses
+        """
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class VersionCache:
+    """Cache of integer versions, keyed by uuid.
+
+    Much smaller than a ModelCache, it lets access tokens be checked against the
+    current token version of their User without loading the whole row.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        """Create a VersionCache.
+
+        Args:
+            backend (CacheBackend): Where versions are stored
+        """
+        self.backend = backend
+
+    def get(self, uuid: Any) -> int | None:
+        """Get a cached version.
+
+        Args:
+            uuid (Any): The uuid of the row
+
+        Returns:
+            Optional[int]: The version, or None if it isn't cached
+        """
+        value = self.backend.get(str(uuid))
+        return None if value is None else int(value)
+
+    def set(self, uuid: Any, version: int) -> None:
+        """Cache a version.
+
+        Args:
+            uuid (Any): The uuid of the row
+            version (int): The version
+        """
+        self.backend.set(str(uuid), str(version))
+
+    def delete(self, uuid: Any) -> None:
+        """Remove a version from the cache.
+
+        Args:
+            uuid (Any): The uuid of the row
+        """
+        self.backend.delete(str(uuid))
+
+    def lease(self, uuid: Any) -> str | None:
+        """Take a lease on a missing version, before reading it from the db.
+
+        Args:
+            uuid (Any): The uuid of the row
+
+        Returns:
+            Optional[str]: The lease, or None if the version is cached or leased
+        """
+        return self.backend.lease(str(uuid))
+
+    def fill(self, uuid: Any, lease: str, version: int) -> None:
+        """Cache a version, unless it was invalidated since the lease was taken.
+
+        Args:
+            uuid (Any): The uuid of the row
+            lease (str): The lease taken before reading the version
+            version (int): The version
+        """
+        self.backend.fill(str(uuid), lease, str(version))
+
+    def clear(self) -> None:
+        """Remove every version from the cache."""
+        self.backend.clear()
+
+    async def get_async(self, uuid: Any) -> int | None:
+        """Get a cached version without blocking the event loop.
+
+        Args:
+            uuid (Any): The uuid of the row
+
+        Returns:
+            Optional[int]: The version, or None if it isn't cached
+        """
+        if self.backend.blocking:
+            return await run_in_threadpool(self.get, uuid)
+        return self.get(uuid)
+
+    async def set_async(self, uuid: Any, version: int) -> None:
+        """Cache a version without blocking the event loop.
+
+        Args:
+            uuid (Any): The uuid of the row
+            version (int): The version
+        """
+        if self.backend.blocking:
+            await run_in_threadpool(self.set, uuid, version)
+        else:
+            self.set(uuid, version)
+
+    async def delete_async(self, uuid: Any) -> None:
+        """Remove a version from the cache without blocking the event loop.
+
+        Args:
+            uuid (Any): The uuid of the row
+        """
+        if self.backend.blocking:
+            await run_in_threadpool(self.delete, uuid)
+        else:
+            self.delete(uuid)
+
+    async def lease_async(self, uuid: Any) -> str | None:
+        """Take a lease on a missing version without blocking the event loop.
+
+        Args:
+            uuid (Any): The uuid of the row
+
+        Returns:
+            Optional[str]: The lease, or None if the version is cached or leased
+        """
+        if self.backend.blocking:
+            return await run_in_threadpool(self.lease, uuid)
+        return self.lease(uuid)
+
+    async def fill_async(self, uuid: Any, lease: str, version: int) -> None:
+        """Cache a leased version without blocking the event loop.
+
+        Args:
+            uuid (Any): The uuid of the row
+            lease (str): The lease taken before reading the version
+            version (int): The version
+        """
+        if self.backend.blocking:
+            await run_in_threadpool(self.fill, uuid, lease, version)
+        else:
+            self.fill(uuid, lease, version)
+
+
+def get_cache_backend(prefix: str = "users_api:") -> CacheBackend:
+    """Create the cache backend configured in settings.
+
+    Args:
+        prefix (str): Prefix of the keys of a shared backend, which must differ
+            between caches. Defaults to "users_api:".
+
+    Returns:
+        CacheBackend: The cache backend
+    """
+    if settings.USER_CACHE_BACKEND == CacheBackendEnum.local:
+        return LocalCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL)
+    if settings.USER_CACHE_BACKEND == CacheBackendEnum.redis:
+        return RedisCache.from_url(
+            settings.USER_CACHE_REDIS_URL, settings.USER_CACHE_TTL, prefix
+        )
+    return CacheBackend()
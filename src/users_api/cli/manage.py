@@ -1,15 +1,24 @@
 #!/usr/local/bin/python
 
-"""Main API CLI file."""
+"""Main API CLI file.
 
+Commands import the rest of the package when run, rather than at the top of this
+file, so `manage serve` doesn't import the app in the master process.
+"""
+
+import asyncio
+import json
 import os
+import time
+from pathlib import Path
 from pprint import pformat
 
 import alembic.config
 import typer
 import uvicorn
 
-from users_api.settings import get_settings
+from users_api.cli.server import ApplicationServer
+from users_api.settings import PasswordHashSchemeEnum, get_settings
 
 app = typer.Typer()
 settings = get_settings()
@@ -32,6 +41,268 @@ def start():
     uvicorn.run(**uvicorn_settings)
 
 
+@app.command()
+def serve(
+    workers: int = typer.Option(
+        None, min=1, help="Worker processes. Defaults to settings.WORKERS."
+    )
+):
+    """Start the API with Gunicorn, running several Uvicorn worker processes.
+
+    Send SIGHUP to the master process to gracefully reload the workers.
+
+    Args:
+        workers (int): Number of worker processes
+    """
+    gunicorn_settings = settings.get_gunicorn_settings()
+    if workers:
+        gunicorn_settings["workers"] = workers
+    print(f"Starting gunicorn with these settings: \n{pformat(gunicorn_settings)}")
+    ApplicationServer(gunicorn_settings).run()
+
+
+@app.command()
+def bench(
+    users: int = typer.Option(1000, min=0, help="Users to seed"),
+    concurrency: int = typer.Option(32, min=1, help="Clients sending requests"),
+    duration: float = typer.Option(30, min=1, help="Seconds to record requests"),
+    warmup: float = typer.Option(5, min=0, help="Seconds to run before recording"),
+    mix: str = typer.Option(
+        "login=1,get=10,list=2,create=1,update=2,delete=1",
+        help="Weight of each operation",
+    ),
+    base_url: str = typer.Option(None, help="Defaults to the local API"),
+    output: Path = typer.Option(None, help="Write the JSON report to this file"),
+    baseline: Path = typer.Option(None, help="Report to compare the results with"),
+    max_regression: float = typer.Option(
+        0.1, min=0, help="Tolerated relative change when comparing, 0.1 being 10%"
+    ),
+    random_seed: int = typer.Option(None, help="Seed of the random choices"),
+):
+    """Benchmark a running API, seeding its database first.
+
+    Reports RPS, latency percentiles and errors per route as JSON. With
+    --baseline, exits with status 1 if any route regressed.
+
+    Args:
+        users (int): Users to seed
+        concurrency (int): Clients sending requests at once
+        duration (float): Seconds to record requests for
+        warmup (float): Seconds to send requests for before recording them
+        mix (str): Weight of each operation, like "get=10,list=2"
+        base_url (str): URL of the API
+        output (Path): File to write the report to, instead of stdout
+        baseline (Path): Report of a previous run
+        max_regression (float): Tolerated relative change
+        random_seed (int): Seed of the operation and User choices
+
+    Raises:
+        Exit: If the `bench` extra isn't installed, or if a route regressed
+            compared to the baseline
+        BadParameter: If the mix is invalid
+    """
+    try:
+        import httpx
+    except ImportError:
+        print("The benchmark requires the `bench` extra: poetry install -E bench")
+        raise typer.Exit(1)
+
+    from users_api import bench as benchmark
+    from users_api.bench import workload
+    from users_api.db.session import SessionLocal
+
+    try:
+        weights = workload.parse_mix(mix)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--mix")
+
+    with SessionLocal() as db:
+        seed = benchmark.seed_users(db, count=users)
+
+    async def run() -> dict:
+        async with httpx.AsyncClient(
+            base_url=base_url or f"http://127.0.0.1:{settings.PORT}",
+            limits=httpx.Limits(max_connections=concurrency),
+            timeout=60,
+        ) as client:
+            return await workload.run_benchmark(
+                client,
+                seed,
+                mix=weights,
+                concurrency=concurrency,
+                duration=duration,
+                warmup=warmup,
+                random_seed=random_seed,
+            )
+
+    report = asyncio.run(run())
+    report_json = json.dumps(report, indent=2)
+    if output:
+        output.write_text(report_json + "\n")
+    else:
+        print(report_json)
+
+    if baseline:
+        regressions = benchmark.compare_reports(
+            json.loads(baseline.read_text()), report, max_regression=max_regression
+        )
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            raise typer.Exit(1)
+
+
+@app.command()
+def bench_serialization(
+    rows: int = typer.Option(1000, min=1, help="Users in the encoded page"),
+    repeat: int = typer.Option(20, min=1, help="Times each encoding is run"),
+):
+    """Compare the encoding of a page of Users by FastAPI and by a Serializer.
+
+    Prints the best time of each one as JSON. No database nor server is needed.
+
+    Args:
+        rows (int): Users in the encoded page
+        repeat (int): Times each encoding is run, keeping the best one
+    """
+    from users_api.bench.serialization import benchmark_serialization
+
+    print(json.dumps(benchmark_serialization(rows, repeat), indent=2))
+
+
+@app.command()
+def import_users(
+    path: Path = typer.Argument(..., exists=True, dir_okay=False),
+    file_format: str = typer.Option(
+        None,
+        "--format",
+        help="ndjson or csv. Defaults to the file extension.",
+    ),
+    hash_workers: int = typer.Option(
+        None, min=1, help="Processes hashing passwords. Defaults to the CPU count."
+    ),
+):
+    """Import Users from a CSV or NDJSON file, skipping existing usernames.
+
+    Each row needs a username, and a password or an already hashed passwordHash.
+    Rows are streamed into Postgres with COPY, and passwords are hashed in a
+    process pool.
+
+    Args:
+        path (Path): The file to import
+        file_format (str): Format of the file
+        hash_workers (int): Number of processes hashing passwords
+
+    Raises:
+        Exit: If a row is invalid
+        BadParameter: If the format is unknown
+    """
+    from users_api import importer
+    from users_api.api.export import ExportFormatEnum
+    from users_api.api.security import PasswordHasher
+    from users_api.db.copy import CopyDataError
+    from users_api.db.session import SessionLocal
+    from users_api.settings import PasswordHasherExecutorEnum
+
+    try:
+        export_format = ExportFormatEnum(file_format or path.suffix.lstrip("."))
+    except ValueError:
+        raise typer.BadParameter("Must be ndjson or csv", param_hint="--format")
+
+    password_hasher = PasswordHasher(
+        executor_type=PasswordHasherExecutorEnum.process, max_workers=hash_workers
+    )
+    start = time.perf_counter()
+    try:
+        with path.open(newline="") as file, SessionLocal() as db:
+            users = importer.parse_users(importer.READERS[export_format](file))
+            result = importer.import_users(db, users, password_hasher=password_hasher)
+    except CopyDataError as e:
+        print(f"Nothing was imported. {e}")
+        raise typer.Exit(1)
+    finally:
+        password_hasher.shutdown()
+    print(
+        f"Imported {result.inserted} of {result.rows} Users in "
+        f"{time.perf_counter() - start:.1f}s. "
+        f"{result.rows - result.inserted} already existed."
+    )
+
+
+@app.command()
+def seed(
+    count: int = typer.Option(..., min=1, help="Users to create"),
+    password: str = typer.Option("password", help="Password of every User"),
+    prefix: str = typer.Option("user_", help="Prefix of the usernames"),
+):
+    """Create synthetic Users with COPY, numbering their usernames.
+
+    Every User gets the same password, hashed once. Users that already exist
+    are skipped.
+
+    Args:
+        count (int): Number of Users
+        password (str): Password of every User
+        prefix (str): Prefix of the usernames
+    """
+    from users_api import importer
+    from users_api.db.session import SessionLocal
+
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        result = importer.seed_users(db, count=count, password=password, prefix=prefix)
+    print(
+        f"Created {result.inserted} Users in {time.perf_counter() - start:.1f}s. "
+        f"{result.rows - result.inserted} already existed."
+    )
+
+
+@app.command()
+def calibrate_hash(
+    scheme: PasswordHashSchemeEnum = typer.Option(
+        settings.PASSWORD_HASH_SCHEME, help="Scheme to calibrate"
+    ),
+    target_ms: float = typer.Option(
+        250, min=1, help="Time a hash may take, in milliseconds"
+    ),
+    memory_cost: int = typer.Option(
+        settings.ARGON2_MEMORY_COST, min=8, help="argon2 memory, in KiB"
+    ),
+    parallelism: int = typer.Option(
+        settings.ARGON2_PARALLELISM, min=1, help="argon2 lanes"
+    ),
+    samples: int = typer.Option(3, min=1, help="Hashes measured for each cost"),
+):
+    """Suggest password hashing costs for a target latency on this machine.
+
+    Hashes are timed in this process, with increasing costs, so run it on the
+    hardware serving the API, while it's idle. Prints the settings to use.
+
+    Args:
+        scheme (PasswordHashSchemeEnum): Scheme to calibrate
+        target_ms (float): Time a hash may take, in milliseconds
+        memory_cost (int): argon2 memory, in KiB
+        parallelism (int): argon2 lanes
+        samples (int): Hashes measured for each cost
+    """
+    from users_api.api import security
+
+    calibration = security.calibrate_password_hash(
+        scheme,
+        target_ms / 1000,
+        samples=samples,
+        argon2_memory_cost=memory_cost,
+        argon2_parallelism=parallelism,
+    )
+    print(
+        f"A hash takes {calibration.seconds * 1000:.0f}ms, so each CPU can verify "
+        f"about {1 / calibration.seconds:.0f} passwords per second. Settings:"
+    )
+    print(f"PASSWORD_HASH_SCHEME={scheme.value}")
+    for name, value in calibration.params.items():
+        print(f"{name.upper()}={value}")
+
+
 @app.command()
 def migrate():
     """Apply migrations to the database."""
@@ -0,0 +1,88 @@
+"""Gunicorn application used to run the API in several Uvicorn worker processes.
+
+The app is imported by each worker after it is forked, never by the master
+process, so every worker creates its own metrics values, DB engines and pools.
+Run it with `manage serve`, or with `python -m users_api.cli.server` where the
+CLI dependencies aren't installed.
+"""
+
+import os
+import shutil
+import tempfile
+from typing import Any
+
+from gunicorn.app.base import BaseApplication
+
+from users_api.settings import get_settings
+
+
+def on_starting(server: Any) -> None:
+    """Prepare an empty Prometheus multiprocess directory shared by the workers.
+
+    Uses PROMETHEUS_MULTIPROC_DIR if set, or creates a temporary directory.
+    prometheus_client reads it when first imported, so this must run before any
+    process imports it.
+
+    Args:
+        server (Any): The gunicorn Arbiter
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        # Values left by a previous run would be added to the new ones
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+    else:
+        path = tempfile.mkdtemp(prefix="users_api_metrics_")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    server.log.info("Using %s as the Prometheus multiprocess directory", path)
+
+
+def child_exit(server: Any, worker: Any) -> None:
+    """Remove the live gauges of a worker that exited.
+
+    Args:
+        server (Any): The gunicorn Arbiter
+        worker (Any): The worker that exited
+    """
+    # Imported here so the master imports it after on_starting set the directory
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+class ApplicationServer(BaseApplication):
+    """Run the API with Gunicorn, configured from a dictionary of settings."""
+
+    def __init__(self, options: dict[str, Any]):
+        """Create an ApplicationServer.
+
+        Args:
+            options (dict[str, Any]): Gunicorn settings, by name
+        """
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        """Set the Gunicorn settings and server hooks."""
+        config = {
+            "on_starting": on_starting,
+            "child_exit": child_exit,
+            "preload_app": False,
+            **self.options,
+        }
+        for key, value in config.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> Any:
+        """Import the API. Called in each worker, after it is forked.
+
+        Returns:
+            Any: The ASGI app
+        """
+        from users_api.app import app
+
+        return app
+
+
+if __name__ == "__main__":
+    ApplicationServer(get_settings().get_gunicorn_settings()).run()
@@ -1 +1,4 @@
-from .crud_user import user
+from .crud_refresh_token import refresh_token
+from .crud_refresh_token_async import async_refresh_token
+from .crud_user import token_version_cache, user, user_cache, username_filter
+from .crud_user_async import async_user
@@ -1,11 +1,25 @@
 """Base CRUD implementation."""
 
-from typing import Any, Generic, TypeVar
+from typing import Any, Generic, Iterable, Iterator, TypeVar
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import Column, any_, bindparam, delete, inspect, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, Insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Result, Row
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.sql import ColumnElement, Delete, Select, Update
 
+from users_api.cache import ModelCache
+from users_api.crud.pagination import (
+    ORDER_BY_COLUMNS,
+    OrderByEnum,
+    Page,
+    filter_criteria,
+    make_page,
+    paginate,
+)
 from users_api.db.base_class import Base
 
 ModelType = TypeVar("ModelType", bound=Base)
@@ -13,16 +27,416 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+def get_columns(model: type[Base], names: Iterable[str] | None = None) -> list[Column]:
+    """Get the table columns of a model.
+
+    Args:
+        model (type[Base]): A SQLAlchemy model class
+        names (Iterable[str] | None): Names of the columns to get.
+            Defaults to all the columns.
+
+    Returns:
+        list[Column]: The columns
+    """
+    columns = model.__table__.columns
+    if names is None:
+        return list(columns)
+    return [columns[name] for name in names]
+
+
+def uuid_in(model: type[Base], uuids: Iterable[Any]) -> ColumnElement:
+    """Build a `uuid = ANY(:uuids)` criterion, binding the uuids as a single array.
+
+    Unlike IN, the SQL is the same for any number of uuids, so asyncpg prepares
+    it only once. Postgres still looks them up with the index on uuid.
+
+    Args:
+        model (type[Base]): A SQLAlchemy model class
+        uuids (Iterable[Any]): The uuids to match
+
+    Returns:
+        ColumnElement: The criterion
+    """
+    uuids_type = ARRAY(model.uuid.type)
+    return model.uuid == any_(bindparam("uuids", list(uuids), type_=uuids_type))
+
+
+def select_page(
+    model: type[Base], columns: Iterable[str] | None, *, order_by: OrderByEnum
+) -> Select:
+    """Build the SELECT statement of a page, of ORM objects or of some columns.
+
+    Selecting columns skips loading ORM objects and the identity map, and only
+    transfers the needed values from Postgres. The columns of the ordering key
+    are added to them, as the cursor to the next page is made of their values.
+
+    Args:
+        model (type[Base]): A SQLAlchemy model class
+        columns (Iterable[str] | None): Columns to select, or None to select
+            ORM objects
+        order_by (OrderByEnum): Ordering key of the page
+
+    Returns:
+        Select: The statement
+    """
+    if columns is None:
+        return select(model)
+    names = dict.fromkeys([*columns, *ORDER_BY_COLUMNS[order_by]])
+    return select(*get_columns(model, names))
+
+
+def get_multi_stmt(
+    model: type[Base],
+    *,
+    limit: int,
+    cursor: str | None,
+    order_by: OrderByEnum,
+    descending: bool,
+    filters: dict[str, Any] | None,
+    columns: Iterable[str] | None,
+) -> Select:
+    """Build the statement of CRUDBase.get_multi.
+
+    Args:
+        model (type[Base]): A SQLAlchemy model class
+        limit (int): How many rows to return
+        cursor (str | None): Cursor of the previous page
+        order_by (OrderByEnum): Ordering key
+        descending (bool): Whether to sort in descending order
+        filters (dict[str, Any] | None): Values to filter by
+        columns (Iterable[str] | None): Columns to select, or None to select
+            ORM objects
+
+    Returns:
+        Select: The statement
+    """
+    stmt = select_page(model, columns, order_by=order_by)
+    stmt = stmt.where(*filter_criteria(model, filters or {}))
+    return paginate(
+        stmt,
+        model,
+        limit=limit,
+        cursor=cursor,
+        order_by=order_by,
+        descending=descending,
+    )
+
+
+def get_multi_result(
+    result: Result, columns: Iterable[str] | None
+) -> list[Base] | list[Row]:
+    """Get the rows, or the ORM objects, selected by a get_multi_stmt statement.
+
+    Args:
+        result (Result): The result of the statement
+        columns (Iterable[str] | None): The columns passed to get_multi_stmt
+
+    Returns:
+        list[Base] | list[Row]: The retrieved rows
+    """
+    return result.all() if columns is not None else result.scalars().all()
+
+
+def stream_stmt(
+    model: type[Base],
+    *,
+    columns: Iterable[str] | None,
+    filters: dict[str, Any] | None,
+) -> Select:
+    """Build the statement of CRUDBase.stream, read with a server-side cursor.
+
+    Args:
+        model (type[Base]): A SQLAlchemy model class
+        columns (Iterable[str] | None): Columns to select. Defaults to all.
+        filters (dict[str, Any] | None): Values to filter by
+
+    Returns:
+        Select: The statement
+    """
+    return (
+        select(*get_columns(model, columns))
+        .where(*filter_criteria(model, filters or {}))
+        .order_by(model.id)
+        .execution_options(stream_results=True)
+    )
+
+
+def get_create_data(obj_in: BaseModel | dict[str, Any]) -> dict[str, Any]:
+    """Get the values of a new row from a schema or dict.
+
+    Args:
+        obj_in (BaseModel | dict[str, Any]): Object to create
+
+    Returns:
+        dict[str, Any]: The values of the new row
+    """
+    if isinstance(obj_in, dict):
+        return dict(obj_in)
+    return obj_in.dict(by_alias=False)
+
+
+def get_insert_values(db_obj: Base) -> dict[str, Any]:
+    """Get the column values set on a new ORM object.
+
+    Args:
+        db_obj (Base): A transient ORM object
+
+    Returns:
+        dict[str, Any]: The values to insert, by column key
+    """
+    state = inspect(db_obj)
+    return {
+        attr.key: state.dict[attr.key]
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict
+    }
+
+
+def insert_stmt(model: type[Base], db_obj: Base) -> Insert:
+    """Build the INSERT ... RETURNING statement of a new ORM object.
+
+    Server side defaults (uuid, created_at, updated_at) are read from the
+    RETURNING clause instead of refreshing the object afterwards.
+
+    Args:
+        model (type[Base]): A SQLAlchemy model class
+        db_obj (Base): A transient ORM object
+
+    Returns:
+        Insert: The statement
+    """
+    return (
+        pg_insert(model)
+        .values(**get_insert_values(db_obj))
+        .returning(*get_columns(model))
+    )
+
+
+def first_indexes(values: list[dict[str, Any]], key: str) -> list[int]:
+    """Get the index of the first dict holding each distinct value of key.
+
+    Args:
+        values (list[dict[str, Any]]): Values of the new rows
+        key (str): Name of the unique column
+
+    Returns:
+        list[int]: The indexes, in ascending order
+    """
+    indexes: dict[Any, int] = {}
+    for i, row in enumerate(values):
+        indexes.setdefault(row[key], i)
+    return list(indexes.values())
+
+
+def first_create_data(
+    objs_in: list[Any], *, conflict_column: str
+) -> tuple[list[int], list[dict[str, Any]]]:
+    """Get the values of the rows of a multi-row INSERT, skipping duplicates.
+
+    Args:
+        objs_in (list[Any]): Schemas or dicts of the objects to create
+        conflict_column (str): Unique column whose duplicates are skipped
+
+    Returns:
+        tuple[list[int], list[dict[str, Any]]]: The index in objs_in of the first
+            object with each value of conflict_column, and the values of these
+    """
+    values = [get_create_data(obj_in) for obj_in in objs_in]
+    indexes = first_indexes(values, conflict_column)
+    return indexes, [values[i] for i in indexes]
+
+
+def scatter_results(
+    size: int, indexes: list[int], inserted: list[Base | None]
+) -> list[Base | None]:
+    """Put the results of a multi-row INSERT back at the indexes of its objects.
+
+    Args:
+        size (int): How many objects were to be created
+        indexes (list[int]): The indexes returned by first_create_data
+        inserted (list[Base | None]): The objects returned by the INSERT
+
+    Returns:
+        list[Base | None]: For each object to create, the created object, or None
+            if it was a duplicate
+    """
+    results: list[Base | None] = [None] * size
+    for i, db_obj in zip(indexes, inserted):
+        results[i] = db_obj
+    return results
+
+
+def insert_multi_stmt(
+    model: type[Base], db_objs: list[Base], *, conflict_column: str
+) -> Insert:
+    """Build a multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING statement.
+
+    Every VALUES row must set the same columns, so columns missing from some of
+    the objects are set to their scalar default, or NULL.
+
+    Args:
+        model (type[Base]): A SQLAlchemy model class
+        db_objs (list[Base]): Transient ORM objects to insert
+        conflict_column (str): Unique column whose conflicts are skipped
+
+    Returns:
+        Insert: The statement
+    """
+    values = [get_insert_values(db_obj) for db_obj in db_objs]
+    keys = {key for row in values for key in row}
+    columns = model.__table__.columns
+    for key in keys:
+        default = columns[key].default
+        fill = default.arg if default is not None and default.is_scalar else None
+        for row in values:
+            row.setdefault(key, fill)
+    return (
+        pg_insert(model)
+        .values(values)
+        .on_conflict_do_nothing(index_elements=[conflict_column])
+        .returning(*get_columns(model))
+    )
+
+
+def match_returned_rows(
+    db_objs: list[Base], rows: list[Row], *, conflict_column: str
+) -> list[Base | None]:
+    """Load the rows returned by a multi-row INSERT into the objects they belong to.
+
+    Args:
+        db_objs (list[Base]): The objects passed to insert_multi_stmt
+        rows (list[Row]): The rows returned by the INSERT
+        conflict_column (str): Unique column used to match rows and objects
+
+    Returns:
+        list[Base | None]: For each object, the object itself if it was inserted,
+            or None if it conflicted with an existing row
+    """
+    returned = {row._mapping[conflict_column]: row for row in rows}
+    results: list[Base | None] = []
+    for db_obj in db_objs:
+        row = returned.get(getattr(db_obj, conflict_column))
+        if row is None:
+            results.append(None)
+        else:
+            set_returned_values(db_obj, row)
+            results.append(db_obj)
+    return results
+
+
+def set_returned_values(db_obj: Base, row: Row) -> None:
+    """Load the values returned by INSERT ... RETURNING into a new ORM object.
+
+    The object is then handled as if it had been loaded from the db, so adding it
+    to a session doesn't insert it again nor refresh it.
+
+    Args:
+        db_obj (Base): A transient ORM object
+        row (Row): The row returned by the INSERT
+    """
+    for key, value in row._mapping.items():
+        setattr(db_obj, key, value)
+    make_transient_to_detached(db_obj)
+
+
+def get_update_data(obj_in: BaseModel | dict[str, Any]) -> dict[str, Any]:
+    """Get the values to update from a schema or dict.
+
+    Args:
+        obj_in (BaseModel | dict[str, Any]): New values to apply.
+            Only fields explicitly set in a schema are included.
+
+    Returns:
+        dict[str, Any]: The values to update
+    """
+    if isinstance(obj_in, dict):
+        return obj_in
+    return obj_in.dict(exclude_unset=True, by_alias=False)
+
+
+def apply_update(db_obj: Base, obj_in: BaseModel | dict[str, Any]) -> None:
+    """Set the new values of an ORM object, before it's saved.
+
+    Args:
+        db_obj (Base): Old object in db
+        obj_in (BaseModel | dict[str, Any]): New values to apply.
+            Only fields explicitly set in a schema are applied.
+    """
+    obj_data = jsonable_encoder(db_obj, by_alias=False)
+    if isinstance(obj_in, dict):
+        update_data = obj_in
+    else:
+        update_data = jsonable_encoder(obj_in, exclude_unset=True, by_alias=False)
+    for field in obj_data:
+        if field in update_data:
+            setattr(db_obj, field, update_data[field])
+
+
+def update_by_uuid_stmt(
+    model: type[Base],
+    uuid: Any,
+    obj_in: BaseModel | dict[str, Any],
+    columns: Iterable[str] | None = None,
+) -> Update:
+    """Build the UPDATE ... RETURNING statement of a row.
+
+    Args:
+        model (type[Base]): A SQLAlchemy model class
+        uuid (Any): The uuid of the row to update
+        obj_in (BaseModel | dict[str, Any]): New values to apply
+        columns (Iterable[str] | None): Columns to return. Defaults to all.
+
+    Returns:
+        Update: The statement
+    """
+    return (
+        update(model)
+        .where(model.uuid == uuid)
+        .values(**get_update_data(obj_in))
+        .returning(*get_columns(model, columns))
+    )
+
+
+def remove_by_uuid_stmt(
+    model: type[Base], uuid: Any, columns: Iterable[str] = ("id",)
+) -> Delete:
+    """Build the DELETE ... RETURNING statement of a row.
+
+    Args:
+        model (type[Base]): A SQLAlchemy model class
+        uuid (Any): The uuid of the row to remove
+        columns (Iterable[str]): Columns to return. Defaults to the id.
+
+    Returns:
+        Delete: The statement
+    """
+    return (
+        delete(model).where(model.uuid == uuid).returning(*get_columns(model, columns))
+    )
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     """Base CRUD class."""
 
-    def __init__(self, model: type[ModelType]):
+    def __init__(self, model: type[ModelType], cache: ModelCache | None = None):
         """CRUD object with default methods to Create, Read, Update, Delete (CRUD).
 
         Args:
             model (Type[ModelType]): A SQLAlchemy model class
+            cache (ModelCache | None): Cache whose rows are invalidated on write.
+                Defaults to None.
         """
         self.model = model
+        self.cache = cache
+
+    def _invalidate(self, uuid: Any) -> None:
+        """Remove a row from the cache, if any.
+
+        Args:
+            uuid (Any): The uuid of the row
+        """
+        if self.cache is not None:
+            self.cache.delete(uuid)
 
     def get(self, db: Session, id: Any) -> ModelType | None:
         """Get a single row by id.
@@ -34,7 +448,9 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         Returns:
             Optional[ModelType]: The retrieved row
         """
-        return db.query(self.model).filter(self.model.id == id).first()
+        return (
+            db.execute(select(self.model).where(self.model.id == id)).scalars().first()
+        )
 
     def get_by_uuid(self, db: Session, uuid: Any) -> ModelType | None:
         """Get a single row by uuid.
@@ -46,27 +462,146 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         Returns:
             Optional[ModelType]: The retrieved row
         """
-        return db.query(self.model).filter(self.model.uuid == uuid).first()
+        stmt = select(self.model).where(self.model.uuid == uuid)
+        return db.execute(stmt).scalars().first()
+
+    def get_row_by_uuid(
+        self, db: Session, *, uuid: Any, columns: Iterable[str] | None = None
+    ) -> Row | None:
+        """Get some columns of a single row by uuid, without loading an ORM object.
+
+        Args:
+            db (Session): A database session
+            uuid (Any): The uuid to retrieve
+            columns (Iterable[str] | None): Columns to return. Defaults to all.
+
+        Returns:
+            Optional[Row]: The retrieved row
+        """
+        stmt = select(*get_columns(self.model, columns)).where(self.model.uuid == uuid)
+        return db.execute(stmt).first()
+
+    def get_rows_by_uuids(
+        self, db: Session, *, uuids: Iterable[Any], columns: Iterable[str] | None = None
+    ) -> list[Row]:
+        """Get some columns of the rows with any of the given uuids, in one query.
+
+        Args:
+            db (Session): A database session
+            uuids (Iterable[Any]): The uuids to retrieve
+            columns (Iterable[str] | None): Columns to return. Defaults to all.
+
+        Returns:
+            list[Row]: The retrieved rows, in no particular order
+        """
+        stmt = select(*get_columns(self.model, columns)).where(
+            uuid_in(self.model, uuids)
+        )
+        return db.execute(stmt).all()
 
     def get_multi(
         self,
         db: Session,
         *,
-        skip: int = 0,
         limit: int = 1000,
-    ) -> list[ModelType]:
-        """Get many rows.
+        cursor: str | None = None,
+        order_by: OrderByEnum = OrderByEnum.created_at,
+        descending: bool = False,
+        filters: dict[str, Any] | None = None,
+        columns: Iterable[str] | None = None,
+    ) -> list[ModelType] | list[Row]:
+        """Get many rows, using keyset pagination.
 
         Args:
             db (Session): A database session
-            skip (int): How many rows to skip. Defaults to 0.
             limit (int): How many rows to return. Defaults to 1000.
+            cursor (str | None): Cursor of the previous page. Defaults to None.
+            order_by (OrderByEnum): Ordering key. Defaults to created_at.
+            descending (bool): Whether to sort in descending order. Defaults to False.
+            filters (dict[str, Any] | None): Values to filter by. Defaults to None.
+            columns (Iterable[str] | None): Columns to return, as rows instead of ORM
+                objects. The columns of the ordering key are always returned.
+                Defaults to ORM objects.
+
+        Returns:
+            list[ModelType] | list[Row]: The retrieved rows
+        """
+        stmt = get_multi_stmt(
+            self.model,
+            limit=limit,
+            cursor=cursor,
+            order_by=order_by,
+            descending=descending,
+            filters=filters,
+            columns=columns,
+        )
+        return get_multi_result(db.execute(stmt), columns)
+
+    def get_page(
+        self,
+        db: Session,
+        *,
+        limit: int = 1000,
+        cursor: str | None = None,
+        order_by: OrderByEnum = OrderByEnum.created_at,
+        descending: bool = False,
+        filters: dict[str, Any] | None = None,
+        columns: Iterable[str] | None = None,
+    ) -> Page:
+        """Get a page of rows, and the cursor to the next one.
+
+        Args:
+            db (Session): A database session
+            limit (int): Page size. Defaults to 1000.
+            cursor (str | None): Cursor of the previous page. Defaults to None.
+            order_by (OrderByEnum): Ordering key. Defaults to created_at.
+            descending (bool): Whether to sort in descending order. Defaults to False.
+            filters (dict[str, Any] | None): Values to filter by. Defaults to None.
+            columns (Iterable[str] | None): Columns to return, as rows instead of ORM
+                objects. Defaults to ORM objects.
 
         Returns:
-            list[ModelType]: The retrieved rows
+            Page: The retrieved rows and the next page cursor
+        """
+        # Fetch one more row to know whether there's a next page
+        rows = self.get_multi(
+            db,
+            limit=limit + 1,
+            cursor=cursor,
+            order_by=order_by,
+            descending=descending,
+            filters=filters,
+            columns=columns,
+        )
+        return make_page(rows, limit=limit, order_by=order_by, descending=descending)
+
+    def stream(
+        self,
+        db: Session,
+        *,
+        columns: Iterable[str] | None = None,
+        batch_size: int = 1000,
+        filters: dict[str, Any] | None = None,
+    ) -> Iterator[list[Row]]:
+        """Iterate over every row using a server-side cursor.
+
+        Rows are fetched batch_size at a time, so memory use doesn't depend on the
+        size of the table. The session must stay open until iteration ends.
+
+        Args:
+            db (Session): A database session
+            columns (Iterable[str] | None): Columns to return. Defaults to all.
+            batch_size (int): Rows fetched at a time. Defaults to 1000.
+            filters (dict[str, Any] | None): Values to filter by. Defaults to None.
+
+        Yields:
+            list[Row]: Batches of rows, ordered by id
         """
-        # Construct the actual query
-        return db.query(self.model).offset(skip).limit(limit).all()
+        result = db.execute(stream_stmt(self.model, columns=columns, filters=filters))
+        try:
+            yield from result.yield_per(batch_size).partitions()
+        finally:
+            result.close()
 
     def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
         """Create a new row.
@@ -78,13 +613,77 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         Returns:
             ModelType: The created object
         """
-        obj_in_data = jsonable_encoder(obj_in, by_alias=False)
-        db_obj = self.model(**obj_in_data)  # type: ignore
-        db.add(db_obj)
+        db_obj = self.model(**get_create_data(obj_in))  # type: ignore
+        return self._insert(db, db_obj)
+
+    def _insert(self, db: Session, db_obj: ModelType) -> ModelType:
+        """Insert a new ORM object with a single INSERT ... RETURNING statement.
+
+        Server side defaults (uuid, created_at, updated_at) are read from the
+        RETURNING clause instead of refreshing the object afterwards.
+
+        Args:
+            db (Session): A database session
+            db_obj (ModelType): A transient ORM object
+
+        Returns:
+            ModelType: The inserted object, attached to the session
+        """
+        row = db.execute(insert_stmt(self.model, db_obj)).one()
         db.commit()
-        db.refresh(db_obj)
+        set_returned_values(db_obj, row)
+        db.add(db_obj)
         return db_obj
 
+    def create_multi(
+        self,
+        db: Session,
+        *,
+        objs_in: list[CreateSchemaType],
+        conflict_column: str,
+    ) -> list[ModelType | None]:
+        """Create many rows with a single multi-row INSERT statement.
+
+        Rows that conflict on conflict_column, with an existing row or with an
+        earlier item of objs_in, are skipped instead of failing the whole batch.
+
+        Args:
+            db (Session): A database session
+            objs_in (list[CreateSchemaType]): Objects to create
+            conflict_column (str): Unique column whose conflicts are skipped
+
+        Returns:
+            list[ModelType | None]: For each item of objs_in, the created object,
+                or None if it was a duplicate
+        """
+        indexes, values = first_create_data(objs_in, conflict_column=conflict_column)
+        db_objs = [self.model(**row) for row in values]  # type: ignore
+        inserted = self._insert_multi(db, db_objs, conflict_column=conflict_column)
+        return scatter_results(len(objs_in), indexes, inserted)
+
+    def _insert_multi(
+        self, db: Session, db_objs: list[ModelType], *, conflict_column: str
+    ) -> list[ModelType | None]:
+        """Insert new ORM objects with a single INSERT ... ON CONFLICT DO NOTHING.
+
+        Args:
+            db (Session): A database session
+            db_objs (list[ModelType]): Transient ORM objects
+            conflict_column (str): Unique column whose conflicts are skipped
+
+        Returns:
+            list[ModelType | None]: For each object, the object itself attached to
+                the session, or None if it conflicted with an existing row
+        """
+        if not db_objs:
+            return []
+        stmt = insert_multi_stmt(self.model, db_objs, conflict_column=conflict_column)
+        rows = db.execute(stmt).all()
+        db.commit()
+        results = match_returned_rows(db_objs, rows, conflict_column=conflict_column)
+        db.add_all(db_obj for db_obj in results if db_obj is not None)
+        return results
+
     def update(
         self,
         db: Session,
@@ -102,19 +701,49 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         Returns:
             ModelType: The updated row
         """
-        obj_data = jsonable_encoder(db_obj, by_alias=False)
-        if isinstance(obj_in, dict):
-            update_data = obj_in
-        else:
-            update_data = jsonable_encoder(obj_in, exclude_unset=True, by_alias=False)
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
+        apply_update(db_obj, obj_in)
+        return self._save(db, db_obj)
+
+    def _save(self, db: Session, db_obj: ModelType) -> ModelType:
+        """Commit the changes made to an ORM object, and reload it.
+
+        Args:
+            db (Session): A database session
+            db_obj (ModelType): The changed object
+
+        Returns:
+            ModelType: The saved object
+        """
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        self._invalidate(db_obj.uuid)
         return db_obj
 
+    def update_by_uuid(
+        self,
+        db: Session,
+        *,
+        uuid: Any,
+        obj_in: UpdateSchemaType | dict[str, Any],
+        columns: Iterable[str] | None = None,
+    ) -> Row | None:
+        """Update a row by uuid with a single UPDATE ... RETURNING statement.
+
+        Args:
+            db (Session): A database session
+            uuid (Any): The uuid of the row to update
+            obj_in (UpdateSchemaType | dict[str, Any]): New values to apply
+            columns (Iterable[str] | None): Columns to return. Defaults to all.
+
+        Returns:
+            Optional[Row]: The updated row, or None if no row has the given uuid
+        """
+        row = db.execute(update_by_uuid_stmt(self.model, uuid, obj_in, columns)).first()
+        db.commit()
+        self._invalidate(uuid)
+        return row
+
     def remove(self, db: Session, *, id: int) -> ModelType:
         """Remove a row by id.
 
@@ -126,6 +755,23 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             ModelType: The removed resource
         """
         obj = db.query(self.model).get(id)
+        uuid = obj.uuid
         db.delete(obj)
         db.commit()
+        self._invalidate(uuid)
         return obj
+
+    def remove_by_uuid(self, db: Session, *, uuid: Any) -> int | None:
+        """Remove a row by uuid with a single DELETE ... RETURNING statement.
+
+        Args:
+            db (Session): A database session
+            uuid (Any): The uuid of the row to remove
+
+        Returns:
+            Optional[int]: Id of the removed row, or None if no row has the given uuid
+        """
+        id = db.execute(remove_by_uuid_stmt(self.model, uuid)).scalar()
+        db.commit()
+        self._invalidate(uuid)
+        return id
@@ -0,0 +1,451 @@
+"""Base async CRUD implementation."""
+
+import functools
+import inspect
+from typing import Any, AsyncIterator, Generic, Iterable
+
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from users_api.cache import ModelCache
+from users_api.crud.base import (
+    CreateSchemaType,
+    ModelType,
+    UpdateSchemaType,
+    apply_update,
+    first_create_data,
+    get_columns,
+    get_create_data,
+    get_multi_result,
+    get_multi_stmt,
+    insert_multi_stmt,
+    insert_stmt,
+    match_returned_rows,
+    remove_by_uuid_stmt,
+    scatter_results,
+    set_returned_values,
+    stream_stmt,
+    update_by_uuid_stmt,
+    uuid_in,
+)
+from users_api.crud.pagination import OrderByEnum, Page, make_page
+
+
+class AsyncCRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    """Base async CRUD class."""
+
+    def __init__(self, model: type[ModelType], cache: ModelCache | None = None):
+        """CRUD object with default async methods to Create, Read, Update, Delete.
+
+        Args:
+            model (Type[ModelType]): A SQLAlchemy model class
+            cache (ModelCache | None): Cache whose rows are invalidated on write.
+                Defaults to None.
+        """
+        self.model = model
+        self.cache = cache
+
+    async def _invalidate(self, uuid: Any) -> None:
+        """Remove a row from the cache, if any.
+
+        Args:
+            uuid (Any): The uuid of the row
+        """
+        if self.cache is not None:
+            await self.cache.delete_async(uuid)
+
+    async def get(self, db: AsyncSession, id: Any) -> ModelType | None:
+        """Get a single row by id.
+
+        Args:
+            db (AsyncSession): An async database session
+            id (Any): The id to retrieve
+
+        Returns:
+            Optional[ModelType]: The retrieved row
+        """
+        result = await db.execute(select(self.model).where(self.model.id == id))
+        return result.scalars().first()
+
+    async def get_by_uuid(self, db: AsyncSession, uuid: Any) -> ModelType | None:
+        """Get a single row by uuid.
+
+        Args:
+            db (AsyncSession): An async database session
+            uuid (Any): The uuid to retrieve
+
+        Returns:
+            Optional[ModelType]: The retrieved row
+        """
+        result = await db.execute(select(self.model).where(self.model.uuid == uuid))
+        return result.scalars().first()
+
+    async def get_row_by_uuid(
+        self, db: AsyncSession, *, uuid: Any, columns: Iterable[str] | None = None
+    ) -> Row | None:
+        """Get some columns of a single row by uuid, without loading an ORM object.
+
+        Args:
+            db (AsyncSession): An async database session
+            uuid (Any): The uuid to retrieve
+            columns (Iterable[str] | None): Columns to return. Defaults to all.
+
+        Returns:
+            Optional[Row]: The retrieved row
+        """
+        stmt = select(*get_columns(self.model, columns)).where(self.model.uuid == uuid)
+        result = await db.execute(stmt)
+        return result.first()
+
+    async def get_rows_by_uuids(
+        self,
+        db: AsyncSession,
+        *,
+        uuids: Iterable[Any],
+        columns: Iterable[str] | None = None,
+    ) -> list[Row]:
+        """Get some columns of the rows with any of the given uuids, in one query.
+
+        Args:
+            db (AsyncSession): An async database session
+            uuids (Iterable[Any]): The uuids to retrieve
+            columns (Iterable[str] | None): Columns to return. Defaults to all.
+
+        Returns:
+            list[Row]: The retrieved rows, in no particular order
+        """
+        stmt = select(*get_columns(self.model, columns)).where(
+            uuid_in(self.model, uuids)
+        )
+        result = await db.execute(stmt)
+        return result.all()
+
+    async def get_multi(
+        self,
+        db: AsyncSession,
+        *,
+        limit: int = 1000,
+        cursor: str | None = None,
+        order_by: OrderByEnum = OrderByEnum.created_at,
+        descending: bool = False,
+        filters: dict[str, Any] | None = None,
+        columns: Iterable[str] | None = None,
+    ) -> list[ModelType] | list[Row]:
+        """Get many rows, using keyset pagination.
+
+        Args:
+            db (AsyncSession): An async database session
+            limit (int): How many rows to return. Defaults to 1000.
+            cursor (str | None): Cursor of the previous page. Defaults to None.
+            order_by (OrderByEnum): Ordering key. Defaults to created_at.
+            descending (bool): Whether to sort in descending order. Defaults to False.
+            filters (dict[str, Any] | None): Values to filter by. Defaults to None.
+            columns (Iterable[str] | None): Columns to return, as rows instead of ORM
+                objects. The columns of the ordering key are always returned.
+                Defaults to ORM objects.
+
+        Returns:
+            list[ModelType] | list[Row]: The retrieved rows
+        """
+        stmt = get_multi_stmt(
+            self.model,
+            limit=limit,
+            cursor=cursor,
+            order_by=order_by,
+            descending=descending,
+            filters=filters,
+            columns=columns,
+        )
+        return get_multi_result(await db.execute(stmt), columns)
+
+    async def get_page(
+        self,
+        db: AsyncSession,
+        *,
+        limit: int = 1000,
+        cursor: str | None = None,
+        order_by: OrderByEnum = OrderByEnum.created_at,
+        descending: bool = False,
+        filters: dict[str, Any] | None = None,
+        columns: Iterable[str] | None = None,
+    ) -> Page:
+        """Get a page of rows, and the cursor to the next one.
+
+        Args:
+            db (AsyncSession): An async database session
+            limit (int): Page size. Defaults to 1000.
+            cursor (str | None): Cursor of the previous page. Defaults to None.
+            order_by (OrderByEnum): Ordering key. Defaults to created_at.
+            descending (bool): Whether to sort in descending order. Defaults to False.
+            filters (dict[str, Any] | None): Values to filter by. Defaults to None.
+            columns (Iterable[str] | None): Columns to return, as rows instead of ORM
+                objects. Defaults to ORM objects.
+
+        Returns:
+            Page: The retrieved rows and the next page cursor
+        """
+        # Fetch one more row to know whether there's a next page
+        rows = await self.get_multi(
+            db,
+            limit=limit + 1,
+            cursor=cursor,
+            order_by=order_by,
+            descending=descending,
+            filters=filters,
+            columns=columns,
+        )
+        return make_page(rows, limit=limit, order_by=order_by, descending=descending)
+
+    async def stream(
+        self,
+        db: AsyncSession,
+        *,
+        columns: Iterable[str] | None = None,
+        batch_size: int = 1000,
+        filters: dict[str, Any] | None = None,
+    ) -> AsyncIterator[list[Row]]:
+        """Iterate over every row using a server-side cursor.
+
+        Rows are fetched batch_size at a time, so memory use doesn't depend on the
+        size of the table. The session must stay open until iteration ends.
+
+        Args:
+            db (AsyncSession): An async database session
+            columns (Iterable[str] | None): Columns to return. Defaults to all.
+            batch_size (int): Rows fetched at a time. Defaults to 1000.
+            filters (dict[str, Any] | None): Values to filter by. Defaults to None.
+
+        Yields:
+            list[Row]: Batches of rows, ordered by id
+        """
+        stmt = stream_stmt(self.model, columns=columns, filters=filters)
+        result = await db.stream(stmt)
+        try:
+            async for partition in result.yield_per(batch_size).partitions():
+                yield partition
+        finally:
+            await result.close()
+
+    async def create(self, db: AsyncSession, *, obj_in: CreateSchemaType) -> ModelType:
+        """Create a new row.
+
+        Args:
+            db (AsyncSession): An async database session
+            obj_in: (CreateSchemaType) Object to create
+
+        Returns:
+            ModelType: The created object
+        """
+        db_obj = self.model(**get_create_data(obj_in))  # type: ignore
+        return await self._insert(db, db_obj)
+
+    async def _insert(self, db: AsyncSession, db_obj: ModelType) -> ModelType:
+        """Insert a new ORM object with a single INSERT ... RETURNING statement.
+
+        Server side defaults (uuid, created_at, updated_at) are read from the
+        RETURNING clause instead of refreshing the object afterwards.
+
+        Args:
+            db (AsyncSession): An async database session
+            db_obj (ModelType): A transient ORM object
+
+        Returns:
+            ModelType: The inserted object, attached to the session
+        """
+        result = await db.execute(insert_stmt(self.model, db_obj))
+        row = result.one()
+        await db.commit()
+        set_returned_values(db_obj, row)
+        db.add(db_obj)
+        return db_obj
+
+    async def create_multi(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: list[CreateSchemaType],
+        conflict_column: str,
+    ) -> list[ModelType | None]:
+        """Create many rows with a single multi-row INSERT statement.
+
+        Rows that conflict on conflict_column, with an existing row or with an
+        earlier item of objs_in, are skipped instead of failing the whole batch.
+
+        Args:
+            db (AsyncSession): An async database session
+            objs_in (list[CreateSchemaType]): Objects to create
+            conflict_column (str): Unique column whose conflicts are skipped
+
+        Returns:
+            list[ModelType | None]: For each item of objs_in, the created object,
+                or None if it was a duplicate
+        """
+        indexes, values = first_create_data(objs_in, conflict_column=conflict_column)
+        db_objs = [self.model(**row) for row in values]  # type: ignore
+        inserted = await self._insert_multi(
+            db, db_objs, conflict_column=conflict_column
+        )
+        return scatter_results(len(objs_in), indexes, inserted)
+
+    async def _insert_multi(
+        self, db: AsyncSession, db_objs: list[ModelType], *, conflict_column: str
+    ) -> list[ModelType | None]:
+        """Insert new ORM objects with a single INSERT ... ON CONFLICT DO NOTHING.
+
+        Args:
+            db (AsyncSession): An async database session
+            db_objs (list[ModelType]): Transient ORM objects
+            conflict_column (str): Unique column whose conflicts are skipped
+
+        Returns:
+            list[ModelType | None]: For each object, the object itself attached to
+                the session, or None if it conflicted with an existing row
+        """
+        if not db_objs:
+            return []
+        stmt = insert_multi_stmt(self.model, db_objs, conflict_column=conflict_column)
+        result = await db.execute(stmt)
+        rows = result.all()
+        await db.commit()
+        results = match_returned_rows(db_objs, rows, conflict_column=conflict_column)
+        db.add_all(db_obj for db_obj in results if db_obj is not None)
+        return results
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: ModelType,
+        obj_in: UpdateSchemaType,
+    ) -> ModelType:
+        """Update a row.
+
+        Args:
+            db (AsyncSession): An async database session
+            db_obj (ModelType): Old object in db
+            obj_in (UpdateSchemaType): New values to apply
+
+        Returns:
+            ModelType: The updated row
+        """
+        apply_update(db_obj, obj_in)
+        return await self._save(db, db_obj)
+
+    async def _save(self, db: AsyncSession, db_obj: ModelType) -> ModelType:
+        """Commit the changes made to an ORM object, and reload it.
+
+        Args:
+            db (AsyncSession): An async database session
+            db_obj (ModelType): The changed object
+
+        Returns:
+            ModelType: The saved object
+        """
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        await self._invalidate(db_obj.uuid)
+        return db_obj
+
+    async def update_by_uuid(
+        self,
+        db: AsyncSession,
+        *,
+        uuid: Any,
+        obj_in: UpdateSchemaType | dict[str, Any],
+        columns: Iterable[str] | None = None,
+    ) -> Row | None:
+        """Update a row by uuid with a single UPDATE ... RETURNING statement.
+
+        Args:
+            db (AsyncSession): An async database session
+            uuid (Any): The uuid of the row to update
+            obj_in (UpdateSchemaType | dict[str, Any]): New values to apply
+            columns (Iterable[str] | None): Columns to return. Defaults to all.
+
+        Returns:
+            Optional[Row]: The updated row, or None if no row has the given uuid
+        """
+        stmt = update_by_uuid_stmt(self.model, uuid, obj_in, columns)
+        result = await db.execute(stmt)
+        row = result.first()
+        await db.commit()
+        await self._invalidate(uuid)
+        return row
+
+    async def remove(self, db: AsyncSession, *, id: int) -> ModelType:
+        """Remove a row by id.
+
+        Args:
+            db (AsyncSession): An async database session
+            id (int): Id of resource to remove
+
+        Returns:
+            ModelType: The removed resource
+        """
+        obj = await db.get(self.model, id)
+        uuid = obj.uuid
+        await db.delete(obj)
+        await db.commit()
+        await self._invalidate(uuid)
+        return obj
+
+    async def remove_by_uuid(self, db: AsyncSession, *, uuid: Any) -> int | None:
+        """Remove a row by uuid with a single DELETE ... RETURNING statement.
+
+        Args:
+            db (AsyncSession): An async database session
+            uuid (Any): The uuid of the row to remove
+
+        Returns:
+            Optional[int]: Id of the removed row, or None if no row has the given uuid
+        """
+        result = await db.execute(remove_by_uuid_stmt(self.model, uuid))
+        id = result.scalar()
+        await db.commit()
+        await self._invalidate(uuid)
+        return id
+
+
+class ThreadpoolCRUD:
+    """Awaitable wrapper around a sync CRUD object.
+
+    Every method call runs in a threadpool, so sync database sessions don't block
+    the event loop. Generator methods return async iterators instead, which run
+    each step in the threadpool. This gives the API the same interface as the
+    async CRUD classes when DB_ASYNC is disabled.
+    """
+
+    def __init__(self, crud: Any):
+        """Wrap a sync CRUD object.
+
+        Args:
+            crud (Any): The sync CRUD object to wrap
+        """
+        self.crud = crud
+
+    def __getattr__(self, name: str) -> Any:
+        """Get an awaitable version of the wrapped CRUD's methods."""
+        attr = getattr(self.crud, name)
+        if not (inspect.ismethod(attr) or inspect.isfunction(attr)):
+            return attr
+
+        if inspect.isgeneratorfunction(attr):
+
+            @functools.wraps(attr)
+            def iterator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                return iterate_in_threadpool(attr(*args, **kwargs))
+
+            return iterator_wrapper
+
+        @functools.wraps(attr)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return await run_in_threadpool(attr, *args, **kwargs)
+
+        return wrapper
+
+    def __repr__(self) -> str:
+        """Return the string representation of the wrapper."""
+        return f"{self.__class__.__name__}({self.crud!r})"
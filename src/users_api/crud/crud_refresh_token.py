@@ -0,0 +1,230 @@
+"""CRUD for refresh tokens."""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+from uuid import UUID
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Delete, Update
+from sqlalchemy.sql.functions import now
+
+from users_api.api import security
+from users_api.models.refresh_token import RefreshToken
+from users_api.models.user import User
+from users_api.settings import get_settings
+
+settings = get_settings()
+
+
+class RotatedToken(NamedTuple):
+    """A new refresh token, and the User it belongs to."""
+
+    user_uuid: UUID
+    refresh_token: str
+    is_superuser: bool = False
+    token_version: int = 0
+
+
+def build_refresh_token(user_id: int, family_id: UUID | None = None) -> tuple:
+    """Build a new refresh token.
+
+    Args:
+        user_id (int): Id of the User it belongs to
+        family_id (UUID | None): Family of the token it replaces.
+            Defaults to a new family.
+
+    Returns:
+        tuple: The plain token, to send to the client, and the transient
+            RefreshToken holding its hash
+    """
+    token = security.generate_refresh_token()
+    db_obj = RefreshToken(
+        token_hash=security.hash_refresh_token(token),
+        user_id=user_id,
+        family_id=family_id or uuid.uuid4(),
+        expires_at=datetime.now(timezone.utc)
+        + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    return token, db_obj
+
+
+def use_token_stmt(token_hash: str) -> Update:
+    """Build an UPDATE marking a valid refresh token as used.
+
+    A single statement checks and uses the token, so it can't be used twice by
+    concurrent requests.
+
+    Args:
+        token_hash (str): Hash of the token
+
+    Returns:
+        Update: The statement, returning the token's user_id and family_id and
+            the User's uuid, is_superuser and token_version. It returns nothing
+            if the token is invalid.
+    """
+    return (
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.used_at.is_(None),
+            RefreshToken.expires_at > now(),
+            User.id == RefreshToken.user_id,
+        )
+        .values(used_at=now())
+        .returning(
+            RefreshToken.user_id,
+            RefreshToken.family_id,
+            User.uuid,
+            User.is_superuser,
+            User.token_version,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def revoke_reused_stmt(token_hash: str) -> Delete:
+    """Build a DELETE of every token in the family of an already used token.
+
+    A used token being presented again means it may have been stolen, so the
+    whole family is revoked, logging out both the client and the attacker.
+
+    Args:
+        token_hash (str): Hash of the token
+
+    Returns:
+        Delete: The statement
+    """
+    reused_family = select(RefreshToken.family_id).where(
+        RefreshToken.token_hash == token_hash, RefreshToken.used_at.is_not(None)
+    )
+    return (
+        delete(RefreshToken)
+        .where(RefreshToken.family_id.in_(reused_family.scalar_subquery()))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def delete_expired_stmt(user_id: int) -> Delete:
+    """Build a DELETE of the expired tokens of a User.
+
+    Args:
+        user_id (int): Id of the User
+
+    Returns:
+        Delete: The statement
+    """
+    return (
+        delete(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.expires_at <= now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def prune_family_stmt(family_id: UUID) -> Delete:
+    """Build a DELETE of the expired tokens of a family, and of the used ones.
+
+    Tokens used less than REFRESH_TOKEN_REUSE_WINDOW_MINUTES ago are kept, to
+    detect when they are presented again.
+
+    Args:
+        family_id (UUID): Id of the family
+
+    Returns:
+        Delete: The statement
+    """
+    reuse_window = timedelta(minutes=settings.REFRESH_TOKEN_REUSE_WINDOW_MINUTES)
+    return (
+        delete(RefreshToken)
+        .where(
+            RefreshToken.family_id == family_id,
+            or_(
+                RefreshToken.expires_at <= now(),
+                RefreshToken.used_at <= now() - reuse_window,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def delete_user_tokens_stmt(user_id: int) -> Delete:
+    """Build a DELETE of every token of a User.
+
+    Args:
+        user_id (int): Id of the User
+
+    Returns:
+        Delete: The statement
+    """
+    return (
+        delete(RefreshToken)
+        .where(RefreshToken.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+class CRUDRefreshToken:
+    """CRUD for refresh tokens."""
+
+    def issue(self, db: Session, *, user_id: int) -> str:
+        """Issue a refresh token of a new family, after a login.
+
+        The expired tokens of the User are deleted at the same time.
+
+        Args:
+            db (Session): A database session
+            user_id (int): Id of the User
+
+        Returns:
+            str: The refresh token
+        """
+        db.execute(delete_expired_stmt(user_id))
+        token, db_obj = build_refresh_token(user_id)
+        db.add(db_obj)
+        db.commit()
+        return token
+
+    def rotate(self, db: Session, *, token: str) -> RotatedToken | None:
+        """Use a refresh token, replacing it by a new one of the same family.
+
+        The family's expired tokens, and the ones used before the reuse window,
+        are deleted at the same time.
+
+        Args:
+            db (Session): A database session
+            token (str): The refresh token
+
+        Returns:
+            RotatedToken | None: The new token and its User, or None if the token
+                is unknown, expired or was already used
+        """
+        token_hash = security.hash_refresh_token(token)
+        row = db.execute(use_token_stmt(token_hash)).first()
+        if row is None:
+            db.execute(revoke_reused_stmt(token_hash))
+            db.commit()
+            return None
+        db.execute(prune_family_stmt(row.family_id))
+        new_token, db_obj = build_refresh_token(row.user_id, row.family_id)
+        db.add(db_obj)
+        db.commit()
+        return RotatedToken(
+            user_uuid=row.uuid,
+            refresh_token=new_token,
+            is_superuser=bool(row.is_superuser),
+            token_version=row.token_version,
+        )
+
+    def revoke_user_tokens(self, db: Session, *, user_id: int) -> None:
+        """Revoke every refresh token of a User, e.g. after a password change.
+
+        Args:
+            db (Session): A database session
+            user_id (int): Id of the User
+        """
+        db.execute(delete_user_tokens_stmt(user_id))
+        db.commit()
+
+
+refresh_token = CRUDRefreshToken()
@@ -0,0 +1,88 @@
+"""Async CRUD for refresh tokens."""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from users_api.api import security
+from users_api.crud.base_async import ThreadpoolCRUD
+from users_api.crud.crud_refresh_token import (
+    RotatedToken,
+    build_refresh_token,
+    delete_expired_stmt,
+    delete_user_tokens_stmt,
+    prune_family_stmt,
+)
+from users_api.crud.crud_refresh_token import refresh_token as sync_refresh_token
+from users_api.crud.crud_refresh_token import revoke_reused_stmt, use_token_stmt
+from users_api.settings import get_settings
+
+settings = get_settings()
+
+
+class AsyncCRUDRefreshToken:
+    """Async CRUD for refresh tokens."""
+
+    async def issue(self, db: AsyncSession, *, user_id: int) -> str:
+        """Issue a refresh token of a new family, after a login.
+
+        The expired tokens of the User are deleted at the same time.
+
+        Args:
+            db (AsyncSession): An async database session
+            user_id (int): Id of the User
+
+        Returns:
+            str: The refresh token
+        """
+        await db.execute(delete_expired_stmt(user_id))
+        token, db_obj = build_refresh_token(user_id)
+        db.add(db_obj)
+        await db.commit()
+        return token
+
+    async def rotate(self, db: AsyncSession, *, token: str) -> RotatedToken | None:
+        """Use a refresh token, replacing it by a new one of the same family.
+
+        The family's expired tokens, and the ones used before the reuse window,
+        are deleted at the same time.
+
+        Args:
+            db (AsyncSession): An async database session
+            token (str): The refresh token
+
+        Returns:
+            RotatedToken | None: The new token and its User, or None if the token
+                is unknown, expired or was already used
+        """
+        token_hash = security.hash_refresh_token(token)
+        row = (await db.execute(use_token_stmt(token_hash))).first()
+        if row is None:
+            await db.execute(revoke_reused_stmt(token_hash))
+            await db.commit()
+            return None
+        await db.execute(prune_family_stmt(row.family_id))
+        new_token, db_obj = build_refresh_token(row.user_id, row.family_id)
+        db.add(db_obj)
+        await db.commit()
+        return RotatedToken(
+            user_uuid=row.uuid,
+            refresh_token=new_token,
+            is_superuser=bool(row.is_superuser),
+            token_version=row.token_version,
+        )
+
+    async def revoke_user_tokens(self, db: AsyncSession, *, user_id: int) -> None:
+        """Revoke every refresh token of a User, e.g. after a password change.
+
+        Args:
+            db (AsyncSession): An async database session
+            user_id (int): Id of the User
+        """
+        await db.execute(delete_user_tokens_stmt(user_id))
+        await db.commit()
+
+
+# CRUD used by the API endpoints. It runs on AsyncSession when DB_ASYNC is enabled,
+# otherwise it runs the sync CRUD in a threadpool
+async_refresh_token = (
+    AsyncCRUDRefreshToken() if settings.DB_ASYNC else ThreadpoolCRUD(sync_refresh_token)
+)
@@ -1,19 +1,287 @@
 """CRUD for Users."""
 
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator
+
+from sqlalchemy import or_, select
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import Delete, Select
 
-from users_api.crud.base import CRUDBase
+from users_api.api import security
+from users_api.bloom import UsernameFilter
+from users_api.cache import ModelCache, VersionCache, get_cache_backend
+from users_api.crud.base import (
+    CRUDBase,
+    first_create_data,
+    remove_by_uuid_stmt,
+    scatter_results,
+)
+from users_api.metrics import USERNAME_FILTER_SKIPPED
 from users_api.models.user import User
 from users_api.schemas import UserCreateDB, UserUpdateDB
+from users_api.settings import get_settings
+
+settings = get_settings()
+
+# Rows fetched at a time when loading usernames into the username filter
+USERNAME_SCAN_BATCH_SIZE = 10000
+
+
+def build_users(values: list[dict[str, Any]], password_hashes: list[str]) -> list[User]:
+    """Build new Users from their values and already hashed passwords.
+
+    Args:
+        values (list[dict[str, Any]]): Values of the new Users, with a password
+        password_hashes (list[str]): The hashed passwords, in the same order
+
+    Returns:
+        list[User]: The transient Users
+    """
+    db_objs = []
+    for user_values, password_hash in zip(values, password_hashes):
+        user_values = {k: v for k, v in user_values.items() if k != "password"}
+        db_objs.append(User(**user_values, password_hash=password_hash))
+    return db_objs
+
+
+def username_scan_stmt(username_filter: UsernameFilter) -> Select:
+    """Build a SELECT of the Users a username filter hasn't loaded yet.
+
+    Args:
+        username_filter (UsernameFilter): The username filter
+
+    Returns:
+        Select: The statement, returning the id and username of the Users above
+            its last id, or among its gaps, in id order
+    """
+    criteria = User.id > username_filter.last_id
+    gap_ids = username_filter.gap_ids
+    if gap_ids:
+        criteria = or_(criteria, User.id.in_(gap_ids))
+    return (
+        select(User.id, User.username)
+        .where(criteria)
+        .order_by(User.id)
+        .execution_options(stream_results=True)
+    )
+
+
+def username_filter_misses(username_filter: UsernameFilter, username: str) -> bool:
+    """Check whether a username filter rules out a username, counting it if so.
+
+    Args:
+        username_filter (UsernameFilter): The username filter
+        username (str): The username
+
+    Returns:
+        bool: Whether the username is certainly not in the db
+    """
+    if username_filter.might_exist(username):
+        return False
+    USERNAME_FILTER_SKIPPED.inc()
+    return True
+
+
+def token_version_stmt(uuid: Any) -> Select:
+    """Build a SELECT of the token version of a User.
+
+    Args:
+        uuid (Any): The uuid of the User
+
+    Returns:
+        Select: The statement
+    """
+    return select(User.token_version).where(User.uuid == uuid)
+
+
+def get_by_username_stmt(username: str) -> Select:
+    """Build a SELECT of the User with a username.
+
+    Args:
+        username (str): The username
+
+    Returns:
+        Select: The statement
+    """
+    return select(User).where(User.username == username)
+
+
+def remove_user_stmt(uuid: Any) -> Delete:
+    """Build a DELETE of a User, returning what the username filter needs.
+
+    Args:
+        uuid (Any): The uuid of the User
+
+    Returns:
+        Delete: The statement, returning the id and username of the User
+    """
+    return remove_by_uuid_stmt(User, uuid, ("id", "username"))
+
+
+def set_password_hash(db_user: User, password_hash: str) -> None:
+    """Set the password hash of a User, bumping its token version.
+
+    Args:
+        db_user (User): The User
+        password_hash (str): The new password hash
+    """
+    db_user.password_hash = password_hash
+    db_user.token_version = User.token_version + 1
+
+
+@contextmanager
+def refreshing(
+    username_filter: UsernameFilter | None,
+) -> Iterator[UsernameFilter | None]:
+    """Hold the refresh lock of a username filter, marking it refreshed on success.
+
+    Args:
+        username_filter (UsernameFilter | None): The username filter, if enabled
+
+    Yields:
+        UsernameFilter | None: The username filter, or None if it's disabled or
+            another refresh is running
+    """
+    if username_filter is None or not username_filter.refresh_lock.acquire(
+        blocking=False
+    ):
+        yield None
+        return
+    try:
+        yield username_filter
+        username_filter.mark_refreshed()
+    finally:
+        username_filter.refresh_lock.release()
+
+
+def username_filter_rules_out(
+    username_filter: UsernameFilter | None, username: str
+) -> bool:
+    """Check whether a username filter, if enabled, rules out a username.
+
+    Args:
+        username_filter (UsernameFilter | None): The username filter, if enabled
+        username (str): The username
+
+    Returns:
+        bool: Whether the username isn't in the db, as of the last refresh
+    """
+    return username_filter is not None and not username_filter.might_exist(username)
+
+
+def add_to_username_filter(
+    username_filter: UsernameFilter | None, db_objs: Iterable[User | None]
+) -> None:
+    """Add new Users to a username filter, if enabled.
+
+    Args:
+        username_filter (UsernameFilter | None): The username filter, if enabled
+        db_objs (Iterable[User | None]): The inserted Users, None for conflicts
+    """
+    if username_filter is None:
+        return
+    for db_obj in db_objs:
+        if db_obj is not None:
+            username_filter.add(db_obj.id, db_obj.username)
+
+
+def discard_from_username_filter(
+    username_filter: UsernameFilter | None, removed: User | Row | None
+) -> int | None:
+    """Remove a deleted User from a username filter, if enabled.
+
+    Args:
+        username_filter (UsernameFilter | None): The username filter, if enabled
+        removed (User | Row | None): The removed User, or the row returned by
+            remove_user_stmt
+
+    Returns:
+        int | None: Id of the removed User, or None if no User was removed
+    """
+    if removed is None:
+        return None
+    if username_filter is not None:
+        username_filter.discard(removed.id, removed.username)
+    return removed.id
 
 
 class CRUDUser(CRUDBase[User, UserCreateDB, UserUpdateDB]):
     """CRUD for Users."""
 
-    @staticmethod
-    def _get_by_username(db: Session, *, username: str) -> User | None:
+    def __init__(
+        self,
+        model: type[User],
+        cache: ModelCache | None = None,
+        version_cache: VersionCache | None = None,
+        username_filter: UsernameFilter | None = None,
+    ):
+        """Create a CRUDUser.
+
+        Args:
+            model (type[User]): The User model class
+            cache (ModelCache | None): Cache whose rows are invalidated on write.
+                Defaults to None.
+            version_cache (VersionCache | None): Cache whose token versions are
+                invalidated on write. Defaults to None.
+            username_filter (UsernameFilter | None): Filter ruling out unknown
+                usernames, updated on write. Defaults to None.
+        """
+        super().__init__(model, cache=cache)
+        self.version_cache = version_cache
+        self.username_filter = username_filter
+
+    def _invalidate(self, uuid: Any) -> None:
+        """Remove a User and its token version from the caches, if any.
+
+        Args:
+            uuid (Any): The uuid of the User
+        """
+        super()._invalidate(uuid)
+        if self.version_cache is not None:
+            self.version_cache.delete(uuid)
+
+    def get_token_version(self, db: Session, *, uuid: Any) -> int | None:
+        """Get the token version of a User, without loading the whole row.
+
+        Args:
+            db (Session): A database session
+            uuid (Any): The uuid of the User
+
+        Returns:
+            int | None: The token version, or None if the User doesn't exist
+        """
+        return db.execute(token_version_stmt(uuid)).scalar_one_or_none()
+
+    def refresh_username_filter(self, db: Session) -> bool:
+        """Load the Users created since the username filter was last refreshed.
+
+        The first refresh loads every User. Only one refresh runs at a time.
+
+        Args:
+            db (Session): A database session
+
+        Returns:
+            bool: Whether it was refreshed, or another refresh was running
+        """
+        with refreshing(self.username_filter) as username_filter:
+            if username_filter is None:
+                return False
+            result = db.execute(username_scan_stmt(username_filter))
+            try:
+                for rows in result.yield_per(USERNAME_SCAN_BATCH_SIZE).partitions():
+                    username_filter.load(rows)
+            finally:
+                result.close()
+        return True
+
+    def _get_by_username(self, db: Session, *, username: str) -> User | None:
         """Get User by username.
 
+        Usernames ruled out by the username filter aren't looked up. When it
+        rules one out and is stale, it's refreshed first, as the User may have
+        been created by another process.
+
         Args:
             db (Session): A database session
             username (str): Username to be looked up
@@ -21,11 +289,80 @@ class CRUDUser(CRUDBase[User, UserCreateDB, UserUpdateDB]):
         Returns:
             User: The retrieved User
         """
-        return db.query(User).filter(User.username == username).first()
+        username_filter = self.username_filter
+        if username_filter_rules_out(username_filter, username):
+            refreshed = not username_filter.stale or self.refresh_username_filter(db)
+            if refreshed and username_filter_misses(username_filter, username):
+                return None
+        return db.execute(get_by_username_stmt(username)).scalars().first()
+
+    def _insert(self, db: Session, db_obj: User) -> User:
+        """Insert a new User, adding it to the username filter.
+
+        Args:
+            db (Session): A database session
+            db_obj (User): A transient User
+
+        Returns:
+            User: The inserted User, attached to the session
+        """
+        db_obj = super()._insert(db, db_obj)
+        add_to_username_filter(self.username_filter, [db_obj])
+        return db_obj
+
+    def _insert_multi(
+        self, db: Session, db_objs: list[User], *, conflict_column: str
+    ) -> list[User | None]:
+        """Insert new Users, skipping conflicts, adding them to the username filter.
+
+        Args:
+            db (Session): A database session
+            db_objs (list[User]): Transient Users
+            conflict_column (str): Unique column whose conflicts are skipped
+
+        Returns:
+            list[User | None]: For each User, the User itself attached to the
+                session, or None if it conflicted with an existing row
+        """
+        results = super()._insert_multi(db, db_objs, conflict_column=conflict_column)
+        add_to_username_filter(self.username_filter, results)
+        return results
+
+    def create_multi(
+        self,
+        db: Session,
+        *,
+        objs_in: list[UserCreateDB],
+        conflict_column: str = "username",
+    ) -> list[User | None]:
+        """Create many Users, hashing their passwords in parallel.
+
+        Args:
+            db (Session): A database session
+            objs_in (list[UserCreateDB]): Users to create
+            conflict_column (str): Unique column whose conflicts are skipped.
+                Defaults to username.
+
+        Returns:
+            list[User | None]: For each item of objs_in, the created User,
+                or None if the username was taken
+        """
+        # Duplicates within the batch are dropped before paying for their hash
+        indexes, values = first_create_data(objs_in, conflict_column=conflict_column)
+        password_hashes = security.get_password_hashes(
+            [user_values["password"] for user_values in values]
+        )
+        inserted = self._insert_multi(
+            db, build_users(values, password_hashes), conflict_column=conflict_column
+        )
+        return scatter_results(len(objs_in), indexes, inserted)
 
     def authenticate(self, db: Session, *, username: str, password: str) -> User | None:
         """Authenticate by username and password.
 
+        If the password hash uses an outdated scheme or cost, it's replaced, so
+        hashing changes roll out as Users log in.
+
         Args:
             db (Session): A database session
             username (str): Username to be authenticated
@@ -36,13 +373,21 @@ class CRUDUser(CRUDBase[User, UserCreateDB, UserUpdateDB]):
         """
         user_ = self._get_by_username(db, username=username)
         if not user_:
+            # Unknown usernames take as long as wrong passwords
+            security.dummy_verify_password()
             return None
-        if not user_.verify_password(password):
+        verified, new_hash = security.verify_and_update_password(
+            password, user_.password_hash
+        )
+        if not verified:
             return None
+        if new_hash is not None:
+            user_.password_hash = new_hash
+            self._save(db, user_)
         return user_
 
-    @staticmethod
     def update_password(
+        self,
         db: Session,
         *,
         db_user: User,
@@ -50,6 +395,8 @@ class CRUDUser(CRUDBase[User, UserCreateDB, UserUpdateDB]):
     ) -> User:
         """Update a row.
 
+        The token version is bumped, revoking the access tokens already issued.
+
         Args:
             db (Session): A database session
             db_user (User): Old user in db
@@ -59,11 +406,59 @@ class CRUDUser(CRUDBase[User, UserCreateDB, UserUpdateDB]):
             User: The updated User
         """
         if new_password:
-            db_user.password = new_password
-            db.add(db_user)
-            db.commit()
-            db.refresh(db_user)
+            set_password_hash(db_user, security.get_password_hash(new_password))
+            self._save(db, db_user)
         return db_user
 
+    def remove(self, db: Session, *, id: int) -> User:
+        """Remove a User by id, removing it from the username filter.
+
+        Args:
+            db (Session): A database session
+            id (int): Id of the User to remove
+
+        Returns:
+            User: The removed User
+        """
+        db_obj = super().remove(db, id=id)
+        discard_from_username_filter(self.username_filter, db_obj)
+        return db_obj
+
+    def remove_by_uuid(self, db: Session, *, uuid: Any) -> int | None:
+        """Remove a User by uuid, removing it from the username filter.
+
+        Args:
+            db (Session): A database session
+            uuid (Any): The uuid of the User to remove
+
+        Returns:
+            int | None: Id of the removed User, or None if no User has the given
+                uuid
+        """
+        row = db.execute(remove_user_stmt(uuid)).first()
+        db.commit()
+        self._invalidate(uuid)
+        return discard_from_username_filter(self.username_filter, row)
+
 
-user = CRUDUser(User)
+# Caches of authenticated Users and of their token versions, shared by the sync
+# and async CRUD. Password hashes are never copied to the cache, which may be
+# shared: the few paths verifying passwords load Users from the db.
+user_cache = ModelCache(User, get_cache_backend(), exclude=("password_hash",))
+token_version_cache = VersionCache(get_cache_backend(prefix="users_api:version:"))
+# Filter of every username, shared by the sync and async CRUD, if enabled
+username_filter = (
+    UsernameFilter(
+        settings.USERNAME_FILTER_SIZE,
+        settings.USERNAME_FILTER_HASHES,
+        settings.USERNAME_FILTER_REFRESH_SECONDS,
+    )
+    if settings.USERNAME_FILTER_ENABLED
+    else None
+)
+user = CRUDUser(
+    User,
+    cache=user_cache,
+    version_cache=token_version_cache,
+    username_filter=username_filter,
+)
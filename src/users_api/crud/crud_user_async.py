@@ -0,0 +1,311 @@
+"""Async CRUD for Users."""
+
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from users_api.api import security
+from users_api.bloom import UsernameFilter
+from users_api.cache import ModelCache, VersionCache
+from users_api.crud.base import first_create_data, get_create_data, scatter_results
+from users_api.crud.base_async import AsyncCRUDBase, ThreadpoolCRUD
+from users_api.crud.crud_user import (
+    USERNAME_SCAN_BATCH_SIZE,
+    add_to_username_filter,
+    build_users,
+    discard_from_username_filter,
+    get_by_username_stmt,
+    refreshing,
+    remove_user_stmt,
+    set_password_hash,
+    token_version_cache,
+    token_version_stmt,
+)
+from users_api.crud.crud_user import user as sync_user
+from users_api.crud.crud_user import (
+    user_cache,
+    username_filter,
+    username_filter_misses,
+    username_filter_rules_out,
+    username_scan_stmt,
+)
+from users_api.models.user import User
+from users_api.schemas import UserCreateDB, UserUpdateDB
+from users_api.settings import get_settings
+
+settings = get_settings()
+
+
+class AsyncCRUDUser(AsyncCRUDBase[User, UserCreateDB, UserUpdateDB]):
+    """Async CRUD for Users."""
+
+    def __init__(
+        self,
+        model: type[User],
+        cache: ModelCache | None = None,
+        version_cache: VersionCache | None = None,
+        username_filter: UsernameFilter | None = None,
+    ):
+        """Create an AsyncCRUDUser.
+
+        Args:
+            model (type[User]): The User model class
+            cache (ModelCache | None): Cache whose rows are invalidated on write.
+                Defaults to None.
+            version_cache (VersionCache | None): Cache whose token versions are
+                invalidated on write. Defaults to None.
+            username_filter (UsernameFilter | None): Filter ruling out unknown
+                usernames, updated on write. Defaults to None.
+        """
+        super().__init__(model, cache=cache)
+        self.version_cache = version_cache
+        self.username_filter = username_filter
+
+    async def _invalidate(self, uuid: Any) -> None:
+        """Remove a User and its token version from the caches, if any.
+
+        Args:
+            uuid (Any): The uuid of the User
+        """
+        await super()._invalidate(uuid)
+        if self.version_cache is not None:
+            await self.version_cache.delete_async(uuid)
+
+    async def get_token_version(self, db: AsyncSession, *, uuid: Any) -> int | None:
+        """Get the token version of a User, without loading the whole row.
+
+        Args:
+            db (AsyncSession): An async database session
+            uuid (Any): The uuid of the User
+
+        Returns:
+            int | None: The token version, or None if the User doesn't exist
+        """
+        result = await db.execute(token_version_stmt(uuid))
+        return result.scalar_one_or_none()
+
+    async def refresh_username_filter(self, db: AsyncSession) -> bool:
+        """Load the Users created since the username filter was last refreshed.
+
+        The first refresh loads every User. Only one refresh runs at a time.
+
+        Args:
+            db (AsyncSession): An async database session
+
+        Returns:
+            bool: Whether it was refreshed, or another refresh was running
+        """
+        with refreshing(self.username_filter) as username_filter:
+            if username_filter is None:
+                return False
+            result = await db.stream(username_scan_stmt(username_filter))
+            try:
+                partitions = result.yield_per(USERNAME_SCAN_BATCH_SIZE).partitions()
+                async for rows in partitions:
+                    username_filter.load(rows)
+            finally:
+                await result.close()
+        return True
+
+    async def _get_by_username(self, db: AsyncSession, *, username: str) -> User | None:
+        """Get User by username.
+
+        Usernames ruled out by the username filter aren't looked up. When it
+        rules one out and is stale, it's refreshed first, as the User may have
+        been created by another process.
+
+        Args:
+            db (AsyncSession): An async database session
+            username (str): Username to be looked up
+
+        Returns:
+            User: The retrieved User
+        """
+        username_filter = self.username_filter
+        if username_filter_rules_out(username_filter, username):
+            refreshed = not username_filter.stale or (
+                await self.refresh_username_filter(db)
+            )
+            if refreshed and username_filter_misses(username_filter, username):
+                return None
+        result = await db.execute(get_by_username_stmt(username))
+        return result.scalars().first()
+
+    async def _insert(self, db: AsyncSession, db_obj: User) -> User:
+        """Insert a new User, adding it to the username filter.
+
+        Args:
+            db (AsyncSession): An async database session
+            db_obj (User): A transient User
+
+        Returns:
+            User: The inserted User, attached to the session
+        """
+        db_obj = await super()._insert(db, db_obj)
+        add_to_username_filter(self.username_filter, [db_obj])
+        return db_obj
+
+    async def _insert_multi(
+        self, db: AsyncSession, db_objs: list[User], *, conflict_column: str
+    ) -> list[User | None]:
+        """Insert new Users, skipping conflicts, adding them to the username filter.
+
+        Args:
+            db (AsyncSession): An async database session
+            db_objs (list[User]): Transient Users
+            conflict_column (str): Unique column whose conflicts are skipped
+
+        Returns:
+            list[User | None]: For each User, the User itself attached to the
+                session, or None if it conflicted with an existing row
+        """
+        results = await super()._insert_multi(
+            db, db_objs, conflict_column=conflict_column
+        )
+        add_to_username_filter(self.username_filter, results)
+        return results
+
+    async def create(self, db: AsyncSession, *, obj_in: UserCreateDB) -> User:
+        """Create a new User, hashing its password outside the event loop.
+
+        Args:
+            db (AsyncSession): An async database session
+            obj_in: (UserCreateDB) User to create
+
+        Returns:
+            User: The created User
+        """
+        obj_in_data = get_create_data(obj_in)
+        password = obj_in_data.pop("password")
+        db_obj = User(**obj_in_data)
+        db_obj.password_hash = await security.get_password_hash_async(password)
+        return await self._insert(db, db_obj)
+
+    async def create_multi(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: list[UserCreateDB],
+        conflict_column: str = "username",
+    ) -> list[User | None]:
+        """Create many Users, hashing their passwords in parallel.
+
+        Args:
+            db (AsyncSession): An async database session
+            objs_in (list[UserCreateDB]): Users to create
+            conflict_column (str): Unique column whose conflicts are skipped.
+                Defaults to username.
+
+        Returns:
+            list[User | None]: For each item of objs_in, the created User,
+                or None if the username was taken
+        """
+        # Duplicates within the batch are dropped before paying for their hash
+        indexes, values = first_create_data(objs_in, conflict_column=conflict_column)
+        password_hashes = await security.get_password_hashes_async(
+            [user_values["password"] for user_values in values]
+        )
+        inserted = await self._insert_multi(
+            db, build_users(values, password_hashes), conflict_column=conflict_column
+        )
+        return scatter_results(len(objs_in), indexes, inserted)
+
+    async def authenticate(
+        self, db: AsyncSession, *, username: str, password: str
+    ) -> User | None:
+        """Authenticate by username and password.
+
+        If the password hash uses an outdated scheme or cost, it's replaced, so
+        hashing changes roll out as Users log in.
+
+        Args:
+            db (AsyncSession): An async database session
+            username (str): Username to be authenticated
+            password(str): Password used to authenticate
+
+        Returns:
+            User: The authenticated User
+        """
+        user_ = await self._get_by_username(db, username=username)
+        if not user_:
+            # Unknown usernames take as long as wrong passwords
+            await security.dummy_verify_password_async()
+            return None
+        verified, new_hash = await security.verify_and_update_password_async(
+            password, user_.password_hash
+        )
+        if not verified:
+            return None
+        if new_hash is not None:
+            user_.password_hash = new_hash
+            await self._save(db, user_)
+        return user_
+
+    async def update_password(
+        self,
+        db: AsyncSession,
+        *,
+        db_user: User,
+        new_password: str,
+    ) -> User:
+        """Update a User password.
+
+        The token version is bumped, revoking the access tokens already issued.
+
+        Args:
+            db (AsyncSession): An async database session
+            db_user (User): Old user in db
+            new_password (str): New password to be updated
+
+        Returns:
+            User: The updated User
+        """
+        if new_password:
+            password_hash = await security.get_password_hash_async(new_password)
+            set_password_hash(db_user, password_hash)
+            await self._save(db, db_user)
+        return db_user
+
+    async def remove(self, db: AsyncSession, *, id: int) -> User:
+        """Remove a User by id, removing it from the username filter.
+
+        Args:
+            db (AsyncSession): An async database session
+            id (int): Id of the User to remove
+
+        Returns:
+            User: The removed User
+        """
+        db_obj = await super().remove(db, id=id)
+        discard_from_username_filter(self.username_filter, db_obj)
+        return db_obj
+
+    async def remove_by_uuid(self, db: AsyncSession, *, uuid: Any) -> int | None:
+        """Remove a User by uuid, removing it from the username filter.
+
+        Args:
+            db (AsyncSession): An async database session
+            uuid (Any): The uuid of the User to remove
+
+        Returns:
+            int | None: Id of the removed User, or None if no User has the given
+                uuid
+        """
+        row = (await db.execute(remove_user_stmt(uuid))).first()
+        await db.commit()
+        await self._invalidate(uuid)
+        return discard_from_username_filter(self.username_filter, row)
+
+
+# CRUD used by the API endpoints. It runs on AsyncSession when DB_ASYNC is enabled,
+# otherwise it runs the sync CRUD in a threadpool
+async_user = (
+    AsyncCRUDUser(
+        User,
+        cache=user_cache,
+        version_cache=token_version_cache,
+        username_filter=username_filter,
+    )
+    if settings.DB_ASYNC
+    else ThreadpoolCRUD(sync_user)
+)
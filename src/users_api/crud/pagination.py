@@ -0,0 +1,195 @@
+"""Keyset pagination and filtering shared by the CRUD classes.
+
+Pages are fetched with `WHERE (created_at, id) > (:created_at, :id)` instead of
+OFFSET, so every page costs the same index range scan no matter how deep it is.
+The position of the last returned row is handed to clients as an opaque cursor.
+"""
+
+import base64
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, NamedTuple
+
+from sqlalchemy import DateTime, tuple_
+from sqlalchemy.sql import Select
+
+
+class OrderByEnum(str, Enum):
+    """Keys that pages can be ordered by."""
+
+    created_at = "created_at"
+    id = "id"
+
+
+# Columns that make up each ordering key. They must be unique when combined,
+# so the primary key is used as a tiebreaker
+ORDER_BY_COLUMNS = {
+    OrderByEnum.created_at: ("created_at", "id"),
+    OrderByEnum.id: ("id",),
+}
+
+# Lookups that can be appended to a filter name, e.g. "username__startswith"
+FILTER_LOOKUPS = {
+    "eq": lambda column, value: column == value,
+    "startswith": lambda column, value: column.startswith(value, autoescape=True),
+    "gte": lambda column, value: column >= value,
+    "lt": lambda column, value: column < value,
+}
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor can't be decoded."""
+
+
+class Page(NamedTuple):
+    """A page of rows, and the cursor to fetch the next one (if any)."""
+
+    items: list
+    next_cursor: str | None
+
+
+def encode_cursor(obj: Any, *, order_by: OrderByEnum, descending: bool) -> str:
+    """Get an opaque cursor pointing right after obj.
+
+    Args:
+        obj (Any): Last row of a page
+        order_by (OrderByEnum): Ordering key of the page
+        descending (bool): Whether the page is in descending order
+
+    Returns:
+        str: The cursor
+    """
+    key = []
+    for name in ORDER_BY_COLUMNS[order_by]:
+        value = getattr(obj, name)
+        key.append(value.isoformat() if isinstance(value, datetime) else value)
+    payload = {"o": order_by.value, "d": descending, "k": key}
+    data = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(
+    model: Any, cursor: str, *, order_by: OrderByEnum, descending: bool
+) -> tuple:
+    """Get the ordering key values stored in a cursor.
+
+    Args:
+        model (Any): A SQLAlchemy model class
+        cursor (str): A cursor created by encode_cursor
+        order_by (OrderByEnum): Ordering key of the requested page
+        descending (bool): Whether the requested page is in descending order
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed, or was created for a
+            different ordering
+
+    Returns:
+        tuple: The ordering key values
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(data)
+        cursor_order_by, cursor_descending = payload["o"], payload["d"]
+        values = payload["k"]
+    except (ValueError, KeyError, TypeError) as e:
+        # binascii.Error and UnicodeDecodeError are subclasses of ValueError
+        raise InvalidCursorError("Invalid cursor") from e
+
+    if cursor_order_by != order_by.value or cursor_descending != descending:
+        raise InvalidCursorError("Cursor does not match the requested ordering")
+    names = ORDER_BY_COLUMNS[order_by]
+    if not isinstance(values, list) or len(values) != len(names):
+        raise InvalidCursorError("Invalid cursor")
+
+    try:
+        return tuple(
+            _parse_key_value(model, name, value) for name, value in zip(names, values)
+        )
+    except (TypeError, ValueError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+
+def _parse_key_value(model: Any, name: str, value: Any) -> Any:
+    """Parse a JSON value stored in a cursor to the type of its column."""
+    if isinstance(getattr(model, name).type, DateTime):
+        return datetime.fromisoformat(value)
+    return getattr(model, name).type.python_type(value)
+
+
+def filter_criteria(model: Any, filters: dict[str, Any]) -> list:
+    """Build WHERE criteria from a dict of filters.
+
+    Filter names are column names, optionally followed by a lookup like
+    "username__startswith" or "created_at__gte". None values are ignored.
+
+    Args:
+        model (Any): A SQLAlchemy model class
+        filters (dict[str, Any]): Values to filter by
+
+    Returns:
+        list: The WHERE criteria
+    """
+    criteria = []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        field, _, lookup = name.partition("__")
+        criteria.append(FILTER_LOOKUPS[lookup or "eq"](getattr(model, field), value))
+    return criteria
+
+
+def paginate(
+    stmt: Select,
+    model: Any,
+    *,
+    limit: int,
+    cursor: str | None = None,
+    order_by: OrderByEnum = OrderByEnum.created_at,
+    descending: bool = False,
+) -> Select:
+    """Apply keyset pagination to a SELECT statement.
+
+    Args:
+        stmt (Select): The statement to paginate
+        model (Any): A SQLAlchemy model class
+        limit (int): How many rows to return
+        cursor (str | None): Cursor of the previous page. Defaults to the first page.
+        order_by (OrderByEnum): Ordering key. Defaults to created_at.
+        descending (bool): Whether to sort in descending order. Defaults to False.
+
+    Returns:
+        Select: The paginated statement
+    """
+    columns = [getattr(model, name) for name in ORDER_BY_COLUMNS[order_by]]
+    if cursor is not None:
+        key = decode_cursor(model, cursor, order_by=order_by, descending=descending)
+        if len(columns) == 1:
+            column, value = columns[0], key[0]
+        else:
+            # Row value comparison, so Postgres can use the composite index
+            column, value = tuple_(*columns), tuple_(*key)
+        stmt = stmt.where(column < value if descending else column > value)
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return stmt.order_by(*order).limit(limit)
+
+
+def make_page(
+    rows: list, *, limit: int, order_by: OrderByEnum, descending: bool
+) -> Page:
+    """Build a Page from up to limit + 1 rows.
+
+    Args:
+        rows (list): Rows fetched with limit + 1, to know whether there's a next page
+        limit (int): Page size
+        order_by (OrderByEnum): Ordering key
+        descending (bool): Whether the rows are in descending order
+
+    Returns:
+        Page: The rows of the page and the cursor to the next one
+    """
+    if len(rows) <= limit:
+        return Page(list(rows), None)
+    items = list(rows[:limit])
+    next_cursor = encode_cursor(items[-1], order_by=order_by, descending=descending)
+    return Page(items, next_cursor)
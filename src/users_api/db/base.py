@@ -3,4 +3,4 @@
 # flake8: noqa
 
 from users_api.db.base_class import Base
-from users_api.models import User
+from users_api.models import RefreshToken, User
@@ -0,0 +1,150 @@
+"""Bulk loading of rows with COPY FROM STDIN."""
+
+import csv
+import io
+from typing import Any, Iterable, Iterator, NamedTuple, Sequence
+
+import psycopg2
+from sqlalchemy.orm import Session
+
+from users_api.db.base_class import Base
+
+
+class CopyResult(NamedTuple):
+    """Rows sent by copy_rows, and how many of them were inserted."""
+
+    rows: int
+    inserted: int
+
+
+class CopyDataError(ValueError):
+    """Raised when the rows sent to COPY can't be read."""
+
+
+class CopyStream(io.TextIOBase):
+    """File-like object encoding rows as CSV lines, as COPY reads them.
+
+    Rows are pulled from the iterable only when COPY asks for more data, so they
+    are never all held in memory.
+    """
+
+    def __init__(self, rows: Iterable[Sequence[Any]]):
+        """Create a CopyStream.
+
+        Args:
+            rows (Iterable[Sequence[Any]]): Rows of values. None is sent as NULL.
+        """
+        self._rows: Iterator[Sequence[Any]] = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        # The database driver replaces errors raised by read, so they are kept
+        self.error: ValueError | None = None
+
+    def readable(self) -> bool:
+        """Tell COPY this stream can be read."""
+        return True
+
+    def read(self, size: int | None = -1) -> str:
+        """Encode rows until at least size characters are available.
+
+        Args:
+            size (int | None): Characters wanted. Everything is read if negative.
+
+        Raises:
+            ValueError: If a row can't be read
+
+        Returns:
+            str: Whole CSV lines. Empty once every row was read.
+        """
+        while size is None or size < 0 or self._buffer.tell() < size:
+            try:
+                row = next(self._rows, None)
+            except ValueError as e:
+                self.error = e
+                raise
+            if row is None:
+                break
+            self._writer.writerow(row)
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def copy_rows(
+    db: Session,
+    model: type[Base],
+    columns: list[str],
+    rows: Iterable[Sequence[Any]],
+    *,
+    conflict_column: str,
+) -> CopyResult:
+    """Insert rows with COPY, skipping the ones that conflict on a unique column.
+
+    COPY can't skip conflicting rows, so rows are copied into a temporary staging
+    table first, then moved with INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+    When several rows share a value of conflict_column, the first one is kept.
+    The session is committed.
+
+    Args:
+        db (Session): A database session, using psycopg2
+        model (type[Base]): A SQLAlchemy model class
+        columns (list[str]): Names of the columns set by each row, in order.
+            Other columns get their scalar or server default values.
+        rows (Iterable[Sequence[Any]]): Rows of values
+        conflict_column (str): Unique column whose conflicts are skipped
+
+    Raises:
+        CopyDataError: If iterating over rows raised a ValueError. Nothing is
+            inserted.
+        psycopg2.Error: If Postgres rejected the rows
+
+    Returns:
+        CopyResult: Rows sent, and rows inserted
+    """
+    table = model.__tablename__
+    staging = f"{table}_staging"
+    column_list = ", ".join(columns)
+    # Scalar defaults are set by SQLAlchemy, not by Postgres, so they are sent
+    # as parameters
+    defaults = {
+        column.key: column.default.arg
+        for column in model.__table__.columns
+        if column.key not in columns
+        and column.default is not None
+        and column.default.is_scalar
+    }
+    insert_list = ", ".join([*columns, *defaults])
+    select_list = column_list + ", %s" * len(defaults)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(
+            f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+            f"SELECT {column_list} FROM {table} WITH NO DATA"
+        )
+        # Numbers rows in input order, so the first of each duplicate is kept
+        cursor.execute(f"ALTER TABLE {staging} ADD COLUMN staging_row BIGSERIAL")
+        stream = CopyStream(rows)
+        try:
+            cursor.copy_expert(
+                f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                stream,
+            )
+        except psycopg2.Error:
+            if stream.error is None:
+                raise
+            raise CopyDataError(str(stream.error)) from stream.error
+        copied = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {table} ({insert_list}) "
+            f"SELECT DISTINCT ON ({conflict_column}) {select_list} FROM {staging} "
+            f"ORDER BY {conflict_column}, staging_row "
+            f"ON CONFLICT ({conflict_column}) DO NOTHING",
+            list(defaults.values()),
+        )
+        inserted = cursor.rowcount
+    finally:
+        cursor.close()
+    db.commit()
+    return CopyResult(rows=copied, inserted=inserted)
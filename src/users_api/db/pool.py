@@ -0,0 +1,58 @@
+"""Connection pools that export their stats as Prometheus metrics."""
+
+import time
+from typing import Any
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from users_api.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_SIZE,
+)
+
+
+class InstrumentedPoolMixin:
+    """Record pool stats after every checkout and checkin.
+
+    Checkout wait times include waiting for a connection to be checked in when
+    the pool is exhausted, and opening a new connection when needed.
+    """
+
+    # Value of the engine label
+    engine_label = "sync"
+
+    def _update_stats(self) -> None:
+        """Set the pool gauges."""
+        DB_POOL_SIZE.labels(self.engine_label).set(self.size())
+        DB_POOL_CHECKED_OUT.labels(self.engine_label).set(self.checkedout())
+        # overflow() is negative until pool_size connections have been opened
+        DB_POOL_OVERFLOW.labels(self.engine_label).set(max(self.overflow(), 0))
+
+    def _do_get(self) -> Any:
+        """Get a connection from the pool, timing it."""
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_POOL_CHECKOUT_WAIT.labels(self.engine_label).observe(elapsed)
+            self._update_stats()
+
+    def _do_return_conn(self, conn: Any) -> None:
+        """Return a connection to the pool."""
+        try:
+            super()._do_return_conn(conn)
+        finally:
+            self._update_stats()
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    """QueuePool that exports its stats."""
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that exports its stats."""
+
+    engine_label = "async"
@@ -1,13 +1,83 @@
 """Base database session file."""
 
+import asyncio
+from typing import Any
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
+from users_api import metrics
+from users_api.db.pool import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool
 from users_api.settings import get_settings
 
 settings = get_settings()
 
 # The database should already be created
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+engine = create_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    poolclass=InstrumentedQueuePool if settings.METRICS_ENABLED else None,
+    **settings.get_db_pool_settings(),
+)
+if settings.METRICS_ENABLED:
+    metrics.instrument_engine(engine, "sync")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    # asyncpg is an optional dependency, only needed when DB_ASYNC is enabled
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    async_engine = create_async_engine(
+        settings.SQLALCHEMY_ASYNC_DATABASE_URI,
+        poolclass=InstrumentedAsyncAdaptedQueuePool
+        if settings.METRICS_ENABLED
+        else None,
+        **settings.get_db_pool_settings(),
+    )
+    if settings.METRICS_ENABLED:
+        metrics.instrument_engine(async_engine.sync_engine, "async")
+
+    # Objects can't lazy load attributes with AsyncSession, so they aren't expired
+    # on commit
+    AsyncSessionLocal = sessionmaker(
+        async_engine,
+        class_=AsyncSession,
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+def warm_up_pool(engine: Engine, connections: int) -> None:
+    """Open connections in advance, and leave them in the pool.
+
+    Args:
+        engine (Engine): The engine whose pool is warmed up
+        connections (int): How many connections to open
+    """
+    # Check out every connection at once, so the pool has to open all of them
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+async def warm_up_async_pool(engine: Any, connections: int) -> None:
+    """Open connections in advance, and leave them in the pool.
+
+    Args:
+        engine (Any): The AsyncEngine whose pool is warmed up
+        connections (int): How many connections to open
+    """
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(await engine.connect().start())
+    finally:
+        await asyncio.gather(*(connection.close() for connection in opened))
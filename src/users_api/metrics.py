@@ -0,0 +1,226 @@
+"""Prometheus metrics.
+
+Metrics are exported at /metrics. When the API runs in several worker processes,
+set the PROMETHEUS_MULTIPROC_DIR environment variable to an empty directory
+shared by every worker, so that /metrics aggregates the values of all of them.
+"""
+
+import os
+import time
+from typing import Callable
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Route label of requests that don't match any route, to bound the label values
+UNMATCHED_ROUTE = "<unmatched>"
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests, by route template and status code",
+    ["method", "route", "status"],
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to send the whole HTTP response",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Size of HTTP response bodies",
+    ["method", "route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000),
+)
+
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Connections kept open by the pool",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently in use",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections open beyond the pool size",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool, including connecting if needed",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30),
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Time to execute SQL statements",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+PASSWORD_HASHER_DURATION = Histogram(
+    "password_hasher_job_duration_seconds",
+    "Time password hashing jobs take, including the time spent queued",
+    ["job"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+LOGIN_RATE_LIMITED = Counter(
+    "login_rate_limited_total",
+    "Login attempts rejected by the rate limiter, by the limit they exceeded",
+    ["limit"],
+)
+USERNAME_FILTER_SKIPPED = Counter(
+    "username_filter_skipped_lookups_total",
+    "Lookups of usernames ruled out by the username filter, without querying the db",
+)
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Record the duration of the SQL statements run by an engine.
+
+    Pool stats are recorded by the pool classes in users_api.db.pool.
+
+    Args:
+        engine (Engine): A sync engine, or the sync_engine of an async one
+        name (str): Value of the engine label
+    """
+
+    def before_cursor_execute(conn, cursor, statement, params, context, many):
+        context._query_start_time = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, params, context, many):
+        elapsed = time.perf_counter() - context._query_start_time
+        DB_QUERY_DURATION.labels(name).observe(elapsed)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def get_route_templates(routes: list[BaseRoute]) -> dict[Callable, str]:
+    """Get the path template of each endpoint.
+
+    Args:
+        routes (list[BaseRoute]): Routes of the app
+
+    Returns:
+        dict[Callable, str]: Path templates like "/v1/users/{user_id}", by endpoint
+    """
+    return {
+        route.endpoint: route.path
+        for route in routes
+        if hasattr(route, "endpoint") and hasattr(route, "path")
+    }
+
+
+class PrometheusMiddleware:
+    """ASGI middleware that records metrics of every HTTP request.
+
+    Requests are labeled by route template instead of by path, so that label
+    values are bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        """Wrap an ASGI app.
+
+        Args:
+            app (ASGIApp): The app to wrap
+        """
+        self.app = app
+        self._route_templates: dict[Callable, str] | None = None
+
+    def _get_route(self, scope: Scope) -> str:
+        """Get the route template of the endpoint that handled a request."""
+        if self._route_templates is None:
+            self._route_templates = get_route_templates(scope["app"].routes)
+        return self._route_templates.get(scope.get("endpoint"), UNMATCHED_ROUTE)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle a request, recording its metrics.
+
+        Args:
+            scope (Scope): The ASGI connection scope
+            receive (Receive): The ASGI receive channel
+            send (Send): The ASGI send channel
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        # The route is only known once the router has handled the request, so
+        # requests in progress are labeled by method only
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        status_code = 500
+        response_size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            route = self._get_route(scope)
+            REQUESTS.labels(method, route, status_code).inc()
+            REQUEST_DURATION.labels(method, route).observe(elapsed)
+            RESPONSE_SIZE.labels(method, route).observe(response_size)
+
+
+def generate_metrics() -> tuple[bytes, str]:
+    """Render the metrics in the Prometheus text format.
+
+    In multiprocess mode, the metrics of every worker process are aggregated.
+
+    Returns:
+        tuple[bytes, str]: The metrics and their content type
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int | None = None) -> None:
+    """Remove the live gauges of a worker process in multiprocess mode.
+
+    Args:
+        pid (int | None): The worker process id. Defaults to the current process.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -1 +1,2 @@
+from .refresh_token import RefreshToken
 from .user import User
@@ -0,0 +1,31 @@
+"""Refresh token database table."""
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.declarative import declared_attr
+
+from users_api.db.base_class import Base
+
+
+class RefreshToken(Base):
+    """Refresh token database table.
+
+    Tokens are opaque and only their SHA-256 hash is stored. Each token can be
+    used once, and is replaced by a new one of the same family. Used tokens are
+    kept for a while, to detect when they are presented again, and deleted by
+    the next rotation of their family after that.
+    """
+
+    token_hash = Column(String(64), nullable=False, unique=True)
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    # Shared by every token rotated from the same login
+    family_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    used_at = Column(DateTime(timezone=True))
+
+    @declared_attr
+    def __tablename__(cls) -> str:
+        """Return the table name."""
+        return "refresh_tokens"
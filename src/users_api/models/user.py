@@ -1,6 +1,6 @@
 """User database table."""
 
-from sqlalchemy import Boolean, Column, String
+from sqlalchemy import Boolean, Column, Index, Integer, String, text
 from sqlalchemy.ext.declarative import declared_attr
 
 from users_api.api import security
@@ -15,6 +15,11 @@ class User(Base):
     last_name = Column(String)
     password_hash = Column(String)
     is_superuser = Column(Boolean(), default=False)
+    # Embedded in access tokens, and bumped to revoke the ones already issued
+    token_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
+
+    # Used by keyset pagination, ordering by (created_at, id)
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
 
     @property
     def password(self):
@@ -30,6 +35,10 @@ class User(Base):
         """Password validator."""
         return security.verify_password(password, self.password_hash)
 
+    async def verify_password_async(self, password):
+        """Password validator that doesn't block the event loop."""
+        return await security.verify_password_async(password, self.password_hash)
+
     @declared_attr
     def __tablename__(cls) -> str:
         """Return the table name."""
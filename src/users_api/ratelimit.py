@@ -0,0 +1,303 @@
+"""Token bucket rate limits of login attempts.
+
+Checking a password costs a bcrypt or Argon2 hash, so a burst of logins can use
+all the CPU of a worker and starve every other request. Each client IP and each
+username get a bucket of attempts, refilled at a steady rate, and attempts are
+rejected cheaply, before any hashing, once it's empty. An attempt only takes
+tokens if every bucket it counts against has one, so attempts rejected by one
+limit don't use up the others. Buckets are kept in this process
+(LocalTokenBuckets), or in a backend shared by every worker (RedisTokenBuckets).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple, Sequence
+
+from fastapi.concurrency import run_in_threadpool
+
+from users_api.metrics import LOGIN_RATE_LIMITED
+from users_api.settings import CacheBackendEnum, get_settings
+
+settings = get_settings()
+
+
+class RateLimitExceededError(Exception):
+    """Raised when a rate limit is exceeded."""
+
+    def __init__(self, limit: str, retry_after: float):
+        """Create a RateLimitExceededError.
+
+        Args:
+            limit (str): Name of the exceeded limit
+            retry_after (float): Seconds until the next attempt is allowed
+        """
+        super().__init__(limit, retry_after)
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+class RateLimit(NamedTuple):
+    """Size of a token bucket, and how fast it refills."""
+
+    burst: int
+    per_second: float
+
+
+class TokenBuckets:
+    """Base token bucket backend. It never limits anything."""
+
+    # Whether operations do network I/O, and must not run in the event loop
+    blocking = False
+
+    def take(self, buckets: Sequence[tuple[str, RateLimit]]) -> list[float]:
+        """Take a token from each bucket, refilling them first, if all have one.
+
+        Args:
+            buckets (Sequence[tuple[str, RateLimit]]): The key of each bucket,
+                with its size and refill rate
+
+        Returns:
+            list[float]: Seconds until each bucket has a token, 0 if it has one.
+                Tokens were taken if they're all 0
+        """
+        return [0.0] * len(buckets)
+
+    def clear(self) -> None:
+        """Refill every bucket."""
+
+
+class LocalTokenBuckets(TokenBuckets):
+    """In-process token buckets, with a maximum number of keys.
+
+    When full, the least recently used buckets are dropped, which refills them.
+    """
+
+    def __init__(self, max_size: int):
+        """Create an empty LocalTokenBuckets.
+
+        Args:
+            max_size (int): How many buckets to keep at most
+        """
+        self.max_size = max_size
+        # Tokens left in each bucket, and when it was last refilled
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Get how many buckets are kept."""
+        return len(self._buckets)
+
+    def take(self, buckets: Sequence[tuple[str, RateLimit]]) -> list[float]:
+        """Take a token from each bucket, refilling them first, if all have one.
+
+        Args:
+            buckets (Sequence[tuple[str, RateLimit]]): The key of each bucket,
+                with its size and refill rate
+
+        Returns:
+            list[float]: Seconds until each bucket has a token, 0 if it has one.
+                Tokens were taken if they're all 0
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, limit in buckets:
+                tokens, refilled_at = self._buckets.get(key, (limit.burst, now))
+                levels.append(
+                    min(limit.burst, tokens + (now - refilled_at) * limit.per_second)
+                )
+            waits = [
+                0.0 if tokens >= 1 else (1 - tokens) / limit.per_second
+                for tokens, (_, limit) in zip(levels, buckets)
+            ]
+            if any(waits):
+                return waits
+            for tokens, (key, _) in zip(levels, buckets):
+                self._buckets.pop(key, None)
+                self._buckets[key] = (tokens - 1, now)
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        return waits
+
+    def clear(self) -> None:
+        """Refill every bucket."""
+        with self._lock:
+            self._buckets.clear()
+
+
+# Refills buckets and takes a token from each one if they all have one,
+# atomically. Buckets expire once they would be full again
+TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local waits = {}
+local allowed = true
+for i, key in ipairs(KEYS) do
+    local burst = tonumber(ARGV[2 * i])
+    local per_second = tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call("HMGET", key, "tokens", "refilled_at")
+    local tokens = tonumber(bucket[1]) or burst
+    local refilled_at = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - refilled_at) * per_second)
+    levels[i] = tokens
+    waits[i] = 0
+    if tokens < 1 then
+        waits[i] = (1 - tokens) / per_second
+        allowed = false
+    end
+end
+for i, key in ipairs(KEYS) do
+    if allowed then
+        local burst = tonumber(ARGV[2 * i])
+        local per_second = tonumber(ARGV[2 * i + 1])
+        redis.call("HSET", key, "tokens", levels[i] - 1, "refilled_at", now)
+        redis.call("EXPIRE", key, math.ceil(burst / per_second))
+    end
+    waits[i] = tostring(waits[i])
+end
+return waits
+"""
+
+
+class RedisTokenBuckets(TokenBuckets):
+    """Token buckets shared by every worker, stored in Redis.
+
+    Any client with redis-py's eval, scan_iter and delete methods can be used.
+    """
+
+    blocking = True
+
+    def __init__(self, client: Any, prefix: str = "users_api:ratelimit:"):
+        """Create a RedisTokenBuckets.
+
+        Args:
+            client (Any): A Redis client
+            prefix (str): Prefix of every key. Defaults to "users_api:ratelimit:".
+        """
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisTokenBuckets":
+        """Create a RedisTokenBuckets connected to a Redis server.
+
+        Requires the `cache` extra.
+
+        Args:
+            url (str): The Redis URL
+
+        Returns:
+            RedisTokenBuckets: The buckets
+        """
+        import redis
+
+        return cls(redis.Redis.from_url(url))
+
+    def take(self, buckets: Sequence[tuple[str, RateLimit]]) -> list[float]:
+        """Take a token from each bucket, refilling them first, if all have one.
+
+        Args:
+            buckets (Sequence[tuple[str, RateLimit]]): The key of each bucket,
+                with its size and refill rate
+
+        Returns:
+            list[float]: Seconds until each bucket has a token, 0 if it has one.
+                Tokens were taken if they're all 0
+        """
+        args = [time.time()]
+        for _, limit in buckets:
+            args.extend(limit)
+        waits = self.client.eval(
+            TAKE_SCRIPT,
+            len(buckets),
+            *(self.prefix + key for key, _ in buckets),
+            *args,
+        )
+        return [float(wait) for wait in waits]
+
+    def clear(self) -> None:
+        """Remove every bucket with this backend's prefix."""
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class LoginRateLimiter:
+    """Rate limits of login attempts, by client IP and by username."""
+
+    def __init__(
+        self, backend: TokenBuckets, *, per_ip: RateLimit, per_username: RateLimit
+    ):
+        """Create a LoginRateLimiter.
+
+        Args:
+            backend (TokenBuckets): Where buckets are stored
+            per_ip (RateLimit): Limit of each client IP
+            per_username (RateLimit): Limit of each username
+        """
+        self.backend = backend
+        self.per_ip = per_ip
+        self.per_username = per_username
+
+    def check(self, *, client_ip: str | None, username: str) -> None:
+        """Count a login attempt, unless it exceeds a limit.
+
+        Rejected attempts aren't counted against any limit.
+
+        Args:
+            client_ip (str | None): IP of the client, if known
+            username (str): The username
+
+        Raises:
+            RateLimitExceededError: If the attempt exceeds a limit
+        """
+        limits = [("username", username, self.per_username)]
+        if client_ip is not None:
+            limits.insert(0, ("ip", client_ip, self.per_ip))
+        waits = self.backend.take(
+            [(f"{name}:{value}", limit) for name, value, limit in limits]
+        )
+        for (name, _, _), wait in zip(limits, waits):
+            if wait > 0:
+                LOGIN_RATE_LIMITED.labels(name).inc()
+                raise RateLimitExceededError(name, wait)
+
+    async def check_async(self, *, client_ip: str | None, username: str) -> None:
+        """Count a login attempt without blocking the event loop.
+
+        Args:
+            client_ip (str | None): IP of the client, if known
+            username (str): The username
+        """
+        if self.backend.blocking:
+            await run_in_threadpool(self.check, client_ip=client_ip, username=username)
+        else:
+            self.check(client_ip=client_ip, username=username)
+
+
+def get_login_rate_limiter() -> LoginRateLimiter:
+    """Create the login rate limiter configured in settings.
+
+    Returns:
+        LoginRateLimiter: The rate limiter
+    """
+    if settings.LOGIN_RATE_LIMIT_BACKEND == CacheBackendEnum.local:
+        backend = LocalTokenBuckets(settings.LOGIN_RATE_LIMIT_MAX_KEYS)
+    elif settings.LOGIN_RATE_LIMIT_BACKEND == CacheBackendEnum.redis:
+        backend = RedisTokenBuckets.from_url(settings.LOGIN_RATE_LIMIT_REDIS_URL)
+    else:
+        backend = TokenBuckets()
+    return LoginRateLimiter(
+        backend,
+        per_ip=RateLimit(
+            settings.LOGIN_RATE_LIMIT_IP_BURST,
+            settings.LOGIN_RATE_LIMIT_IP_PER_MINUTE / 60,
+        ),
+        per_username=RateLimit(
+            settings.LOGIN_RATE_LIMIT_USERNAME_BURST,
+            settings.LOGIN_RATE_LIMIT_USERNAME_PER_MINUTE / 60,
+        ),
+    )
+
+
+login_limiter = get_login_rate_limiter()
@@ -1,12 +1,19 @@
 from users_api.schemas.api import ApiVersionModel
 from users_api.schemas.base import APIMessage, APISchema
-from users_api.schemas.token import Token, TokenData
+from users_api.schemas.batch import BatchMethodEnum, BatchRequest, BatchResponse
+from users_api.schemas.cache import CacheStats
+from users_api.schemas.token import Principal, RefreshTokenIn, Token, TokenData
 from users_api.schemas.user import (
+    UserBulkCreateOut,
+    UserBulkCreateStatusEnum,
     UserCreateDB,
     UserCreateIn,
     UserCreateOut,
     UserGet,
+    UserImport,
     UserList,
+    UserLookupOut,
+    UserLookupStatusEnum,
     UserUpdateDB,
     UserUpdateIn,
     UserUpdateOut,
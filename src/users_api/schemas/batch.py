@@ -0,0 +1,36 @@
+"""Batch request Schemas."""
+
+from enum import Enum
+from typing import Any
+
+from pydantic import Field
+
+from users_api.schemas.base import APISchema
+
+
+class BatchMethodEnum(str, Enum):
+    """HTTP methods that requests of a batch can use."""
+
+    get = "GET"
+    post = "POST"
+    put = "PUT"
+    delete = "DELETE"
+
+
+class BatchRequest(APISchema):
+    """A request of a batch, to any endpoint under /v1."""
+
+    method: BatchMethodEnum = BatchMethodEnum.get
+    path: str = Field(..., regex=r"^/", example="/users/lookup?fields=username")
+    headers: dict[str, str] = Field(
+        {}, description="Headers added to the ones of the batch request"
+    )
+    body: Any = Field(None, description="JSON body")
+
+
+class BatchResponse(APISchema):
+    """The response to a request of a batch."""
+
+    status: int
+    headers: dict[str, str]
+    body: Any = Field(None, description="JSON body, or text if it's not JSON")
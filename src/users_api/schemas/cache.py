@@ -0,0 +1,11 @@
+"""Cache Schemas."""
+
+from users_api.schemas import APISchema
+
+
+class CacheStats(APISchema):
+    """Hit and miss counters of a cache, in the current worker process."""
+
+    backend: str
+    hits: int
+    misses: int
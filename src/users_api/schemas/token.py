@@ -1,4 +1,6 @@
 """Token Schemas."""
+from uuid import UUID
+
 from pydantic import BaseModel
 
 from users_api.schemas import APISchema
@@ -9,6 +11,13 @@ class Token(BaseModel):
 
     access_token: str
     token_type: str
+    refresh_token: str | None = None
+
+
+class RefreshTokenIn(BaseModel):
+    """Refresh token exchanged for new tokens."""
+
+    refresh_token: str
 
 
 class TokenData(APISchema):
@@ -16,3 +25,16 @@ class TokenData(APISchema):
 
     exp: str
     sub: str
+    is_superuser: bool | None = None
+    token_version: int | None = None
+
+
+class Principal(BaseModel):
+    """Authenticated User, as described by the claims of its access token.
+
+    Used instead of the User row with AUTH_STATELESS.
+    """
+
+    uuid: UUID
+    is_superuser: bool
+    token_version: int
@@ -1,9 +1,11 @@
 """User Schemas."""
 
 from datetime import datetime
+from enum import Enum
+from typing import Any
 from uuid import UUID
 
-from pydantic import Field
+from pydantic import Field, root_validator
 
 from users_api.schemas import APIMessage, APISchema
 
@@ -40,6 +42,37 @@ class UserCreateOut(BaseUserSchemaWithUsername):
     updated_at: datetime
 
 
+class UserBulkCreateStatusEnum(str, Enum):
+    """Outcome of each User in a bulk create request."""
+
+    created = "created"
+    duplicate = "duplicate"
+
+
+class UserBulkCreateOut(APISchema):
+    """Result of each User in a bulk create POST request."""
+
+    index: int
+    username: str
+    status: UserBulkCreateStatusEnum
+    user: UserCreateOut | None
+
+
+class UserImport(BaseUserSchemaWithUsername):
+    """A User read from an import file, with a password or an already hashed one."""
+
+    password: str | None
+    password_hash: str | None
+    is_superuser: bool = False
+
+    @root_validator(skip_on_failure=True)
+    def check_password(cls, values: dict[str, Any]) -> dict[str, Any]:
+        """Require a password or a password hash."""
+        if values.get("password") is None and values.get("password_hash") is None:
+            raise ValueError("password or passwordHash is required")
+        return values
+
+
 class UserGet(UserCreateOut):
     """Parameters returned in a GET request."""
 
@@ -48,6 +81,21 @@ class UserList(UserGet):
     """Parameters returned in a GET LIST request."""
 
 
+class UserLookupStatusEnum(str, Enum):
+    """Outcome of each UUID in a lookup request."""
+
+    found = "found"
+    not_found = "not_found"
+
+
+class UserLookupOut(APISchema):
+    """Result of each UUID in a lookup POST request."""
+
+    uuid: UUID
+    status: UserLookupStatusEnum
+    user: UserGet | None
+
+
 class UserUpdateIn(BaseUserSchema):
     """Parameters received in a PUT request."""
 
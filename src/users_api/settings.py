@@ -1,11 +1,21 @@
 """API Settings."""
 
+import os
 from enum import Enum
 from functools import lru_cache
 from ipaddress import IPv4Address
 from typing import Any
 
-from pydantic import BaseSettings, PositiveInt, PostgresDsn, validator
+from pydantic import (
+    BaseSettings,
+    FilePath,
+    PositiveFloat,
+    PositiveInt,
+    PostgresDsn,
+    RedisDsn,
+    conint,
+    validator,
+)
 
 from users_api.version import __version__
 
@@ -27,6 +37,47 @@ class LoggingEnum(str, Enum):
     debug = "DEBUG"
 
 
+class PasswordHasherExecutorEnum(str, Enum):
+    """Executor used to run password hashing jobs."""
+
+    thread = "thread"
+    process = "process"
+
+
+class JWTAlgorithmEnum(str, Enum):
+    """Algorithm used to sign access tokens."""
+
+    HS256 = "HS256"
+    HS384 = "HS384"
+    HS512 = "HS512"
+    RS256 = "RS256"
+    RS384 = "RS384"
+    RS512 = "RS512"
+    ES256 = "ES256"
+    ES384 = "ES384"
+    ES512 = "ES512"
+
+    @property
+    def is_symmetric(self) -> bool:
+        """Whether tokens are signed and verified with SECRET_KEY."""
+        return self.value.startswith("HS")
+
+
+class PasswordHashSchemeEnum(str, Enum):
+    """Scheme of new password hashes."""
+
+    bcrypt = "bcrypt"
+    argon2 = "argon2"
+
+
+class CacheBackendEnum(str, Enum):
+    """Where cached rows are stored."""
+
+    none = "none"
+    local = "local"
+    redis = "redis"
+
+
 class APISettings(BaseSettings):
     """Basic API settings.
 
@@ -43,6 +94,21 @@ class APISettings(BaseSettings):
     APP_MODULE: str = "users_api.app:app"
     HOST: IPv4Address = "0.0.0.0"
     PORT: PositiveInt = 3000
+    # Seconds to keep idle HTTP connections open, and pending connections queued
+    KEEP_ALIVE: PositiveInt = 5
+    BACKLOG: PositiveInt = 2048
+
+    # Settings related to running several worker processes with `manage serve`
+    # WORKERS defaults to the CPU count. Each worker is replaced after handling
+    # MAX_REQUESTS requests, plus a random jitter so they don't restart at once
+    # (0 disables it). Workers get GRACEFUL_TIMEOUT seconds to finish pending
+    # requests when stopped or reloaded, and are killed if silent for
+    # WORKER_TIMEOUT seconds
+    WORKERS: PositiveInt | None = None
+    MAX_REQUESTS: conint(ge=0) = 10000
+    MAX_REQUESTS_JITTER: conint(ge=0) = 1000
+    GRACEFUL_TIMEOUT: PositiveInt = 30
+    WORKER_TIMEOUT: PositiveInt = 60
 
     # Settings related to Postgres configuration
     POSTGRES_SERVER: str
@@ -51,11 +117,134 @@ class APISettings(BaseSettings):
     POSTGRES_DB: str
     POSTGRES_TEST_DB: str | None = "test.users_api"
     SQLALCHEMY_DATABASE_URI: PostgresDsn | None = None
+    # Use an async engine (asyncpg) and AsyncSession to serve API requests
+    DB_ASYNC: bool = False
+    SQLALCHEMY_ASYNC_DATABASE_URI: PostgresDsn | None = None
+
+    # Settings related to the database connection pool, per worker process
+    # Up to DB_POOL_SIZE connections are kept open, and up to DB_MAX_OVERFLOW more
+    # are opened under load. Requests wait up to DB_POOL_TIMEOUT seconds for one
+    DB_POOL_SIZE: PositiveInt = 5
+    DB_MAX_OVERFLOW: conint(ge=0) = 10
+    DB_POOL_TIMEOUT: PositiveFloat = 30
+    # Replace connections older than this many seconds (-1 never replaces them)
+    DB_POOL_RECYCLE: conint(ge=-1) = -1
+    # Test connections with a round trip on every checkout, so connections closed
+    # by the server are replaced transparently
+    DB_POOL_PRE_PING: bool = True
+    # Connections opened at startup, so the first requests don't wait for them
+    DB_POOL_WARMUP: conint(ge=0) = 0
+
+    # Settings related to pagination
+    # Clients may ask for any page size up to PAGE_SIZE_MAX
+    PAGE_SIZE_DEFAULT: PositiveInt = 1000
+    PAGE_SIZE_MAX: PositiveInt = 1000
+
+    # Settings related to JSON responses
+    # Encode Users straight from their rows to JSON, with orjson if the `json`
+    # extra is installed, instead of validating them into their response schema
+    FAST_JSON_RESPONSES: bool = True
+
+    # Settings related to bulk operations
+    BULK_CREATE_MAX_ITEMS: PositiveInt = 1000
+    LOOKUP_MAX_ITEMS: PositiveInt = 1000
+    # Rows fetched at a time from the server-side cursor when exporting
+    EXPORT_BATCH_SIZE: PositiveInt = 1000
+
+    # Settings related to batch requests
+    BATCH_MAX_REQUESTS: PositiveInt = 20
+    # With DB_ASYNC, consecutive GET requests of a batch run concurrently, each
+    # with its own connection, up to this many at once
+    BATCH_MAX_CONCURRENCY: PositiveInt = 4
+    # Responses of the requests of a batch are held in memory until it ends, up to
+    # BATCH_MAX_RESPONSE_BYTES each and BATCH_MAX_TOTAL_BYTES in total
+    BATCH_MAX_RESPONSE_BYTES: PositiveInt = 1024 * 1024
+    BATCH_MAX_TOTAL_BYTES: PositiveInt = 8 * 1024 * 1024
 
     # Settings related to JWT
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
-    ALGORITHM: str = "HS256"
+    # Refresh tokens are rotated on every use, each one lasting this long. Used
+    # tokens are kept for REFRESH_TOKEN_REUSE_WINDOW_MINUTES, so presenting one
+    # again within that window revokes its family
+    REFRESH_TOKEN_EXPIRE_DAYS: PositiveInt = 30
+    REFRESH_TOKEN_REUSE_WINDOW_MINUTES: PositiveInt = 60
+    ALGORITHM: JWTAlgorithmEnum = JWTAlgorithmEnum.HS256
     SECRET_KEY: str
+    # RS* and ES* tokens are signed with the PEM private key of
+    # JWT_PRIVATE_KEY_FILE. The PEM public keys of JWT_PUBLIC_KEY_FILES, like
+    # the ones of previous signing keys, are still accepted. Every public key is
+    # published at /.well-known/jwks.json, cached by clients for JWKS_MAX_AGE
+    JWT_PRIVATE_KEY_FILE: FilePath | None = None
+    JWT_PUBLIC_KEY_FILES: list[FilePath] = []
+    JWKS_MAX_AGE: PositiveInt = 3600
+    # With AUTH_STATELESS, requests are authorized from the is_superuser and
+    # token_version claims of access tokens, without loading the User. Unless
+    # AUTH_CHECK_TOKEN_VERSION is disabled, token versions are still checked
+    # against the db, through a cache of USER_CACHE_BACKEND
+    AUTH_STATELESS: bool = False
+    AUTH_CHECK_TOKEN_VERSION: bool = True
+
+    # Settings related to password hashing
+    # Hashing runs in a worker pool, so it doesn't block the event loop.
+    # Up to PASSWORD_HASHER_WORKERS jobs run at once (defaults to the CPU count),
+    # and up to PASSWORD_HASHER_MAX_QUEUE more may wait before new ones are rejected
+    PASSWORD_HASHER_EXECUTOR: PasswordHasherExecutorEnum = (
+        PasswordHasherExecutorEnum.thread
+    )
+    PASSWORD_HASHER_WORKERS: PositiveInt | None = None
+    PASSWORD_HASHER_MAX_QUEUE: conint(ge=0) = 64
+    # New hashes use PASSWORD_HASH_SCHEME with these parameters. Hashes of the
+    # other scheme, or with other costs, are still verified, and replaced on the
+    # User's next login. argon2 requires the `argon2` extra. Use
+    # `manage calibrate-hash` to pick costs for a target latency
+    PASSWORD_HASH_SCHEME: PasswordHashSchemeEnum = PasswordHashSchemeEnum.bcrypt
+    BCRYPT_ROUNDS: conint(ge=4, le=31) = 12
+    ARGON2_TIME_COST: PositiveInt = 3
+    # In KiB
+    ARGON2_MEMORY_COST: conint(ge=8) = 65536
+    ARGON2_PARALLELISM: PositiveInt = 4
+
+    # Settings related to login rate limiting
+    # Each client IP and each username get a bucket of login attempts, holding
+    # up to *_BURST of them, and refilled with *_PER_MINUTE. Attempts beyond it
+    # get 429, before any password is hashed. "local" keeps up to
+    # LOGIN_RATE_LIMIT_MAX_KEYS buckets in each worker process, "redis" shares
+    # them between workers and requires LOGIN_RATE_LIMIT_REDIS_URL
+    LOGIN_RATE_LIMIT_BACKEND: CacheBackendEnum = CacheBackendEnum.local
+    LOGIN_RATE_LIMIT_IP_BURST: PositiveInt = 20
+    LOGIN_RATE_LIMIT_IP_PER_MINUTE: PositiveFloat = 60
+    LOGIN_RATE_LIMIT_USERNAME_BURST: PositiveInt = 5
+    LOGIN_RATE_LIMIT_USERNAME_PER_MINUTE: PositiveFloat = 5
+    LOGIN_RATE_LIMIT_MAX_KEYS: PositiveInt = 100000
+    LOGIN_RATE_LIMIT_REDIS_URL: RedisDsn | None = None
+
+    # Settings related to the username filter
+    # With USERNAME_FILTER_ENABLED, each worker process keeps every username in a
+    # counting Bloom filter of USERNAME_FILTER_SIZE bytes, built at startup, so
+    # logins of usernames that don't exist skip the db. It's refreshed with the
+    # Users created by other workers when it misses, at most every
+    # USERNAME_FILTER_REFRESH_SECONDS, so new Users may take that long to be able
+    # to log in through other workers
+    USERNAME_FILTER_ENABLED: bool = False
+    USERNAME_FILTER_SIZE: PositiveInt = 8 * 1024 * 1024
+    USERNAME_FILTER_HASHES: conint(ge=1, le=32) = 6
+    USERNAME_FILTER_REFRESH_SECONDS: PositiveFloat = 1
+
+    # Settings related to the authenticated User cache
+    # Disabled by default. "local" keeps up to USER_CACHE_MAX_SIZE Users in each
+    # worker process, "redis" shares them between workers and requires
+    # USER_CACHE_REDIS_URL. With the local backend and several workers, Users
+    # changed by other workers may be stale for up to USER_CACHE_TTL seconds, so
+    # it's only safe with WORKERS=1
+    USER_CACHE_BACKEND: CacheBackendEnum = CacheBackendEnum.none
+    USER_CACHE_TTL: PositiveInt = 60
+    USER_CACHE_MAX_SIZE: PositiveInt = 10000
+    USER_CACHE_REDIS_URL: RedisDsn | None = None
+
+    # Settings related to monitoring
+    # Export Prometheus metrics at /metrics. With several worker processes, also
+    # set the PROMETHEUS_MULTIPROC_DIR environment variable
+    METRICS_ENABLED: bool = True
 
     # To use the API behind a proxy, set this variable to the desired base route
     # This will make the /docs URL work properly
@@ -70,6 +259,34 @@ class APISettings(BaseSettings):
             "port": self.PORT,
             "log_level": self.LOGLEVEL.lower(),  # Uvicorn expects lowercase strings
             "reload": self.ENVIRONMENT == EnvironmentEnum.development,
+            "timeout_keep_alive": self.KEEP_ALIVE,
+            "backlog": self.BACKLOG,
+        }
+
+    def get_gunicorn_settings(self) -> dict[str, Any]:
+        """Get a dictionary with settings ready to be used by Gunicorn."""
+        uvicorn_settings = self.get_uvicorn_settings()
+        return {
+            "bind": f"{uvicorn_settings['host']}:{uvicorn_settings['port']}",
+            "workers": self.WORKERS or os.cpu_count() or 1,
+            "worker_class": "uvicorn.workers.UvicornWorker",
+            "loglevel": uvicorn_settings["log_level"],
+            "keepalive": uvicorn_settings["timeout_keep_alive"],
+            "backlog": uvicorn_settings["backlog"],
+            "max_requests": self.MAX_REQUESTS,
+            "max_requests_jitter": self.MAX_REQUESTS_JITTER,
+            "graceful_timeout": self.GRACEFUL_TIMEOUT,
+            "timeout": self.WORKER_TIMEOUT,
+        }
+
+    def get_db_pool_settings(self) -> dict[str, Any]:
+        """Get a dictionary with pool settings ready to be used by create_engine."""
+        return {
+            "pool_size": self.DB_POOL_SIZE,
+            "max_overflow": self.DB_MAX_OVERFLOW,
+            "pool_timeout": self.DB_POOL_TIMEOUT,
+            "pool_recycle": self.DB_POOL_RECYCLE,
+            "pool_pre_ping": self.DB_POOL_PRE_PING,
         }
 
     @validator("SQLALCHEMY_DATABASE_URI", pre=True)
@@ -85,6 +302,53 @@ class APISettings(BaseSettings):
             path=f"/{values.get('POSTGRES_DB')}",
         )
 
+    @validator("SQLALCHEMY_ASYNC_DATABASE_URI", pre=True)
+    def assemble_async_db_connection(cls, v: str | None, values: dict[str, Any]) -> Any:
+        """Assemble the asyncpg database connection URL."""
+        if isinstance(v, str):
+            return v
+        return PostgresDsn.build(
+            scheme="postgresql+asyncpg",
+            user=values.get("POSTGRES_USER"),
+            password=values.get("POSTGRES_PASSWORD"),
+            host=values.get("POSTGRES_SERVER"),
+            path=f"/{values.get('POSTGRES_DB')}",
+        )
+
+    @validator("DB_POOL_WARMUP")
+    def check_db_pool_warmup(cls, v: int, values: dict[str, Any]) -> int:
+        """Don't warm up more connections than the pool keeps open."""
+        if "DB_POOL_SIZE" in values and v > values["DB_POOL_SIZE"]:
+            raise ValueError("DB_POOL_WARMUP can't be greater than DB_POOL_SIZE")
+        return v
+
+    @validator("JWT_PRIVATE_KEY_FILE", always=True)
+    def check_jwt_private_key_file(cls, v: str | None, values: dict[str, Any]) -> Any:
+        """Require a private key when tokens are signed with an asymmetric key."""
+        algorithm = values.get("ALGORITHM")
+        if v is None and algorithm is not None and not algorithm.is_symmetric:
+            raise ValueError(f"JWT_PRIVATE_KEY_FILE is required by {algorithm.value}")
+        return v
+
+    @validator("LOGIN_RATE_LIMIT_REDIS_URL", always=True)
+    def check_login_rate_limit_redis_url(
+        cls, v: str | None, values: dict[str, Any]
+    ) -> Any:
+        """Require a Redis URL when the rate limits are stored in Redis."""
+        backend = values.get("LOGIN_RATE_LIMIT_BACKEND")
+        if v is None and backend == CacheBackendEnum.redis:
+            raise ValueError(
+                "LOGIN_RATE_LIMIT_REDIS_URL is required by the redis backend"
+            )
+        return v
+
+    @validator("USER_CACHE_REDIS_URL", always=True)
+    def check_user_cache_redis_url(cls, v: str | None, values: dict[str, Any]) -> Any:
+        """Require a Redis URL when the User cache is stored in Redis."""
+        if v is None and values.get("USER_CACHE_BACKEND") == CacheBackendEnum.redis:
+            raise ValueError("USER_CACHE_REDIS_URL is required by the redis backend")
+        return v
+
 
 class Settings(APISettings):
     """API settings.
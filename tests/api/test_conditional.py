@@ -0,0 +1,101 @@
+"""Conditional request tests."""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from fastapi import Request
+
+from users_api.api import conditional
+
+UPDATED_AT = datetime(2022, 5, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)
+ROW = {"uuid": uuid.uuid4(), "updated_at": UPDATED_AT}
+
+
+def _request(**headers: str) -> Request:
+    """Build a request with some headers."""
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+def test_validators_change_with_rows_and_variant():
+    """The ETag changes when a row is updated or added, or the variant changes."""
+    validators = conditional.get_validators([ROW], variant=("username",))
+    updated = {**ROW, "updated_at": UPDATED_AT + timedelta(microseconds=1)}
+    added = {"uuid": uuid.uuid4(), "updated_at": UPDATED_AT - timedelta(days=1)}
+
+    assert validators == conditional.get_validators([ROW], variant=("username",))
+    assert validators.etag.startswith('"') and validators.etag.endswith('"')
+    assert validators.last_modified == UPDATED_AT
+    etags = [
+        validators.etag,
+        conditional.get_validators([updated], variant=("username",)).etag,
+        conditional.get_validators([ROW, added], variant=("username",)).etag,
+        conditional.get_validators([ROW], variant=("uuid",)).etag,
+        conditional.get_validators([], variant=("username",)).etag,
+    ]
+    assert len(set(etags)) == len(etags)
+    assert validators.headers == {
+        "ETag": validators.etag,
+        "Last-Modified": "Sun, 01 May 2022 12:30:15 GMT",
+    }
+    assert conditional.get_validators([]).headers.keys() == {"ETag"}
+    list_validators = conditional.get_validators(
+        [ROW], variant=("username",), with_last_modified=False
+    )
+    assert list_validators == (validators.etag, None)
+    assert list_validators.headers.keys() == {"ETag"}
+
+
+@pytest.mark.parametrize(
+    ("headers", "expected"),
+    [
+        ({}, False),
+        ({"if_none_match": "{etag}"}, True),
+        ({"if_none_match": 'W/{etag}, "other"'}, True),
+        ({"if_none_match": "*"}, True),
+        ({"if_none_match": '"other"'}, False),
+        ({"if_modified_since": "Sun, 01 May 2022 12:30:15 GMT"}, True),
+        ({"if_modified_since": "Sun, 01 May 2022 12:30:14 GMT"}, False),
+        ({"if_modified_since": "not a date"}, False),
+        # If-None-Match takes precedence
+        (
+            {
+                "if_none_match": '"other"',
+                "if_modified_since": "Sun, 01 May 2022 12:30:15 GMT",
+            },
+            False,
+        ),
+    ],
+)
+def test_is_not_modified(headers, expected):
+    """Requests match the validators as described by RFC 9110."""
+    validators = conditional.get_validators([ROW])
+    request = _request(
+        **{name: value.format(etag=validators.etag) for name, value in headers.items()}
+    )
+
+    assert conditional.is_conditional(request) == bool(headers)
+    assert conditional.is_not_modified(request, validators) == expected
+
+
+def test_not_modified():
+    """304 responses have no body, and carry the validators."""
+    validators = conditional.get_validators([ROW])
+
+    response = conditional.not_modified(validators)
+
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["ETag"] == validators.etag
+    assert response.headers["Last-Modified"] == format_datetime(
+        UPDATED_AT.replace(microsecond=0), usegmt=True
+    )
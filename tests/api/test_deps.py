@@ -0,0 +1,188 @@
+"""API dependencies tests."""
+
+import asyncio
+import uuid
+from unittest import mock
+
+import pytest
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from users_api import crud, schemas
+from users_api.api import deps, security
+
+
+def test_get_current_user_is_cached(
+    db_fixture: Session,
+    create_user_data,
+    local_cache,
+):
+    """The current User is loaded from the db once, then from the cache."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+    token = security.create_access_token(created_user.uuid)
+    hits, misses = crud.user_cache.hits, crud.user_cache.misses
+
+    first = asyncio.run(deps.authenticate(db_fixture, token))
+    second = asyncio.run(deps.authenticate(db_fixture, token))
+
+    assert first.uuid == second.uuid == created_user.uuid
+    assert second.username == created_user.username
+    assert crud.user_cache.misses == misses + 1
+    assert crud.user_cache.hits == hits + 1
+
+
+def test_get_current_user_cache_is_invalidated_on_write(
+    db_fixture: Session,
+    create_user_data,
+    local_cache,
+):
+    """Updating or removing a User invalidates its cached copy."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+    token = security.create_access_token(created_user.uuid)
+    asyncio.run(deps.authenticate(db_fixture, token))
+
+    crud.user.update_by_uuid(
+        db_fixture, uuid=created_user.uuid, obj_in={"first_name": "John"}
+    )
+    current_user = asyncio.run(deps.authenticate(db_fixture, token))
+    assert current_user.first_name == "John"
+
+    crud.user.remove_by_uuid(db_fixture, uuid=created_user.uuid)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(deps.authenticate(db_fixture, token))
+    assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_current_user_miss_racing_write(
+    db_fixture: Session,
+    create_user_data,
+    local_cache,
+):
+    """A User loaded before a write isn't cached after it."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+    token = security.create_access_token(created_user.uuid)
+    get_by_uuid = crud.async_user.get_by_uuid
+
+    async def _get_by_uuid_then_remove(db, *, uuid):
+        user = await get_by_uuid(db, uuid=uuid)
+        db_fixture.expunge(user)
+        crud.user.remove_by_uuid(db_fixture, uuid=uuid)
+        return user
+
+    with mock.patch.object(crud.async_user, "get_by_uuid", _get_by_uuid_then_remove):
+        asyncio.run(deps.authenticate(db_fixture, token))
+
+    assert crud.user_cache.get(created_user.uuid) is None
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(deps.authenticate(db_fixture, token))
+    assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_current_user_rejects_outdated_token_version(
+    db_fixture: Session,
+    create_user_data,
+):
+    """Changing the password revokes the access tokens already issued."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+    token = security.create_access_token(
+        created_user.uuid, claims={"is_superuser": False, "token_version": 0}
+    )
+    asyncio.run(deps.authenticate(db_fixture, token))
+
+    crud.user.update_password(db_fixture, db_user=created_user, new_password="new")
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(deps.authenticate(db_fixture, token))
+    assert exc_info.value.status_code == status.HTTP_403_FORBIDDEN
+
+
+@mock.patch.object(deps.settings, "AUTH_STATELESS", True)
+def test_get_token_version_miss_racing_password_change(
+    db_fixture: Session,
+    create_user_data,
+    local_cache,
+):
+    """A version read before a password change isn't cached after it."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+    token = security.create_access_token(
+        created_user.uuid, claims={"is_superuser": False, "token_version": 0}
+    )
+    get_token_version = crud.async_user.get_token_version
+
+    async def _get_token_version_then_change_password(db, *, uuid):
+        version = await get_token_version(db, uuid=uuid)
+        crud.user.update_password(db_fixture, db_user=created_user, new_password="new")
+        return version
+
+    with mock.patch.object(
+        crud.async_user,
+        "get_token_version",
+        _get_token_version_then_change_password,
+    ):
+        asyncio.run(deps.authenticate(db_fixture, token))
+
+    assert crud.token_version_cache.get(created_user.uuid) is None
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(deps.authenticate(db_fixture, token))
+    assert exc_info.value.status_code == status.HTTP_403_FORBIDDEN
+    assert crud.token_version_cache.get(created_user.uuid) == 1
+
+
+@mock.patch.object(deps.settings, "AUTH_STATELESS", True)
+def test_get_current_user_stateless(
+    db_fixture: Session,
+    create_user_data,
+    local_cache,
+):
+    """A Principal is built from the claims, checking only the token version."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+    token = security.create_access_token(
+        created_user.uuid, claims={"is_superuser": True, "token_version": 0}
+    )
+    misses = crud.user_cache.misses
+
+    principal = asyncio.run(deps.authenticate(db_fixture, token))
+
+    assert principal == schemas.Principal(
+        uuid=created_user.uuid, is_superuser=True, token_version=0
+    )
+    assert crud.user_cache.misses == misses
+    assert crud.token_version_cache.get(created_user.uuid) == 0
+    assert deps.get_current_superuser(principal) is principal
+    user_row = asyncio.run(deps.get_user_row(db_fixture, principal))
+    assert user_row.username == created_user.username
+
+    crud.user.update_password(db_fixture, db_user=created_user, new_password="new")
+
+    assert crud.token_version_cache.get(created_user.uuid) is None
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(deps.authenticate(db_fixture, token))
+    assert exc_info.value.status_code == status.HTTP_403_FORBIDDEN
+
+
+@mock.patch.object(deps.settings, "AUTH_CHECK_TOKEN_VERSION", False)
+@mock.patch.object(deps.settings, "AUTH_STATELESS", True)
+def test_get_current_user_stateless_without_version_check():
+    """Without the version check, the db isn't used at all."""
+    user_uuid = uuid.uuid4()
+    token = security.create_access_token(
+        user_uuid, claims={"is_superuser": False, "token_version": 4}
+    )
+    db = mock.Mock()
+
+    principal = asyncio.run(deps.authenticate(db, token))
+
+    assert principal.uuid == user_uuid
+    assert not principal.is_superuser
+    db.assert_not_called()
+    assert not db.method_calls
+
+
+@mock.patch.object(deps.settings, "AUTH_STATELESS", True)
+def test_get_current_user_stateless_requires_claims():
+    """Tokens issued without the authorization claims are rejected."""
+    token = security.create_access_token(uuid.uuid4())
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(deps.authenticate(mock.Mock(), token))
+    assert exc_info.value.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,96 @@
+"""Export serialization tests."""
+
+import asyncio
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from users_api.api import export
+
+FIELDS = {"uuid": "uuid", "first_name": "firstName", "created_at": "createdAt"}
+ROWS = [
+    SimpleNamespace(
+        uuid=uuid.uuid4(),
+        first_name="John",
+        created_at=datetime(2022, 1, 1, tzinfo=timezone.utc),
+    ),
+    SimpleNamespace(
+        uuid=uuid.uuid4(),
+        first_name=None,
+        created_at=datetime(2022, 1, 2, tzinfo=timezone.utc),
+    ),
+]
+
+
+async def _partitions():
+    # Rows come in batches, like the ones yielded by CRUDBase.stream
+    yield ROWS[:1]
+    yield ROWS[1:]
+
+
+def _encode(export_format: export.ExportFormatEnum) -> list[str]:
+    """Collect the chunks produced by an encoder."""
+
+    async def _collect():
+        encoder = export.ENCODERS[export_format]
+        return [chunk async for chunk in encoder(_partitions(), FIELDS)]
+
+    return asyncio.run(_collect())
+
+
+def test_encode_ndjson():
+    """Rows are encoded as one JSON object per line, one chunk per batch."""
+    chunks = _encode(export.ExportFormatEnum.ndjson)
+
+    assert len(chunks) == 2
+    lines = "".join(chunks).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {
+            "uuid": str(row.uuid),
+            "firstName": row.first_name,
+            "createdAt": row.created_at.isoformat(),
+        }
+        for row in ROWS
+    ]
+
+
+def test_encode_csv():
+    """Rows are encoded as CSV after a header, one chunk per batch."""
+    chunks = _encode(export.ExportFormatEnum.csv)
+
+    assert len(chunks) == 3
+    assert list(csv.reader(io.StringIO("".join(chunks)))) == [
+        ["uuid", "firstName", "createdAt"],
+        [str(ROWS[0].uuid), "John", "2022-01-01T00:00:00+00:00"],
+        [str(ROWS[1].uuid), "", "2022-01-02T00:00:00+00:00"],
+    ]
+
+
+def test_encode_csv_quotes_formulas():
+    """Text starting like a spreadsheet formula is prefixed with a quote."""
+    names = ["=1+1", "+1", "-1", "@SUM(A1)", "\tx", "John-Doe", "a=b"]
+    rows = [SimpleNamespace(first_name=name) for name in names]
+
+    async def _collect():
+        async def _partitions():
+            yield rows
+
+        encoder = export.ENCODERS[export.ExportFormatEnum.csv]
+        fields = {"first_name": "firstName"}
+        return [chunk async for chunk in encoder(_partitions(), fields)]
+
+    chunks = asyncio.run(_collect())
+
+    assert list(csv.reader(io.StringIO("".join(chunks)))) == [
+        ["firstName"],
+        ["'=1+1"],
+        ["'+1"],
+        ["'-1"],
+        ["'@SUM(A1)"],
+        ["'\tx"],
+        ["John-Doe"],
+        ["a=b"],
+    ]
@@ -1,12 +1,24 @@
 """Api security tests."""
 
+import asyncio
+import json
+import threading
 import uuid
 from datetime import timedelta
+from unittest import mock
 
-from jose import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import JWTError, jwt
 
 from users_api.api import security
-from users_api.settings import get_settings
+from users_api.settings import (
+    JWTAlgorithmEnum,
+    PasswordHasherExecutorEnum,
+    PasswordHashSchemeEnum,
+    get_settings,
+)
 
 settings = get_settings()
 
@@ -47,3 +59,237 @@ def test_generate_jwt_with_different_expire_time():
     )
 
     assert decoded_token["sub"] == str(uid)
+
+
+def test_password_hashing_async():
+    """Security async password hashing test."""
+    plain_password = "some_password"
+    hashed_password = asyncio.run(security.get_password_hash_async(plain_password))
+    assert asyncio.run(security.verify_password_async(plain_password, hashed_password))
+    assert not asyncio.run(
+        security.verify_password_async("wrong_password", hashed_password)
+    )
+
+
+def test_password_hashes_keep_order():
+    """Many passwords can be hashed in parallel, in the order they were given."""
+    passwords = [f"password{i}" for i in range(security.hasher.max_workers * 2 + 1)]
+    hashed_passwords = security.get_password_hashes(passwords)
+    hashed_passwords_async = asyncio.run(security.get_password_hashes_async(passwords))
+
+    for password, hashed, hashed_async in zip(
+        passwords, hashed_passwords, hashed_passwords_async
+    ):
+        assert security.verify_password(password, hashed)
+        assert security.verify_password(password, hashed_async)
+    assert security.get_password_hashes([]) == []
+
+
+def test_password_hasher_rejects_jobs_when_queue_is_full():
+    """The hasher raises PasswordHasherBusyError instead of queueing forever."""
+    hasher = security.PasswordHasher(max_workers=1, max_queue=0)
+    release = threading.Event()
+    try:
+        running = hasher.submit(release.wait)
+        with pytest.raises(security.PasswordHasherBusyError):
+            hasher.submit(release.wait)
+        release.set()
+        running.result()
+
+        # The slot is freed once the running job finishes
+        assert hasher.run(sum, [1, 2])
+    finally:
+        release.set()
+        hasher.shutdown()
+
+
+def test_password_hasher_with_process_pool():
+    """The hasher can run jobs in a process pool."""
+    hasher = security.PasswordHasher(
+        executor_type=PasswordHasherExecutorEnum.process, max_workers=1
+    )
+    try:
+        hashed_password = hasher.run(security._get_password_hash, "some_password")
+        assert security.verify_password("some_password", hashed_password)
+    finally:
+        hasher.shutdown()
+
+
+def test_iter_password_hashes_keeps_order():
+    """Batches are hashed in parallel, and their hashes yielded in order."""
+    hasher = security.PasswordHasher(max_workers=2, max_queue=0)
+    batches = [["a", "b"], [], ["c"], ["d", "e", "f"]]
+
+    results = list(security.iter_password_hashes(batches, hasher))
+
+    assert [len(hashes) for hashes in results] == [2, 0, 1, 3]
+    for passwords, hashes in zip(batches, results):
+        for password, hashed in zip(passwords, hashes):
+            assert security.verify_password(password, hashed)
+
+
+def write_private_key(path, algorithm: JWTAlgorithmEnum):
+    """Generate a private key for an asymmetric algorithm, and write it as PEM."""
+    if algorithm.value.startswith("RS"):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    path.write_bytes(
+        private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return path
+
+
+@pytest.fixture
+def use_keys():
+    """Change the key settings, reloading the cached keys."""
+    patchers = []
+
+    def _use_keys(algorithm, private_key_file=None, public_key_files=()):
+        patcher = mock.patch.multiple(
+            settings,
+            ALGORITHM=algorithm,
+            JWT_PRIVATE_KEY_FILE=private_key_file,
+            JWT_PUBLIC_KEY_FILES=list(public_key_files),
+        )
+        patcher.start()
+        patchers.append(patcher)
+        security.get_key_set.cache_clear()
+        return security.get_key_set()
+
+    yield _use_keys
+    for patcher in reversed(patchers):
+        patcher.stop()
+    security.get_key_set.cache_clear()
+
+
+def test_symmetric_tokens_have_no_published_keys():
+    """HS256 tokens are signed with SECRET_KEY, which is never published."""
+    access_token = security.create_access_token(data=uuid.uuid4())
+
+    assert "kid" not in jwt.get_unverified_header(access_token)
+    assert json.loads(security.get_key_set().jwks) == {"keys": []}
+    assert security.get_key_set() is security.get_key_set()
+
+
+@pytest.mark.parametrize("algorithm", [JWTAlgorithmEnum.RS256, JWTAlgorithmEnum.ES256])
+def test_asymmetric_tokens(tmp_path, use_keys, algorithm):
+    """Tokens carry the kid of their key, published without its private values."""
+    key_set = use_keys(algorithm, write_private_key(tmp_path / "key.pem", algorithm))
+    uid = uuid.uuid4()
+
+    access_token = security.create_access_token(data=uid)
+
+    header = jwt.get_unverified_header(access_token)
+    assert header == {"alg": algorithm.value, "kid": key_set.kid, "typ": "JWT"}
+    assert security.decode_access_token(access_token)["sub"] == str(uid)
+    (public_jwk,) = json.loads(key_set.jwks)["keys"]
+    assert public_jwk["kid"] == key_set.kid
+    assert public_jwk["alg"] == algorithm.value
+    assert "d" not in public_jwk
+    assert jwt.decode(access_token, public_jwk, algorithms=[algorithm.value])
+
+
+def test_rotated_keys_still_verify(tmp_path, use_keys):
+    """Tokens signed with a previous key are accepted while it's configured."""
+    old_key_file = write_private_key(tmp_path / "old.pem", JWTAlgorithmEnum.RS256)
+    new_key_file = write_private_key(tmp_path / "new.pem", JWTAlgorithmEnum.RS256)
+    old_key_set = use_keys(JWTAlgorithmEnum.RS256, old_key_file)
+    old_token = security.create_access_token(data=uuid.uuid4())
+
+    new_key_set = use_keys(JWTAlgorithmEnum.RS256, new_key_file, [old_key_file])
+    new_token = security.create_access_token(data=uuid.uuid4())
+
+    assert new_key_set.kid != old_key_set.kid
+    assert jwt.get_unverified_header(new_token)["kid"] == new_key_set.kid
+    assert security.decode_access_token(old_token)
+    assert security.decode_access_token(new_token)
+    kids = [key["kid"] for key in json.loads(new_key_set.jwks)["keys"]]
+    assert kids == [new_key_set.kid, old_key_set.kid]
+
+    use_keys(JWTAlgorithmEnum.RS256, new_key_file)
+    with pytest.raises(JWTError):
+        security.decode_access_token(old_token)
+
+
+def test_crypt_context_flags_outdated_hashes():
+    """Hashes with other costs, or of another scheme, need an update."""
+    pytest.importorskip("argon2")
+    old_context = security.build_crypt_context(
+        PasswordHashSchemeEnum.bcrypt, bcrypt_rounds=4
+    )
+    context = security.build_crypt_context(
+        PasswordHashSchemeEnum.bcrypt, bcrypt_rounds=5
+    )
+    argon2_context = security.build_crypt_context(
+        PasswordHashSchemeEnum.argon2,
+        argon2_time_cost=1,
+        argon2_memory_cost=1024,
+        argon2_parallelism=1,
+    )
+    old_hash = old_context.hash("password")
+
+    assert not old_context.needs_update(old_hash)
+    assert context.needs_update(old_hash)
+    assert argon2_context.verify("password", old_hash)
+
+    verified, new_hash = argon2_context.verify_and_update("password", old_hash)
+    assert verified
+    assert new_hash.startswith("$argon2id$")
+    assert not argon2_context.needs_update(new_hash)
+    assert context.verify("password", new_hash)
+    assert context.needs_update(new_hash)
+
+
+def test_verify_and_update_password():
+    """Outdated hashes are replaced once the password is verified."""
+    old_hash = security.build_crypt_context(
+        PasswordHashSchemeEnum.bcrypt, bcrypt_rounds=4
+    ).hash("password")
+
+    assert security.verify_and_update_password("wrong", old_hash) == (False, None)
+    verified, new_hash = asyncio.run(
+        security.verify_and_update_password_async("password", old_hash)
+    )
+    assert verified
+    assert security.verify_and_update_password("password", new_hash) == (True, None)
+
+
+def test_dummy_verify_password():
+    """Dummy verifications always fail, after hashing with the current scheme."""
+    with mock.patch.object(
+        security.pwd_context, "dummy_verify", wraps=security.pwd_context.dummy_verify
+    ) as dummy_verify:
+        assert not security.dummy_verify_password()
+        assert not asyncio.run(security.dummy_verify_password_async())
+
+    assert dummy_verify.call_count == 2
+
+
+def test_calibrate_password_hash():
+    """The highest cost under the target is chosen, or the lowest one if none is."""
+    with mock.patch.object(
+        security, "measure_hash_time", side_effect=[0.01, 0.02, 0.04, 0.08]
+    ):
+        calibration = security.calibrate_password_hash(
+            PasswordHashSchemeEnum.bcrypt, 0.05
+        )
+    assert calibration == security.HashCalibration({"bcrypt_rounds": 6}, 0.04)
+
+    with mock.patch.object(security, "measure_hash_time", side_effect=[0.5, 1]):
+        calibration = security.calibrate_password_hash(
+            PasswordHashSchemeEnum.argon2,
+            0.05,
+            argon2_memory_cost=1024,
+            argon2_parallelism=1,
+        )
+    assert calibration.params == {
+        "argon2_memory_cost": 1024,
+        "argon2_parallelism": 1,
+        "argon2_time_cost": 1,
+    }
+    assert calibration.seconds == 0.5
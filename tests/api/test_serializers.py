@@ -0,0 +1,89 @@
+"""Serializer tests."""
+
+import asyncio
+from unittest import mock
+
+import pytest
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from users_api import schemas
+from users_api.api import serializers
+from users_api.bench.serialization import build_page
+
+
+@pytest.mark.parametrize("orjson", [serializers.orjson, None], ids=["orjson", "json"])
+def test_serializer_matches_fastapi(orjson):
+    """Users are encoded to the same bytes as through their response_model."""
+    page = build_page(3)
+    field = create_response_field(name="Response", type_=list[schemas.UserList])
+    expected = JSONResponse(
+        asyncio.run(serialize_response(field=field, response_content=page))
+    ).body
+
+    with mock.patch.object(serializers, "orjson", orjson):
+        body = serializers.Serializer(schemas.UserList, many=True).render(page)
+
+    assert body == expected
+    assert b'"firstName":"J\xc3\xb6hn"' in body
+
+
+def test_serializer_mappings_use_defaults():
+    """Fields missing from mappings take their default value."""
+    user = build_page(1)[0]
+    serializer = serializers.Serializer(schemas.UserGet)
+
+    data = serializer.to_dict({"username": user.username, "uuid": user.uuid})
+
+    assert data["username"] == user.username
+    assert data["firstName"] is None
+
+
+def test_serializer_rejects_nested_schemas():
+    """Schemas with fields holding other schemas aren't supported."""
+    with pytest.raises(ValueError):
+        serializers.Serializer(schemas.UserBulkCreateOut)
+
+
+def test_respond_keeps_response_headers():
+    """Responses keep the headers and status code set on the Response parameter."""
+    user = build_page(1)[0]
+    serializer = serializers.Serializer(schemas.UserGet)
+    # Like the Response parameters FastAPI passes to endpoints
+    response = Response()
+    response.status_code = None
+    response.headers["Link"] = "<next>"
+
+    fast_response = serializer.respond(user, response, status_code=201)
+
+    assert fast_response.status_code == 201
+    assert fast_response.headers["Link"] == "<next>"
+    assert fast_response.headers["Content-Type"] == "application/json"
+    assert fast_response.body == serializer.render(user)
+    with mock.patch.object(serializers.settings, "FAST_JSON_RESPONSES", False):
+        assert serializer.respond(user, response) is user
+
+
+def test_serializer_project():
+    """Projections encode the requested fields only, by name or alias."""
+    user = build_page(1)[0]
+    serializer = serializers.Serializer(schemas.UserGet)
+
+    projection = serializer.project("createdAt, username")
+
+    assert projection.names == ("username", "created_at")
+    assert projection.to_dict(user) == {
+        "username": user.username,
+        "createdAt": user.created_at,
+    }
+    assert serializer.project("username,created_at") is projection
+    assert serializer.project(None) is serializer
+    with pytest.raises(ValueError):
+        serializer.project("username,passwordHash")
+    with pytest.raises(ValueError):
+        serializer.project(",")
+    # Projections don't match the schema, so FastAPI can't validate them
+    with mock.patch.object(serializers.settings, "FAST_JSON_RESPONSES", False):
+        assert projection.respond(user).body == projection.render(user)
@@ -4,14 +4,26 @@ from unittest import mock
 
 from fastapi import status
 from fastapi.testclient import TestClient
+from jose import jwt
 
 from tests.conftest import TEST_USER
-from users_api import models
+from users_api import models, ratelimit
+from users_api.crud.crud_refresh_token import RotatedToken
+from users_api.settings import get_settings
 
+settings = get_settings()
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+
+@mock.patch(
+    "users_api.api.v1.endpoints.auth.crud.async_refresh_token",
+    new_callable=mock.AsyncMock,
+)
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_auth(
     crud_user_mock,
+    crud_refresh_token_mock,
     client: TestClient,
 ):
     """Authenticate using /auth/login."""
@@ -20,10 +32,23 @@ def test_auth(
         "password": TEST_USER["password"],
     }
 
-    crud_user_mock.authenticate.return_value = models.User(**TEST_USER)
+    crud_user_mock.authenticate.return_value = models.User(**TEST_USER, token_version=3)
+    crud_refresh_token_mock.issue.return_value = "refresh-token"
 
     response = client.post("/v1/auth/login", data=login_data)
     assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.json()["refresh_token"] == "refresh-token"
+    payload = jwt.decode(
+        response.json()["access_token"],
+        settings.SECRET_KEY,
+        algorithms=[settings.ALGORITHM],
+    )
+    assert payload["sub"] == str(TEST_USER["uuid"])
+    assert payload["is_superuser"] is False
+    assert payload["token_version"] == 3
+    crud_refresh_token_mock.issue.assert_called_once_with(
+        mock.ANY, user_id=TEST_USER["id"]
+    )
 
     crud_user_mock.authenticate.assert_called_once_with(
         mock.ANY,
@@ -32,7 +57,9 @@ def test_auth(
     )
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_auth_with_invalid_credentials_throws_401(
     crud_user_mock,
     client: TestClient,
@@ -53,3 +80,72 @@ def test_auth_with_invalid_credentials_throws_401(
         username=login_data["username"],
         password=login_data["password"],
     )
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.auth.crud.async_refresh_token",
+    new_callable=mock.AsyncMock,
+)
+def test_refresh(crud_refresh_token_mock, client: TestClient):
+    """Get new tokens using /auth/refresh."""
+    crud_refresh_token_mock.rotate.return_value = RotatedToken(
+        user_uuid=TEST_USER["uuid"],
+        refresh_token="new-refresh-token",
+        is_superuser=True,
+        token_version=2,
+    )
+
+    response = client.post("/v1/auth/refresh", json={"refresh_token": "token"})
+
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.json()["refresh_token"] == "new-refresh-token"
+    payload = jwt.decode(
+        response.json()["access_token"],
+        settings.SECRET_KEY,
+        algorithms=[settings.ALGORITHM],
+    )
+    assert payload["sub"] == str(TEST_USER["uuid"])
+    assert payload["is_superuser"] is True
+    assert payload["token_version"] == 2
+    crud_refresh_token_mock.rotate.assert_called_once_with(mock.ANY, token="token")
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.auth.crud.async_refresh_token",
+    new_callable=mock.AsyncMock,
+)
+def test_refresh_with_invalid_token_throws_401(
+    crud_refresh_token_mock, client: TestClient
+):
+    """Unknown, expired or reused refresh tokens are rejected."""
+    crud_refresh_token_mock.rotate.return_value = None
+
+    response = client.post("/v1/auth/refresh", json={"refresh_token": "token"})
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED, response.text
+
+
+@mock.patch.object(
+    ratelimit,
+    "login_limiter",
+    ratelimit.LoginRateLimiter(
+        ratelimit.LocalTokenBuckets(max_size=10),
+        per_ip=ratelimit.RateLimit(burst=10, per_second=0.01),
+        per_username=ratelimit.RateLimit(burst=1, per_second=0.01),
+    ),
+)
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_auth_rate_limit_throws_429(crud_user_mock, client: TestClient):
+    """Attempts beyond the limit are rejected before checking the password."""
+    login_data = {"username": "limited_username", "password": "some_password"}
+    crud_user_mock.authenticate.return_value = None
+
+    response = client.post("/v1/auth/login", data=login_data)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED, response.text
+
+    response = client.post("/v1/auth/login", data=login_data)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS, response.text
+    assert response.headers["retry-after"] == "100"
+    crud_user_mock.authenticate.assert_called_once()
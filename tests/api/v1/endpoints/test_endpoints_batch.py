@@ -0,0 +1,203 @@
+"""Test /batch endpoints."""
+
+import asyncio
+import json
+import uuid
+from unittest import mock
+
+from fastapi import Request, status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from tests.conftest import TEST_USER
+from tests.utils import DependencyOverrider
+from users_api import crud, models
+from users_api.api import batch, deps, security
+from users_api.app import app
+from users_api.settings import get_settings
+
+settings = get_settings()
+
+
+def _auth_headers(db: Session) -> dict[str, str]:
+    """Create a superuser, and get the headers authenticating as them."""
+    superuser = crud.user.create(
+        db, obj_in={"username": "admin", "password": "pw", "is_superuser": True}
+    )
+    token = security.create_access_token(superuser.uuid)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_batch(
+    client: TestClient,
+    db_fixture: Session,
+):
+    """Run many requests at once, sharing the User authenticated from a token."""
+    headers = _auth_headers(db_fixture)
+    requests = [
+        {
+            "method": "POST",
+            "path": "/users",
+            "body": {"username": "new_user", "password": "pw"},
+        },
+        {"method": "GET", "path": "/users?username=new&fields=username"},
+        {
+            "method": "POST",
+            "path": "/users",
+            "body": {"username": "new_user", "password": "pw"},
+        },
+        {"path": "/users/not-a-uuid"},
+    ]
+
+    with mock.patch.object(deps, "authenticate", wraps=deps.authenticate) as auth:
+        response = client.post(
+            "/v1/batch", json={"requests": requests}, headers=headers
+        )
+    assert response.status_code == status.HTTP_200_OK, response.text
+
+    responses = response.json()
+    assert [item["status"] for item in responses] == [
+        status.HTTP_201_CREATED,
+        status.HTTP_200_OK,
+        status.HTTP_400_BAD_REQUEST,
+        status.HTTP_422_UNPROCESSABLE_ENTITY,
+    ]
+    assert responses[0]["body"]["username"] == "new_user"
+    assert responses[0]["headers"]["content-type"] == "application/json"
+    assert responses[1]["body"] == [{"username": "new_user"}]
+    # The session is still usable after a failed request
+    assert responses[3]["body"]["detail"][0]["loc"] == ["path", "user_id"]
+    # Once more after the session was rolled back by the failed request
+    assert auth.call_count == 2
+
+
+def test_batch_transaction(
+    client: TestClient,
+    db_fixture: Session,
+):
+    """Requests run in a single transaction, rolled back if one of them fails."""
+    headers = _auth_headers(db_fixture)
+    create = {
+        "method": "POST",
+        "path": "/users",
+        "body": {"username": "new_user", "password": "pw"},
+    }
+    update = {"method": "PUT", "path": "/users/{}", "body": {"firstName": "John"}}
+
+    def _get_db_override(request: Request):
+        # Let the requests of the batch use the session of its transaction
+        return batch.get_batch_db(request) or db_fixture
+
+    with DependencyOverrider(app, overrides={deps.get_db: _get_db_override}):
+        response = client.post(
+            "/v1/batch",
+            json={"requests": [create, create, create], "transaction": True},
+            headers=headers,
+        )
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert [item["status"] for item in response.json()] == [
+        status.HTTP_424_FAILED_DEPENDENCY,
+        status.HTTP_400_BAD_REQUEST,
+        status.HTTP_424_FAILED_DEPENDENCY,
+    ]
+    assert crud.user._get_by_username(db_fixture, username="new_user") is None
+
+    with DependencyOverrider(app, overrides={deps.get_db: _get_db_override}):
+        response = client.post(
+            "/v1/batch",
+            json={"requests": [create], "transaction": True},
+            headers=headers,
+        )
+        user_uuid = response.json()[0]["body"]["uuid"]
+        update["path"] = update["path"].format(user_uuid)
+        response = client.post(
+            "/v1/batch",
+            json={"requests": [update], "transaction": True},
+            headers=headers,
+        )
+    assert response.json()[0]["status"] == status.HTTP_200_OK
+    db_fixture.expire_all()
+    user = crud.user._get_by_username(db_fixture, username="new_user")
+    assert user.first_name == "John"
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_batch_runs_get_requests_concurrently(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """With DB_ASYNC, consecutive GET requests run concurrently."""
+    in_flight = []
+    both_in_flight = asyncio.Event()
+
+    async def _get_row_by_uuid(db, *, uuid, columns):
+        in_flight.append(uuid)
+        if len(in_flight) == 2:
+            both_in_flight.set()
+        await asyncio.wait_for(both_in_flight.wait(), timeout=5)
+        return models.User(**TEST_USER)
+
+    crud_user_mock.get_row_by_uuid.side_effect = _get_row_by_uuid
+    requests = [{"path": f"/users/{uuid.uuid4()}"} for _ in range(2)]
+
+    with mock.patch.object(batch.settings, "DB_ASYNC", True):
+        response = client.post("/v1/batch", json={"requests": requests})
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert [item["status"] for item in response.json()] == [status.HTTP_200_OK] * 2
+
+
+def test_batch_cannot_be_nested(client: TestClient):
+    """Batches can't hold other batches."""
+    requests = [{"method": "POST", "path": "/batch", "body": {"requests": []}}]
+
+    response = client.post("/v1/batch", json={"requests": requests})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST, response.text
+
+
+def test_batch_cannot_hold_exports(client: TestClient):
+    """Batches can't hold requests streaming their responses."""
+    for path in ("/users/export", "/users/export?format=csv", "/users/export/"):
+        response = client.post("/v1/batch", json={"requests": [{"path": path}]})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, response.text
+        assert response.json()["detail"] == "Streamed responses can't be batched"
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_batch_responses_too_large_throws_413(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Batches fail once their responses take more memory than allowed."""
+    crud_user_mock.get_row_by_uuid.return_value = models.User(**TEST_USER)
+    user_path = f"/users/{TEST_USER['uuid']}"
+    response = client.post("/v1/batch", json={"requests": [{"path": user_path}]})
+    assert response.status_code == status.HTTP_200_OK, response.text
+    size = len(json.dumps(response.json()[0]["body"], separators=(",", ":")))
+
+    with mock.patch.object(batch.settings, "BATCH_MAX_RESPONSE_BYTES", size - 1):
+        response = client.post("/v1/batch", json={"requests": [{"path": user_path}]})
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert "takes more than" in response.json()["detail"]
+
+    with mock.patch.object(batch.settings, "BATCH_MAX_TOTAL_BYTES", 2 * size - 1):
+        response = client.post(
+            "/v1/batch", json={"requests": [{"path": user_path}] * 2}
+        )
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert "responses of the batch" in response.json()["detail"]
+
+
+def test_batch_above_maximum_throws_422(client: TestClient):
+    """Batches can't hold more than BATCH_MAX_REQUESTS requests."""
+    requests = [{"path": "/users"}] * (settings.BATCH_MAX_REQUESTS + 1)
+
+    response = client.post("/v1/batch", json={"requests": requests})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, response.text
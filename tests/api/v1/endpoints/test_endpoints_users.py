@@ -9,9 +9,15 @@ from sqlalchemy.exc import IntegrityError
 
 from tests.conftest import TEST_SUPERUSER, TEST_USER
 from users_api import models, schemas
+from users_api.crud.pagination import InvalidCursorError, OrderByEnum, Page
+from users_api.settings import get_settings
 
+settings = get_settings()
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_create_user(
     crud_user_mock,
     client: TestClient,
@@ -31,7 +37,9 @@ def test_create_user(
     crud_user_mock.create.assert_called_once()
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_create_user_integrity_error_throws_400(
     crud_user_mock,
     client: TestClient,
@@ -48,6 +56,67 @@ def test_create_user_integrity_error_throws_400(
     crud_user_mock.create.assert_called_once()
 
 
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_create_users_bulk(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Create many Users via POST, reporting duplicates per item."""
+    data_to_send = [
+        schemas.UserCreateIn(**TEST_USER).dict(),
+        schemas.UserCreateIn(**TEST_SUPERUSER).dict(),
+    ]
+    crud_user_mock.create_multi.return_value = [models.User(**TEST_USER), None]
+
+    response = client.post("/v1/users/bulk", json=data_to_send)
+    assert response.status_code == status.HTTP_200_OK, response.text
+
+    received = [schemas.UserBulkCreateOut.parse_obj(item) for item in response.json()]
+    assert received == [
+        schemas.UserBulkCreateOut(
+            index=0,
+            username=TEST_USER["username"],
+            status=schemas.UserBulkCreateStatusEnum.created,
+            user=schemas.UserCreateOut.parse_obj(TEST_USER),
+        ),
+        schemas.UserBulkCreateOut(
+            index=1,
+            username=TEST_SUPERUSER["username"],
+            status=schemas.UserBulkCreateStatusEnum.duplicate,
+            user=None,
+        ),
+    ]
+    crud_user_mock.create_multi.assert_called_once()
+
+
+def test_create_users_bulk_above_maximum_throws_422(
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Create many Users returns 422 if the batch is empty or too big."""
+    user_data = schemas.UserCreateIn(**TEST_USER).dict()
+
+    response = client.post("/v1/users/bulk", json=[])
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, response.text
+
+    too_many = [user_data] * (settings.BULK_CREATE_MAX_ITEMS + 1)
+    response = client.post("/v1/users/bulk", json=too_many)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, response.text
+
+
+def test_create_users_bulk_without_permissions_throws_401(
+    client: TestClient,
+):
+    """Create many Users returns 401 if unauthorized."""
+    response = client.post("/v1/users/bulk", json=[])
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED, response.text
+
+
 def test_get_user(
     client: TestClient,
     # override get_current_user to return TEST_USER
@@ -62,7 +131,9 @@ def test_get_user(
     assert received == expected
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_get_user_as_superuser(
     crud_user_mock,
     client: TestClient,
@@ -70,7 +141,7 @@ def test_get_user_as_superuser(
     mock_current_user_superuser,
 ):
     """Get User via GET as superuser."""
-    crud_user_mock.get_by_uuid.return_value = TEST_USER
+    crud_user_mock.get_row_by_uuid.return_value = TEST_USER
 
     response = client.get(f"/v1/users/{TEST_USER['uuid']}")
     assert response.status_code == status.HTTP_200_OK, response.text
@@ -98,7 +169,9 @@ def test_get_user_without_privileges_throws_403(
     assert response.status_code == status.HTTP_403_FORBIDDEN, response.text
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_get_user_throws_404_if_not_found(
     crud_user_mock,
     client: TestClient,
@@ -106,15 +179,114 @@ def test_get_user_throws_404_if_not_found(
     mock_current_user_superuser,
 ):
     """Get User returns 404 if user is not found."""
-    crud_user_mock.get_by_uuid.return_value = None
+    crud_user_mock.get_row_by_uuid.return_value = None
 
     response = client.get(f"/v1/users/{uuid.uuid4()}")
     assert response.status_code == status.HTTP_404_NOT_FOUND, response.text
 
-    crud_user_mock.get_by_uuid.assert_called_once()
+    crud_user_mock.get_row_by_uuid.assert_called_once()
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_get_user_fields(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Get User returns only the requested fields, selecting only their columns."""
+    crud_user_mock.get_row_by_uuid.return_value = TEST_USER
+    user_id = uuid.uuid4()
+
+    response = client.get(
+        f"/v1/users/{user_id}", params={"fields": "username,createdAt"}
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.json() == {
+        "username": TEST_USER["username"],
+        "createdAt": TEST_USER["created_at"].isoformat(),
+    }
+
+    crud_user_mock.get_row_by_uuid.assert_called_once_with(
+        mock.ANY,
+        uuid=user_id,
+        columns=("username", "created_at", "uuid", "updated_at"),
+    )
+
+
+def test_get_user_unknown_field_throws_400(
+    client: TestClient,
+    # override get_current_user to return TEST_USER
+    mock_current_user,
+):
+    """Get User returns 400 if a requested field is unknown."""
+    response = client.get(
+        f"/v1/users/{TEST_USER['uuid']}", params={"fields": "username,passwordHash"}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST, response.text
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_get_user_not_modified(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Get User returns 304 if the client has the current version."""
+    crud_user_mock.get_row_by_uuid.return_value = TEST_USER
+    user_id = TEST_USER["uuid"]
+
+    response = client.get(f"/v1/users/{user_id}")
+    assert response.status_code == status.HTTP_200_OK, response.text
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    crud_user_mock.get_row_by_uuid.reset_mock()
+    for headers in ({"If-None-Match": etag}, {"If-Modified-Since": last_modified}):
+        response = client.get(f"/v1/users/{user_id}", headers=headers)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED, response.text
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+        # Only the columns of the validators are selected
+        crud_user_mock.get_row_by_uuid.assert_called_once_with(
+            mock.ANY, uuid=user_id, columns=("uuid", "updated_at")
+        )
+        crud_user_mock.get_row_by_uuid.reset_mock()
+
+    # The ETag of other fields doesn't match
+    response = client.get(
+        f"/v1/users/{user_id}",
+        params={"fields": "username"},
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.headers["ETag"] != etag
+
 
+def test_get_user_itself_not_modified(
+    client: TestClient,
+    # override get_current_user to return TEST_USER
+    mock_current_user,
+):
+    """Get User returns 304 to a User getting themselves, without a query."""
+    response = client.get(f"/v1/users/{TEST_USER['uuid']}")
+    assert response.status_code == status.HTTP_200_OK, response.text
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+    response = client.get(
+        f"/v1/users/{TEST_USER['uuid']}",
+        headers={"If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED, response.text
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_list_users(
     crud_user_mock,
     client: TestClient,
@@ -123,16 +295,208 @@ def test_list_users(
 ):
     """Get Users List via GET."""
     users = [models.User(**TEST_SUPERUSER)]
-    crud_user_mock.get_multi.return_value = users
+    crud_user_mock.get_page.return_value = Page(users, None)
 
     response = client.get("/v1/users")
     assert response.status_code == status.HTTP_200_OK, response.text
+    assert "Link" not in response.headers
 
     received = [schemas.UserList.parse_obj(user) for user in response.json()]
     expected = [schemas.UserList.from_orm(user) for user in users]
     assert received == expected
 
-    crud_user_mock.get_multi.assert_called_once()
+    crud_user_mock.get_page.assert_called_once()
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_list_users_next_page_link(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Get Users List returns a Link header pointing to the next page."""
+    users = [models.User(**TEST_SUPERUSER)]
+    crud_user_mock.get_page.return_value = Page(users, "next_cursor")
+
+    response = client.get("/v1/users", params={"limit": 1, "username": "adm"})
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.headers["Link"] == (
+        "<http://testserver/v1/users?limit=1&username=adm&cursor=next_cursor>; "
+        'rel="next"'
+    )
+
+    crud_user_mock.get_page.assert_called_once_with(
+        mock.ANY,
+        limit=1,
+        cursor=None,
+        order_by=OrderByEnum.created_at,
+        descending=False,
+        filters={
+            "username__startswith": "adm",
+            "is_superuser": None,
+            "created_at__gte": None,
+            "created_at__lt": None,
+        },
+        columns=tuple(schemas.UserList.__fields__),
+    )
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_list_users_fields(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Get Users List returns only the requested fields."""
+    users = [models.User(**TEST_SUPERUSER)]
+    crud_user_mock.get_page.return_value = Page(users, None)
+
+    with mock.patch.object(settings, "FAST_JSON_RESPONSES", False):
+        response = client.get("/v1/users", params={"fields": "uuid, firstName"})
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.json() == [{"firstName": None, "uuid": str(TEST_SUPERUSER["uuid"])}]
+
+    assert crud_user_mock.get_page.call_args.kwargs["columns"] == (
+        "first_name",
+        "uuid",
+        "updated_at",
+    )
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_list_users_not_modified(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Get Users List returns 304 if the client has the current page."""
+    users = [models.User(**TEST_SUPERUSER)]
+    crud_user_mock.get_page.return_value = Page(users, None)
+
+    response = client.get("/v1/users")
+    assert response.status_code == status.HTTP_200_OK, response.text
+    etag = response.headers["ETag"]
+
+    crud_user_mock.get_page.reset_mock()
+    response = client.get("/v1/users", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED, response.text
+    assert crud_user_mock.get_page.call_args.kwargs["columns"] == (
+        "uuid",
+        "updated_at",
+    )
+    crud_user_mock.get_page.assert_called_once()
+
+    # The page changes if there's now a next page
+    crud_user_mock.get_page.return_value = Page(users, "next_cursor")
+    response = client.get("/v1/users", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.headers["ETag"] != etag
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_list_users_modified_by_removal(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Get Users List returns the page again if one of its Users was removed."""
+    users = [models.User(**TEST_SUPERUSER), models.User(**TEST_USER)]
+    crud_user_mock.get_page.return_value = Page(users, None)
+
+    response = client.get("/v1/users")
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert "Last-Modified" not in response.headers
+    etag = response.headers["ETag"]
+
+    # The remaining User wasn't modified since, but the page was
+    crud_user_mock.get_page.return_value = Page(users[:1], None)
+    for headers in (
+        {"If-None-Match": etag},
+        {"If-Modified-Since": "Fri, 31 Dec 9999 23:59:59 GMT"},
+    ):
+        response = client.get("/v1/users", headers=headers)
+        assert response.status_code == status.HTTP_200_OK, response.text
+        assert response.headers["ETag"] != etag
+        assert len(response.json()) == 1
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_list_users_invalid_cursor_throws_400(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Get Users List returns 400 if the cursor is invalid."""
+    crud_user_mock.get_page.side_effect = InvalidCursorError("Invalid cursor")
+
+    response = client.get("/v1/users", params={"cursor": "invalid"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST, response.text
+
+
+def test_list_users_page_size_above_maximum_throws_422(
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Get Users List returns 422 if the page size is above PAGE_SIZE_MAX."""
+    response = client.get("/v1/users", params={"limit": settings.PAGE_SIZE_MAX + 1})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, response.text
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_export_users(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Export Users streams one JSON object per line."""
+
+    async def _partitions():
+        yield [models.User(**TEST_USER), models.User(**TEST_SUPERUSER)]
+
+    crud_user_mock.stream = mock.Mock(return_value=_partitions())
+
+    response = client.get("/v1/users/export")
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    received = [schemas.UserList.parse_raw(line) for line in response.iter_lines()]
+    expected = [
+        schemas.UserList.parse_obj(TEST_USER),
+        schemas.UserList.parse_obj(TEST_SUPERUSER),
+    ]
+    assert received == expected
+    crud_user_mock.stream.assert_called_once_with(
+        mock.ANY,
+        columns=mock.ANY,
+        batch_size=settings.EXPORT_BATCH_SIZE,
+    )
+
+
+def test_export_users_without_permissions_throws_401(
+    client: TestClient,
+):
+    """Export Users returns 401 if unauthorized."""
+    response = client.get("/v1/users/export")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED, response.text
 
 
 def test_list_users_without_permissions_throws_401(
@@ -143,7 +507,95 @@ def test_list_users_without_permissions_throws_401(
     assert response.status_code == status.HTTP_401_UNAUTHORIZED, response.text
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_lookup_users(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Look up many Users via POST, in the order of the given uuids."""
+    user = models.User(**TEST_USER)
+    crud_user_mock.get_rows_by_uuids.return_value = [user]
+    missing = uuid.uuid4()
+    user_ids = [str(missing), str(user.uuid), str(user.uuid)]
+
+    for fast_json_responses in (True, False):
+        with mock.patch.object(settings, "FAST_JSON_RESPONSES", fast_json_responses):
+            response = client.post("/v1/users/lookup", json=user_ids)
+        assert response.status_code == status.HTTP_200_OK, response.text
+
+        received = [schemas.UserLookupOut.parse_obj(item) for item in response.json()]
+        assert received == [
+            schemas.UserLookupOut(uuid=missing, status="not_found", user=None),
+            *[
+                schemas.UserLookupOut(
+                    uuid=user.uuid, status="found", user=schemas.UserGet.from_orm(user)
+                )
+            ]
+            * 2,
+        ]
+
+    crud_user_mock.get_rows_by_uuids.assert_called_with(
+        mock.ANY, uuids={missing, user.uuid}, columns=tuple(schemas.UserGet.__fields__)
+    )
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
+def test_lookup_users_fields(
+    crud_user_mock,
+    client: TestClient,
+    # override get_current_user to return TEST_USER
+    mock_current_user,
+):
+    """Users can look up themselves, selecting the uuid even if not requested."""
+    user = models.User(**TEST_USER)
+    crud_user_mock.get_rows_by_uuids.return_value = [user]
+
+    response = client.post(
+        "/v1/users/lookup", params={"fields": "username"}, json=[str(user.uuid)]
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.json() == [
+        {"uuid": str(user.uuid), "status": "found", "user": {"username": user.username}}
+    ]
+
+    crud_user_mock.get_rows_by_uuids.assert_called_once_with(
+        mock.ANY, uuids={user.uuid}, columns=("username", "uuid")
+    )
+
+
+def test_lookup_users_without_privileges_throws_403(
+    client: TestClient,
+    # override get_current_user to return TEST_USER
+    mock_current_user,
+):
+    """Look up Users returns 403 if looking up others without being a superuser."""
+    response = client.post(
+        "/v1/users/lookup", json=[str(TEST_USER["uuid"]), str(uuid.uuid4())]
+    )
+    assert response.status_code == status.HTTP_403_FORBIDDEN, response.text
+
+
+def test_lookup_users_above_maximum_throws_422(
+    client: TestClient,
+    # override get_current_user to return superuser
+    mock_current_user_superuser,
+):
+    """Look up Users returns 422 if there are too many uuids."""
+    user_ids = [str(uuid.uuid4()) for _ in range(settings.LOOKUP_MAX_ITEMS + 1)]
+
+    response = client.post("/v1/users/lookup", json=user_ids)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, response.text
+
+
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_update_user(
     crud_user_mock,
     client: TestClient,
@@ -158,7 +610,7 @@ def test_update_user(
     data_to_send = schemas.UserUpdateIn(**update_data)
     TEST_USER.update(data_to_send)
 
-    crud_user_mock.update.return_value = TEST_USER
+    crud_user_mock.update_by_uuid.return_value = TEST_USER
 
     response = client.put(f"/v1/users/{TEST_USER['uuid']}", json=data_to_send.dict())
     assert response.status_code == status.HTTP_200_OK, response.text
@@ -168,7 +620,9 @@ def test_update_user(
     assert received == expected
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_update_user_as_superuser(
     crud_user_mock,
     client: TestClient,
@@ -183,9 +637,7 @@ def test_update_user_as_superuser(
     data_to_send = schemas.UserUpdateIn(**update_data)
     TEST_USER.update(data_to_send)
 
-    user_mock = mock.MagicMock()
-    crud_user_mock.get_by_uuid.return_value = user_mock
-    crud_user_mock.update.return_value = TEST_USER
+    crud_user_mock.update_by_uuid.return_value = TEST_USER
     uid = TEST_USER["uuid"]
 
     response = client.put(f"/v1/users/{uid}", json=data_to_send.dict())
@@ -195,11 +647,12 @@ def test_update_user_as_superuser(
     expected = schemas.UserUpdateOut.parse_obj(TEST_USER)
     assert received == expected
 
-    crud_user_mock.get_by_uuid.assert_called_once_with(mock.ANY, uuid=uid)
-    crud_user_mock.update.assert_called_once_with(
+    crud_user_mock.get_by_uuid.assert_not_called()
+    crud_user_mock.update_by_uuid.assert_called_once_with(
         mock.ANY,
-        db_obj=user_mock,
+        uuid=uid,
         obj_in=data_to_send,
+        columns=schemas.UserUpdateOut.__fields__,
     )
 
 
@@ -223,7 +676,9 @@ def test_update_user_without_privileges_throws_403(
     assert response.status_code == status.HTTP_403_FORBIDDEN, response.text
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_update_user_throws_404_if_not_found(
     crud_user_mock,
     client: TestClient,
@@ -231,18 +686,25 @@ def test_update_user_throws_404_if_not_found(
     mock_current_user_superuser,
 ):
     """Update User returns 404 if user is not found."""
-    crud_user_mock.get_by_uuid.return_value = None
+    crud_user_mock.update_by_uuid.return_value = None
     data_to_send = schemas.UserUpdateIn(first_name="John", last_name="Doe")
 
     response = client.put(f"/v1/users/{uuid.uuid4()}", json=data_to_send.dict())
     assert response.status_code == status.HTTP_404_NOT_FOUND, response.text
 
-    crud_user_mock.get_by_uuid.assert_called_once()
+    crud_user_mock.update_by_uuid.assert_called_once()
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_refresh_token",
+    new_callable=mock.AsyncMock,
+)
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_update_user_password(
     crud_user_mock,
+    crud_refresh_token_mock,
     client: TestClient,
     # override get_current_user to return TEST_USER
     mock_current_user,
@@ -254,22 +716,35 @@ def test_update_user_password(
     }
     data_to_send = schemas.UserUpdatePasswordIn(**update_data)
 
+    crud_user_mock.get_by_uuid.return_value = models.User(**TEST_USER)
     crud_user_mock.update_password.return_value = TEST_USER
 
     response = client.put(
         f"/v1/users/{TEST_USER['uuid']}/password", json=data_to_send.dict()
     )
     assert response.status_code == status.HTTP_200_OK, response.text
+    # The password hash is loaded from the db, not from the cached current User
+    crud_user_mock.get_by_uuid.assert_called_once_with(mock.ANY, uuid=TEST_USER["uuid"])
 
     received = schemas.UserUpdatePasswordOut.parse_raw(response.text)
     assert received.detail == "Password updated successfully"
 
     crud_user_mock.update_password.assert_called_once()
+    crud_refresh_token_mock.revoke_user_tokens.assert_called_once_with(
+        mock.ANY, user_id=TEST_USER["id"]
+    )
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_refresh_token",
+    new_callable=mock.AsyncMock,
+)
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_update_user_password_as_superuser(
     crud_user_mock,
+    crud_refresh_token_mock,
     client: TestClient,
     # override get_current_user to return TEST_USER
     mock_current_user_superuser,
@@ -298,9 +773,14 @@ def test_update_user_password_as_superuser(
         db_user=user_mock,
         new_password=data_to_send.new_password,
     )
+    crud_refresh_token_mock.revoke_user_tokens.assert_called_once_with(
+        mock.ANY, user_id=user_mock.id
+    )
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_update_user_password_throws_400_if_wrong_password(
     crud_user_mock,
     client: TestClient,
@@ -346,7 +826,9 @@ def test_update_user_password_without_privileges_throws_403(
     assert response.status_code == status.HTTP_403_FORBIDDEN, response.text
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_update_user_password_throws_404_if_not_found(
     crud_user_mock,
     client: TestClient,
@@ -369,7 +851,9 @@ def test_update_user_password_throws_404_if_not_found(
     crud_user_mock.get_by_uuid.assert_called_once()
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_delete_user(
     crud_user_mock,
     client: TestClient,
@@ -377,15 +861,20 @@ def test_delete_user(
     mock_current_user,
 ):
     """Delete a User via DELETE."""
-    crud_user_mock.remove.return_value = None
+    crud_user_mock.remove_by_uuid.return_value = TEST_USER["id"]
 
     response = client.delete(f"/v1/users/{TEST_USER['uuid']}")
     assert response.status_code == status.HTTP_204_NO_CONTENT, response.text
+    assert response.content == b""
 
-    crud_user_mock.remove.assert_called_once_with(mock.ANY, id=TEST_USER["id"])
+    crud_user_mock.remove_by_uuid.assert_called_once_with(
+        mock.ANY, uuid=TEST_USER["uuid"]
+    )
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_delete_user_as_superuser(
     crud_user_mock,
     client: TestClient,
@@ -393,14 +882,15 @@ def test_delete_user_as_superuser(
     mock_current_user_superuser,
 ):
     """Delete a User via DELETE as superuser."""
-    crud_user_mock.get_by_uuid.return_value = models.User(**TEST_USER)
-    crud_user_mock.remove.return_value = None
+    crud_user_mock.remove_by_uuid.return_value = TEST_USER["id"]
 
     response = client.delete(f"/v1/users/{TEST_USER['uuid']}")
     assert response.status_code == status.HTTP_204_NO_CONTENT, response.text
 
-    crud_user_mock.get_by_uuid.assert_called_once_with(mock.ANY, uuid=TEST_USER["uuid"])
-    crud_user_mock.remove.assert_called_once_with(mock.ANY, id=TEST_USER["id"])
+    crud_user_mock.get_by_uuid.assert_not_called()
+    crud_user_mock.remove_by_uuid.assert_called_once_with(
+        mock.ANY, uuid=TEST_USER["uuid"]
+    )
 
 
 def test_delete_user_throws_401_if_unauthorized(
@@ -421,7 +911,9 @@ def test_delete_user_without_privileges_throws_403(
     assert response.status_code == status.HTTP_403_FORBIDDEN, response.text
 
 
-@mock.patch("users_api.api.v1.endpoints.users.crud.user")
+@mock.patch(
+    "users_api.api.v1.endpoints.users.crud.async_user", new_callable=mock.AsyncMock
+)
 def test_delete_user_throws_404_if_not_found(
     crud_user_mock,
     client: TestClient,
@@ -429,9 +921,9 @@ def test_delete_user_throws_404_if_not_found(
     mock_current_user_superuser,
 ):
     """Delete User password returns 404 if user is not found."""
-    crud_user_mock.get_by_uuid.return_value = None
+    crud_user_mock.remove_by_uuid.return_value = None
 
     response = client.delete(f"/v1/users/{uuid.uuid4()}")
     assert response.status_code == status.HTTP_404_NOT_FOUND, response.text
 
-    crud_user_mock.get_by_uuid.assert_called_once()
+    crud_user_mock.remove_by_uuid.assert_called_once()
@@ -0,0 +1,78 @@
+"""Benchmark report tests."""
+
+import pytest
+
+from users_api.bench.report import Recorder, compare_reports, percentile, summarize
+
+
+@pytest.mark.parametrize(
+    "q, expected", [(0, 1), (50, 5), (95, 10), (99, 10), (100, 10), (10, 1)]
+)
+def test_percentile(q, expected):
+    """Percentiles use the nearest-rank method."""
+    assert percentile(list(range(1, 11)), q) == expected
+
+
+def test_summarize():
+    """Each route is summarized with its RPS, latency percentiles and errors."""
+    recorder = Recorder()
+    for i in range(1, 101):
+        recorder.record("GET /v1/users", i / 1000, ok=True)
+    recorder.record("POST /v1/users", 0.5, ok=False)
+
+    report = summarize(recorder, elapsed=10, config={"concurrency": 1})
+
+    assert report["config"] == {"concurrency": 1}
+    assert report["routes"]["GET /v1/users"] == {
+        "requests": 100,
+        "errors": 0,
+        "rps": 10.0,
+        "mean_ms": 50.5,
+        "p50_ms": 50.0,
+        "p95_ms": 95.0,
+        "p99_ms": 99.0,
+        "max_ms": 100.0,
+    }
+    assert report["routes"]["POST /v1/users"]["errors"] == 1
+    assert report["total"]["requests"] == 101
+    assert report["total"]["errors"] == 1
+
+
+def _report(p99_ms=10.0, rps=100.0, errors=0):
+    return {
+        "version": 1,
+        "routes": {
+            "GET /v1/users": {
+                "requests": 1000,
+                "errors": errors,
+                "rps": rps,
+                "p50_ms": 5.0,
+                "p95_ms": 8.0,
+                "p99_ms": p99_ms,
+            }
+        },
+    }
+
+
+def test_compare_reports_within_tolerance():
+    """Changes smaller than max_regression aren't regressions."""
+    assert compare_reports(_report(), _report(p99_ms=10.9, rps=91)) == []
+
+
+@pytest.mark.parametrize(
+    "current, expected",
+    [
+        (_report(p99_ms=11.5), "GET /v1/users: p99_ms went from 10.0 to 11.5"),
+        (_report(rps=80), "GET /v1/users: rps went from 100.0 to 80"),
+        (_report(errors=10), "GET /v1/users: error rate went from 0.00% to 1.00%"),
+    ],
+)
+def test_compare_reports_regressions(current, expected):
+    """Slower, less frequent or failing requests are regressions."""
+    assert compare_reports(_report(), current) == [expected]
+
+
+def test_compare_reports_of_other_versions():
+    """Reports with different layouts aren't compared."""
+    baseline = {**_report(), "version": 0}
+    assert len(compare_reports(baseline, _report())) == 1
@@ -0,0 +1,14 @@
+"""Serialization micro-benchmark tests."""
+
+from users_api.bench.serialization import benchmark_serialization
+
+
+def test_benchmark_serialization():
+    """Both encodings are timed, and output the same bytes."""
+    report = benchmark_serialization(rows=10, repeat=2)
+
+    assert report["rows"] == 10
+    assert report["identical"]
+    assert report["fastapi_ms"] > 0
+    assert report["serializer_ms"] > 0
+    assert report["speedup"] > 0
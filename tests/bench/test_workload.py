@@ -0,0 +1,60 @@
+"""Benchmark workload tests."""
+
+import asyncio
+from unittest import mock
+
+import pytest
+
+from users_api import crud, ratelimit
+from users_api.app import app
+from users_api.bench.seed import seed_users
+
+httpx = pytest.importorskip("httpx")
+
+from users_api.bench.workload import ROUTES, parse_mix, run_benchmark  # noqa: E402
+
+
+def test_parse_mix():
+    """Weights are parsed by operation."""
+    assert parse_mix("get=10, list=0,login=1") == {"get": 10, "list": 0, "login": 1}
+
+
+@pytest.mark.parametrize("mix", ["get=10,unknown=1", "get=-1", "get", "get=0"])
+def test_parse_invalid_mix(mix):
+    """Unknown operations, invalid weights and empty workloads are rejected."""
+    with pytest.raises(ValueError):
+        parse_mix(mix)
+
+
+def test_seed_users(db_fixture):
+    """Seeding replaces the previously seeded Users."""
+    seed_users(db_fixture, count=5, prefix="seed_")
+    seed = seed_users(db_fixture, count=3, prefix="seed_")
+
+    assert [user.username for user in seed.users] == ["seed_0", "seed_1", "seed_2"]
+    assert crud.user.get_by_uuid(db_fixture, seed.admin.uuid).is_superuser
+    assert len(crud.user.get_multi(db_fixture)) == 4
+
+
+# Every login of the workload comes from the same client
+@mock.patch.object(ratelimit.login_limiter, "backend", ratelimit.TokenBuckets())
+def test_run_benchmark(client, db_fixture):
+    """Every operation of the mix is run and succeeds."""
+    seed = seed_users(db_fixture, count=5)
+
+    async def _test():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as test_client:
+            return await run_benchmark(
+                test_client,
+                seed,
+                mix=parse_mix("login=1,get=1,list=1,create=1,update=1,delete=1"),
+                concurrency=1,
+                duration=2,
+                random_seed=0,
+            )
+
+    report = asyncio.run(_test())
+
+    assert set(report["routes"]) == set(ROUTES.values())
+    assert report["total"]["errors"] == 0
+    assert report["config"]["users"] == 5
@@ -0,0 +1,43 @@
+"""Gunicorn application tests."""
+
+import os
+from unittest import mock
+
+from users_api.cli import server
+from users_api.settings import Settings
+
+
+def test_application_server_config():
+    """Settings are passed to gunicorn, and the app is loaded after forking."""
+    options = Settings(WORKERS=4, MAX_REQUESTS=100).get_gunicorn_settings()
+
+    application = server.ApplicationServer(options)
+
+    assert application.cfg.workers == 4
+    assert application.cfg.max_requests == 100
+    assert application.cfg.worker_class_str == "uvicorn.workers.UvicornWorker"
+    assert application.cfg.preload_app is False
+    assert application.cfg.on_starting is server.on_starting
+
+
+def test_on_starting_empties_multiproc_dir(tmp_path):
+    """Values left in the multiprocess directory by a previous run are removed."""
+    multiproc_dir = tmp_path / "metrics"
+    multiproc_dir.mkdir()
+    (multiproc_dir / "counter_123.db").write_bytes(b"old")
+
+    with mock.patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir)}):
+        server.on_starting(mock.Mock())
+
+    assert list(multiproc_dir.iterdir()) == []
+
+
+def test_on_starting_creates_multiproc_dir():
+    """A temporary multiprocess directory is used if none is set."""
+    with mock.patch.dict(os.environ):
+        os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        server.on_starting(mock.Mock())
+        path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+
+    assert os.path.isdir(path)
+    os.rmdir(path)
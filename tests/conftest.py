@@ -1,14 +1,18 @@
 """Main pytest config file."""
 
+from unittest import mock
+
 import pytest
 from fastapi.testclient import TestClient
 from pydantic import PostgresDsn
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlalchemy_utils import create_database, database_exists
 
 from tests.utils import TEST_SUPERUSER, TEST_USER, DependencyOverrider
-from users_api import models
+from users_api import cache, crud, models
 from users_api.api import deps
 from users_api.app import app
 from users_api.db.base_class import Base
@@ -69,6 +73,35 @@ def db_fixture(testing_session_local):
         con.commit()
         con.close()
 
+        # Cached Users would outlive their rows otherwise
+        crud.user_cache.clear()
+
+
+@pytest.fixture
+def local_cache():
+    """Cache Users and token versions in process, whatever the configured backend."""
+    with mock.patch.object(
+        crud.user_cache, "backend", cache.LocalCache(max_size=100, ttl=60)
+    ), mock.patch.object(
+        crud.token_version_cache, "backend", cache.LocalCache(max_size=100, ttl=60)
+    ):
+        yield
+
+
+@pytest.fixture
+def async_session_local(db_fixture, test_db_uri: PostgresDsn):
+    """Yield an AsyncSession factory bound to the test database."""
+    # Depending on db_fixture empties all db tables after each test.
+    # Each test runs its own event loop, so connections are not pooled
+    pytest.importorskip("asyncpg")
+    engine = create_async_engine(
+        test_db_uri.replace("postgresql://", "postgresql+asyncpg://", 1),
+        poolclass=NullPool,
+    )
+    yield sessionmaker(
+        engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
 
 @pytest.fixture
 def client(db_fixture) -> TestClient:
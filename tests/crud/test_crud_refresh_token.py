@@ -0,0 +1,116 @@
+"""Test the crud class of refresh tokens."""
+
+from datetime import datetime, timedelta, timezone
+
+from users_api import crud, models
+from users_api.api import security
+from users_api.settings import get_settings
+
+settings = get_settings()
+
+
+def test_issue_refresh_token(db_fixture, create_user_data):
+    """Only the hash of issued tokens is stored."""
+    user = crud.user.create(db_fixture, obj_in=create_user_data)
+
+    token = crud.refresh_token.issue(db_fixture, user_id=user.id)
+
+    db_token = db_fixture.query(models.RefreshToken).one()
+    assert db_token.token_hash == security.hash_refresh_token(token)
+    assert db_token.token_hash != token
+    assert db_token.user_id == user.id
+    assert db_token.used_at is None
+
+
+def test_rotate_refresh_token(db_fixture, create_user_data):
+    """A token can be used once, and is replaced by one of the same family."""
+    user = crud.user.create(db_fixture, obj_in=create_user_data)
+    token = crud.refresh_token.issue(db_fixture, user_id=user.id)
+
+    rotated = crud.refresh_token.rotate(db_fixture, token=token)
+
+    assert rotated.user_uuid == user.uuid
+    assert rotated.is_superuser is False
+    assert rotated.token_version == 0
+    assert rotated.refresh_token != token
+    assert crud.refresh_token.rotate(db_fixture, token=rotated.refresh_token)
+
+
+def test_reused_refresh_token_revokes_its_family(db_fixture, create_user_data):
+    """Using a token twice revokes every token rotated from the same login."""
+    user = crud.user.create(db_fixture, obj_in=create_user_data)
+    other_login_token = crud.refresh_token.issue(db_fixture, user_id=user.id)
+    token = crud.refresh_token.issue(db_fixture, user_id=user.id)
+    rotated = crud.refresh_token.rotate(db_fixture, token=token)
+
+    assert crud.refresh_token.rotate(db_fixture, token=token) is None
+
+    assert crud.refresh_token.rotate(db_fixture, token=rotated.refresh_token) is None
+    assert crud.refresh_token.rotate(db_fixture, token=other_login_token)
+
+
+def test_rotation_deletes_old_tokens_of_the_family(db_fixture, create_user_data):
+    """Rotating deletes the family's tokens used before the reuse window."""
+    user = crud.user.create(db_fixture, obj_in=create_user_data)
+    # Another family's used token isn't deleted
+    crud.refresh_token.issue(db_fixture, user_id=user.id)
+    db_fixture.query(models.RefreshToken).update(
+        {"used_at": datetime.now(timezone.utc) - timedelta(days=1)}
+    )
+    db_fixture.commit()
+    token = crud.refresh_token.issue(db_fixture, user_id=user.id)
+
+    for _ in range(5):
+        rotated = crud.refresh_token.rotate(db_fixture, token=token)
+        token = rotated.refresh_token
+    # Tokens used within the reuse window are kept, with the unused one
+    assert db_fixture.query(models.RefreshToken).count() == 7
+
+    db_fixture.query(models.RefreshToken).filter(
+        models.RefreshToken.used_at.is_not(None)
+    ).update(
+        {
+            "used_at": datetime.now(timezone.utc)
+            - timedelta(minutes=settings.REFRESH_TOKEN_REUSE_WINDOW_MINUTES + 1)
+        }
+    )
+    db_fixture.commit()
+    for _ in range(3):
+        rotated = crud.refresh_token.rotate(db_fixture, token=token)
+        token = rotated.refresh_token
+    # The 3 tokens used since, the unused one, and the other family's one
+    assert db_fixture.query(models.RefreshToken).count() == 5
+
+
+def test_expired_refresh_tokens(db_fixture, create_user_data):
+    """Expired tokens can't be used, and are deleted on the next login."""
+    user = crud.user.create(db_fixture, obj_in=create_user_data)
+    token = crud.refresh_token.issue(db_fixture, user_id=user.id)
+    db_fixture.query(models.RefreshToken).update(
+        {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}
+    )
+    db_fixture.commit()
+
+    assert crud.refresh_token.rotate(db_fixture, token=token) is None
+    crud.refresh_token.issue(db_fixture, user_id=user.id)
+    assert db_fixture.query(models.RefreshToken).count() == 1
+
+
+def test_revoke_user_tokens(db_fixture, create_user_data):
+    """Revoked tokens can't be used."""
+    user = crud.user.create(db_fixture, obj_in=create_user_data)
+    token = crud.refresh_token.issue(db_fixture, user_id=user.id)
+
+    crud.refresh_token.revoke_user_tokens(db_fixture, user_id=user.id)
+
+    assert crud.refresh_token.rotate(db_fixture, token=token) is None
+
+
+def test_deleting_user_deletes_its_tokens(db_fixture, create_user_data):
+    """Tokens are deleted with their User."""
+    user = crud.user.create(db_fixture, obj_in=create_user_data)
+    crud.refresh_token.issue(db_fixture, user_id=user.id)
+
+    crud.user.remove_by_uuid(db_fixture, uuid=user.uuid)
+
+    assert db_fixture.query(models.RefreshToken).count() == 0
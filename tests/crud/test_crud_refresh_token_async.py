@@ -0,0 +1,41 @@
+"""Test the async crud class of refresh tokens."""
+
+import asyncio
+
+from users_api import crud
+from users_api.crud.crud_refresh_token_async import AsyncCRUDRefreshToken
+
+async_refresh_token = AsyncCRUDRefreshToken()
+
+
+def test_rotate_refresh_token(async_session_local, db_fixture, create_user_data):
+    """A token can be used once, and reusing it revokes its family."""
+    user = crud.user.create(db_fixture, obj_in=create_user_data)
+
+    async def _test():
+        async with async_session_local() as db:
+            token = await async_refresh_token.issue(db, user_id=user.id)
+            rotated = await async_refresh_token.rotate(db, token=token)
+
+            assert rotated.user_uuid == user.uuid
+            assert await async_refresh_token.rotate(db, token=token) is None
+            assert (
+                await async_refresh_token.rotate(db, token=rotated.refresh_token)
+                is None
+            )
+
+    asyncio.run(_test())
+
+
+def test_revoke_user_tokens(async_session_local, db_fixture, create_user_data):
+    """Revoked tokens can't be used."""
+    user = crud.user.create(db_fixture, obj_in=create_user_data)
+
+    async def _test():
+        async with async_session_local() as db:
+            token = await async_refresh_token.issue(db, user_id=user.id)
+            await async_refresh_token.revoke_user_tokens(db, user_id=user.id)
+
+            assert await async_refresh_token.rotate(db, token=token) is None
+
+    asyncio.run(_test())
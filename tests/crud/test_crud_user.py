@@ -1,10 +1,20 @@
 """Test the crud class of Users."""
 
+import uuid
 from datetime import datetime, timezone
+from unittest import mock
 
+import pytest
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
 from users_api import crud, schemas
+from users_api.api import security
+from users_api.bloom import UsernameFilter
+from users_api.crud.crud_user import CRUDUser
+from users_api.crud.pagination import InvalidCursorError, OrderByEnum
+from users_api.models import User
+from users_api.settings import PasswordHashSchemeEnum
 
 
 def test_list_users_empty(
@@ -25,6 +35,89 @@ def test_create_user(
     assert created_user.username == create_user_data["username"]
 
 
+def test_create_user_single_statement(
+    db_fixture: Session,
+    create_user_data,
+):
+    """Creating a User takes a single INSERT ... RETURNING, with no refresh."""
+    statements = []
+
+    def _before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db_fixture.get_bind()
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+        assert created_user.uuid
+        assert created_user.created_at
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+
+    assert len(statements) == 1
+    assert statements[0].startswith("INSERT INTO users")
+    assert "RETURNING" in statements[0]
+
+
+def test_create_users_multi(
+    db_fixture: Session,
+    create_user_data,
+    create_user_data_multi,
+):
+    """Can create many Users at once, skipping the duplicated usernames."""
+    existing_user = crud.user.create(db_fixture, obj_in=create_user_data)
+    users_data = [
+        create_user_data_multi[0],
+        create_user_data,
+        {**create_user_data_multi[1], "first_name": "John", "is_superuser": True},
+        create_user_data_multi[0],
+    ]
+
+    created_users = crud.user.create_multi(db_fixture, objs_in=users_data)
+
+    assert created_users[1] is None
+    assert created_users[3] is None
+    user_1, user_2 = created_users[0], created_users[2]
+    assert user_1.username == create_user_data_multi[0]["username"]
+    assert user_1.verify_password(create_user_data_multi[0]["password"])
+    assert user_2.first_name == "John"
+    assert user_2.is_superuser
+    assert user_2.uuid and user_2.created_at
+    assert crud.user.get_multi(db_fixture) == [existing_user, user_1, user_2]
+
+
+def test_create_users_multi_single_statement(
+    db_fixture: Session,
+    create_user_data_multi,
+):
+    """Creating many Users takes a single multi-row INSERT ... ON CONFLICT."""
+    statements = []
+
+    def _before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db_fixture.get_bind()
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        created_users = crud.user.create_multi(
+            db_fixture, objs_in=create_user_data_multi
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+
+    assert len(created_users) == 2
+    assert len(statements) == 1
+    assert statements[0].startswith("INSERT INTO users")
+    assert "ON CONFLICT (username) DO NOTHING RETURNING" in statements[0]
+
+
+def test_create_users_multi_empty(
+    db_fixture: Session,
+):
+    """Creating an empty list of Users doesn't hit the db."""
+    assert crud.user.create_multi(db_fixture, objs_in=[]) == []
+
+
 def test_update_user(
     db_fixture: Session,
     create_user_data,
@@ -46,6 +139,30 @@ def test_update_user(
     assert updated_user.last_name == update_user_data["last_name"]
 
 
+def test_writes_invalidate_cached_user(
+    db_fixture: Session,
+    create_user_data,
+    local_cache,
+):
+    """Updating, changing the password of or removing a User invalidates its cache."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+
+    def _is_cached():
+        return crud.user_cache.backend.get(str(created_user.uuid)) is not None
+
+    crud.user_cache.set(created_user)
+    crud.user.update(db_fixture, db_obj=created_user, obj_in={"first_name": "John"})
+    assert not _is_cached()
+
+    crud.user_cache.set(created_user)
+    crud.user.update_password(db_fixture, db_user=created_user, new_password="new")
+    assert not _is_cached()
+
+    crud.user_cache.set(created_user)
+    crud.user.remove(db_fixture, id=created_user.id)
+    assert not _is_cached()
+
+
 def test_update_user_from_schema(
     db_fixture: Session,
     create_user_data,
@@ -68,6 +185,44 @@ def test_update_user_from_schema(
     assert updated_user.last_name == update_user_schema.last_name
 
 
+def test_update_user_by_uuid(
+    db_fixture: Session,
+    create_user_data,
+):
+    """Can update a created User by uuid, getting back the updated row."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+    old_updated_at = created_user.updated_at
+    update_user_schema = schemas.user.UserUpdateIn(first_name="John")
+
+    updated_row = crud.user.update_by_uuid(
+        db_fixture,
+        uuid=created_user.uuid,
+        obj_in=update_user_schema,
+        columns=["uuid", "first_name", "last_name", "updated_at"],
+    )
+
+    assert updated_row.uuid == created_user.uuid
+    assert updated_row.first_name == "John"
+    # Fields not set in the schema are left untouched
+    assert updated_row.last_name is None
+    assert updated_row.updated_at > old_updated_at
+    assert "password_hash" not in updated_row._fields
+    assert crud.user.get_by_uuid(db_fixture, uuid=created_user.uuid).first_name == (
+        "John"
+    )
+
+
+def test_update_user_by_uuid_not_found_returns_none(
+    db_fixture: Session,
+):
+    """Updating a User that doesn't exist returns None."""
+    updated_row = crud.user.update_by_uuid(
+        db_fixture, uuid=uuid.uuid4(), obj_in={"first_name": "John"}
+    )
+
+    assert updated_row is None
+
+
 def test_user_created_at(
     db_fixture: Session,
     create_user_data,
@@ -131,6 +286,141 @@ def test_list_users(
     assert user_2 in items
 
 
+def test_list_users_columns(
+    db_fixture: Session,
+    create_user_data_multi,
+):
+    """Retrieve some columns of a list of users, as rows."""
+    users = [
+        crud.user.create(db=db_fixture, obj_in=user_data)
+        for user_data in create_user_data_multi
+    ]
+
+    rows = crud.user.get_multi(db_fixture, columns=["username"])
+
+    # The columns of the ordering key are needed by the cursor
+    assert [tuple(row) for row in rows] == [
+        (user.username, user.created_at, user.id) for user in users
+    ]
+    page = crud.user.get_page(
+        db_fixture, limit=1, order_by=OrderByEnum.id, columns=["uuid"]
+    )
+    assert list(page.items[0]._mapping) == ["uuid", "id"]
+    next_page = crud.user.get_page(
+        db_fixture,
+        limit=1,
+        cursor=page.next_cursor,
+        order_by=OrderByEnum.id,
+        columns=["uuid"],
+    )
+    assert next_page.items[0].uuid == users[1].uuid
+
+
+def test_list_users_pages(
+    db_fixture: Session,
+):
+    """Retrieve every user, one page at a time."""
+    users = [
+        crud.user.create(db_fixture, obj_in={"username": f"user{i}", "password": "pw"})
+        for i in range(5)
+    ]
+
+    pages = [crud.user.get_page(db_fixture, limit=2)]
+    while pages[-1].next_cursor:
+        pages.append(
+            crud.user.get_page(db_fixture, limit=2, cursor=pages[-1].next_cursor)
+        )
+
+    assert [len(page.items) for page in pages] == [2, 2, 1]
+    assert [user for page in pages for user in page.items] == users
+
+
+@pytest.mark.parametrize("order_by", [OrderByEnum.created_at, OrderByEnum.id])
+def test_list_users_pages_descending(
+    db_fixture: Session,
+    order_by: OrderByEnum,
+):
+    """Retrieve users in descending order, one page at a time."""
+    users = [
+        crud.user.create(db_fixture, obj_in={"username": f"user{i}", "password": "pw"})
+        for i in range(3)
+    ]
+
+    first_page = crud.user.get_page(
+        db_fixture, limit=2, order_by=order_by, descending=True
+    )
+    second_page = crud.user.get_page(
+        db_fixture,
+        limit=2,
+        cursor=first_page.next_cursor,
+        order_by=order_by,
+        descending=True,
+    )
+
+    assert first_page.items == users[:0:-1]
+    assert second_page.items == users[:1]
+    assert second_page.next_cursor is None
+
+
+def test_list_users_cursor_with_different_ordering_raises(
+    db_fixture: Session,
+    create_user_data_multi,
+):
+    """A cursor can only be used with the ordering it was created for."""
+    for user_data in create_user_data_multi:
+        crud.user.create(db_fixture, obj_in=user_data)
+    page = crud.user.get_page(db_fixture, limit=1)
+
+    with pytest.raises(InvalidCursorError):
+        crud.user.get_page(db_fixture, cursor=page.next_cursor, descending=True)
+    with pytest.raises(InvalidCursorError):
+        crud.user.get_page(db_fixture, cursor="not-a-cursor")
+
+
+def test_list_users_filters(
+    db_fixture: Session,
+    create_user_data_multi,
+):
+    """Retrieve a list of users matching some filters."""
+    for user_data in create_user_data_multi:
+        crud.user.create(db_fixture, obj_in=user_data)
+    admin = crud.user.create(
+        db_fixture,
+        obj_in={"username": "admin_1", "password": "pw", "is_superuser": True},
+    )
+
+    assert crud.user.get_multi(db_fixture, filters={"username__startswith": "adm"}) == [
+        admin
+    ]
+    assert crud.user.get_multi(db_fixture, filters={"is_superuser": True}) == [admin]
+    assert crud.user.get_multi(
+        db_fixture, filters={"created_at__gte": admin.created_at}
+    ) == [admin]
+    assert len(
+        crud.user.get_multi(db_fixture, filters={"created_at__lt": admin.created_at})
+    ) == len(create_user_data_multi)
+    # LIKE wildcards are escaped
+    assert crud.user.get_multi(db_fixture, filters={"username__startswith": "%"}) == []
+
+
+def test_stream_users(
+    db_fixture: Session,
+):
+    """Can iterate over every User in batches, with the requested columns."""
+    for i in range(5):
+        crud.user.create(db_fixture, obj_in={"username": f"user{i}", "password": "pw"})
+
+    partitions = list(
+        crud.user.stream(db_fixture, columns=["username", "uuid"], batch_size=2)
+    )
+
+    assert [len(rows) for rows in partitions] == [2, 2, 1]
+    rows = [row for rows in partitions for row in rows]
+    assert [row.username for row in rows] == [f"user{i}" for i in range(5)]
+    assert list(rows[0]._mapping) == ["username", "uuid"]
+    assert list(crud.user.stream(db_fixture, filters={"username": "user9"})) == []
+
+
 def test_get_user_by_id(
     db_fixture: Session,
     create_user_data,
@@ -155,6 +445,52 @@ def test_get_user_by_uuid(
     assert retrieved_user == created_user
 
 
+def test_get_row_by_uuid(
+    db_fixture: Session,
+    create_user_data,
+):
+    """Retrieve some columns of a user by uuid."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+
+    row = crud.user.get_row_by_uuid(
+        db_fixture, uuid=created_user.uuid, columns=["username", "created_at"]
+    )
+
+    assert tuple(row) == (created_user.username, created_user.created_at)
+    assert crud.user.get_row_by_uuid(db_fixture, uuid=uuid.uuid4()) is None
+
+
+def test_get_rows_by_uuids(
+    db_fixture: Session,
+    create_user_data_multi,
+):
+    """Retrieve some columns of many users by uuid, with a single query."""
+    users = [
+        crud.user.create(db=db_fixture, obj_in=user_data)
+        for user_data in create_user_data_multi
+    ]
+    expected = sorted((user.uuid, user.username) for user in users)
+    statements = []
+
+    def _before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db_fixture.get_bind()
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        rows = crud.user.get_rows_by_uuids(
+            db_fixture,
+            uuids=[user_uuid for user_uuid, _ in expected] + [uuid.uuid4()],
+            columns=["uuid", "username"],
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+
+    assert sorted(rows) == expected
+    assert len(statements) == 1
+    assert "= ANY (" in statements[0]
+
+
 def test_remove_user(
     db_fixture: Session,
     create_user_data,
@@ -169,6 +505,20 @@ def test_remove_user(
     assert len(items) == 0
 
 
+def test_remove_user_by_uuid(
+    db_fixture: Session,
+    create_user_data,
+):
+    """Can remove a user by uuid, getting back its id."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+
+    removed_id = crud.user.remove_by_uuid(db_fixture, uuid=created_user.uuid)
+
+    assert removed_id == created_user.id
+    assert crud.user.get_multi(db=db_fixture) == []
+    assert crud.user.remove_by_uuid(db_fixture, uuid=created_user.uuid) is None
+
+
 def test_get_user_by_username(
     db_fixture: Session,
     create_user_data,
@@ -200,6 +550,27 @@ def test_authenticate_user(
     assert auth_user == created_user
 
 
+def test_authenticate_user_rehashes_outdated_password_hash(
+    db_fixture: Session,
+    create_user_data,
+):
+    """A hash with another cost is replaced on a successful login."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+    created_user.password_hash = security.build_crypt_context(
+        PasswordHashSchemeEnum.bcrypt, bcrypt_rounds=4
+    ).hash(create_user_data["password"])
+    db_fixture.commit()
+
+    auth_user = crud.user.authenticate(
+        db_fixture,
+        username=create_user_data["username"],
+        password=create_user_data["password"],
+    )
+
+    assert not security.pwd_context.needs_update(auth_user.password_hash)
+    assert auth_user.verify_password(create_user_data["password"])
+
+
 def test_authenticate_user_with_invalid_username_returns_none(
     db_fixture: Session,
     create_user_data,
@@ -216,6 +587,68 @@ def test_authenticate_user_with_invalid_username_returns_none(
     assert not auth_user
 
 
+def test_authenticate_user_with_invalid_username_verifies_dummy_hash(
+    db_fixture: Session,
+):
+    """Unknown usernames spend as long as a password check."""
+    with mock.patch.object(security, "dummy_verify_password") as dummy_verify:
+        assert not crud.user.authenticate(
+            db_fixture, username="invalid_username", password="password"
+        )
+
+    dummy_verify.assert_called_once_with()
+
+
+def test_username_filter_skips_unknown_usernames(
+    db_fixture: Session,
+    create_user_data,
+    create_user_data_multi,
+):
+    """Usernames ruled out by the username filter aren't looked up."""
+    username_filter = UsernameFilter(size=1024, hashes=4, refresh_seconds=60)
+    crud_user = CRUDUser(User, username_filter=username_filter)
+    crud.user.create(db_fixture, obj_in=create_user_data)
+    assert crud_user.refresh_username_filter(db_fixture)
+    crud_user.create_multi(db_fixture, objs_in=create_user_data_multi)
+    statements = []
+
+    def _before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db_fixture.get_bind()
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        assert not crud_user._get_by_username(db_fixture, username="invalid")
+        assert not statements
+        for user_data in [create_user_data, *create_user_data_multi]:
+            username = user_data["username"]
+            assert crud_user._get_by_username(db_fixture, username=username)
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+
+    removed = crud_user._get_by_username(
+        db_fixture, username=create_user_data["username"]
+    )
+    crud_user.remove_by_uuid(db_fixture, uuid=removed.uuid)
+    assert not username_filter.might_exist(create_user_data["username"])
+
+
+def test_username_filter_refreshes_when_stale(
+    db_fixture: Session,
+    create_user_data,
+):
+    """Users created by other processes are found once the filter is stale."""
+    username_filter = UsernameFilter(size=1024, hashes=4, refresh_seconds=60)
+    crud_user = CRUDUser(User, username_filter=username_filter)
+    crud_user.refresh_username_filter(db_fixture)
+    crud.user.create(db_fixture, obj_in=create_user_data)
+    username = create_user_data["username"]
+
+    assert not crud_user._get_by_username(db_fixture, username=username)
+    username_filter.refresh_seconds = 0
+    assert crud_user._get_by_username(db_fixture, username=username)
+
+
 def test_authenticate_user_with_invalid_password_returns_none(
     db_fixture: Session,
     create_user_data,
@@ -246,3 +679,18 @@ def test_update_user_password(
     )
 
     assert updated_user.verify_password(new_password)
+    assert updated_user.token_version == 1
+
+
+def test_get_token_version(
+    db_fixture: Session,
+    create_user_data,
+):
+    """Get the token version of a User, bumped by password changes."""
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+    assert crud.user.get_token_version(db_fixture, uuid=created_user.uuid) == 0
+
+    crud.user.update_password(db_fixture, db_user=created_user, new_password="new")
+
+    assert crud.user.get_token_version(db_fixture, uuid=created_user.uuid) == 1
+    assert crud.user.get_token_version(db_fixture, uuid=uuid.uuid4()) is None
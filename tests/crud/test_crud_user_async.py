@@ -0,0 +1,389 @@
+"""Test the async crud class of Users."""
+
+import asyncio
+import uuid
+from unittest import mock
+
+from sqlalchemy.orm import Session
+
+from users_api import crud, models
+from users_api.api import security
+from users_api.bloom import UsernameFilter
+from users_api.crud.base_async import ThreadpoolCRUD
+from users_api.crud.crud_user_async import AsyncCRUDUser
+from users_api.settings import PasswordHashSchemeEnum
+
+async_user = AsyncCRUDUser(models.User)
+
+
+def test_create_user(
+    async_session_local,
+    create_user_data,
+):
+    """Can create a new User."""
+
+    async def _test():
+        async with async_session_local() as db:
+            created_user = await async_user.create(db, obj_in=create_user_data)
+
+            assert created_user.username == create_user_data["username"]
+            assert created_user.uuid
+            assert created_user.verify_password(create_user_data["password"])
+
+    asyncio.run(_test())
+
+
+def test_create_users_multi(
+    async_session_local,
+    create_user_data,
+    create_user_data_multi,
+):
+    """Can create many Users at once, skipping the duplicated usernames."""
+
+    async def _test():
+        async with async_session_local() as db:
+            await async_user.create(db, obj_in=create_user_data)
+            users_data = [create_user_data, *create_user_data_multi]
+
+            created_users = await async_user.create_multi(db, objs_in=users_data)
+
+            assert created_users[0] is None
+            assert [user.username for user in created_users[1:]] == [
+                user_data["username"] for user_data in create_user_data_multi
+            ]
+            assert created_users[1].uuid
+            assert created_users[1].verify_password(
+                create_user_data_multi[0]["password"]
+            )
+
+    asyncio.run(_test())
+
+
+def test_get_user_by_uuid(
+    async_session_local,
+    create_user_data,
+):
+    """Retrieve a user by uuid."""
+
+    async def _test():
+        async with async_session_local() as db:
+            created_user = await async_user.create(db, obj_in=create_user_data)
+
+            retrieved_user = await async_user.get_by_uuid(db, uuid=created_user.uuid)
+
+            assert retrieved_user == created_user
+
+    asyncio.run(_test())
+
+
+def test_list_users(
+    async_session_local,
+    create_user_data_multi,
+):
+    """Retrieve a list of users."""
+
+    async def _test():
+        async with async_session_local() as db:
+            for user_data in create_user_data_multi:
+                await async_user.create(db, obj_in=user_data)
+
+            items = await async_user.get_multi(db)
+
+            assert len(items) == len(create_user_data_multi)
+
+    asyncio.run(_test())
+
+
+def test_list_users_columns(
+    async_session_local,
+    create_user_data_multi,
+):
+    """Retrieve some columns of a list of users, and of a single user, as rows."""
+
+    async def _test():
+        async with async_session_local() as db:
+            users = [
+                await async_user.create(db, obj_in=user_data)
+                for user_data in create_user_data_multi
+            ]
+
+            page = await async_user.get_page(db, limit=1, columns=["username"])
+            row = await async_user.get_row_by_uuid(
+                db, uuid=users[1].uuid, columns=["username"]
+            )
+
+            assert tuple(page.items[0]) == (
+                users[0].username,
+                users[0].created_at,
+                users[0].id,
+            )
+            assert page.next_cursor is not None
+            assert tuple(row) == (users[1].username,)
+
+    asyncio.run(_test())
+
+
+def test_get_rows_by_uuids(
+    async_session_local,
+    create_user_data_multi,
+):
+    """Retrieve some columns of many users by uuid."""
+
+    async def _test():
+        async with async_session_local() as db:
+            users = [
+                await async_user.create(db, obj_in=user_data)
+                for user_data in create_user_data_multi
+            ]
+
+            rows = await async_user.get_rows_by_uuids(
+                db, uuids=[users[0].uuid, uuid.uuid4()], columns=["username"]
+            )
+
+            assert [tuple(row) for row in rows] == [(users[0].username,)]
+
+    asyncio.run(_test())
+
+
+def test_stream_users(
+    async_session_local,
+    create_user_data_multi,
+):
+    """Can iterate over every User in batches."""
+
+    async def _test():
+        async with async_session_local() as db:
+            for user_data in create_user_data_multi:
+                await async_user.create(db, obj_in=user_data)
+
+            partitions = [
+                rows
+                async for rows in async_user.stream(
+                    db, columns=["username"], batch_size=1
+                )
+            ]
+
+            assert [[row.username for row in rows] for rows in partitions] == [
+                [user_data["username"]] for user_data in create_user_data_multi
+            ]
+
+    asyncio.run(_test())
+
+
+def test_update_user(
+    async_session_local,
+    create_user_data,
+):
+    """Can update a created User."""
+
+    async def _test():
+        async with async_session_local() as db:
+            created_user = await async_user.create(db, obj_in=create_user_data)
+
+            updated_user = await async_user.update(
+                db, db_obj=created_user, obj_in={"first_name": "John"}
+            )
+
+            assert updated_user.first_name == "John"
+
+    asyncio.run(_test())
+
+
+def test_update_user_by_uuid(
+    async_session_local,
+    create_user_data,
+):
+    """Can update a created User by uuid, getting back the updated row."""
+
+    async def _test():
+        async with async_session_local() as db:
+            created_user = await async_user.create(db, obj_in=create_user_data)
+
+            updated_row = await async_user.update_by_uuid(
+                db, uuid=created_user.uuid, obj_in={"first_name": "John"}
+            )
+            missing_row = await async_user.update_by_uuid(
+                db, uuid=uuid.uuid4(), obj_in={"first_name": "John"}
+            )
+
+            assert updated_row.first_name == "John"
+            assert missing_row is None
+
+    asyncio.run(_test())
+
+
+def test_remove_user(
+    async_session_local,
+    create_user_data,
+):
+    """Can remove a user."""
+
+    async def _test():
+        async with async_session_local() as db:
+            created_user = await async_user.create(db, obj_in=create_user_data)
+
+            _ = await async_user.remove(db, id=created_user.id)
+
+            assert await async_user.get_multi(db) == []
+
+    asyncio.run(_test())
+
+
+def test_remove_user_by_uuid(
+    async_session_local,
+    create_user_data,
+):
+    """Can remove a user by uuid, getting back its id."""
+
+    async def _test():
+        async with async_session_local() as db:
+            created_user = await async_user.create(db, obj_in=create_user_data)
+
+            removed_id = await async_user.remove_by_uuid(db, uuid=created_user.uuid)
+
+            assert removed_id == created_user.id
+            assert await async_user.remove_by_uuid(db, uuid=created_user.uuid) is None
+
+    asyncio.run(_test())
+
+
+def test_authenticate_user(
+    async_session_local,
+    create_user_data,
+):
+    """Authenticate username by username and password."""
+
+    async def _test():
+        async with async_session_local() as db:
+            created_user = await async_user.create(db, obj_in=create_user_data)
+
+            auth_user = await async_user.authenticate(
+                db,
+                username=create_user_data["username"],
+                password=create_user_data["password"],
+            )
+            wrong_password_user = await async_user.authenticate(
+                db,
+                username=create_user_data["username"],
+                password="invalid_password",
+            )
+
+            assert auth_user == created_user
+            assert not wrong_password_user
+
+    asyncio.run(_test())
+
+
+def test_authenticate_user_rehashes_outdated_password_hash(
+    async_session_local,
+    create_user_data,
+):
+    """A hash with another cost is replaced on a successful login."""
+
+    async def _test():
+        async with async_session_local() as db:
+            created_user = await async_user.create(db, obj_in=create_user_data)
+            created_user.password_hash = security.build_crypt_context(
+                PasswordHashSchemeEnum.bcrypt, bcrypt_rounds=4
+            ).hash(create_user_data["password"])
+            await db.commit()
+
+            auth_user = await async_user.authenticate(
+                db,
+                username=create_user_data["username"],
+                password=create_user_data["password"],
+            )
+
+            assert not security.pwd_context.needs_update(auth_user.password_hash)
+            assert await auth_user.verify_password_async(create_user_data["password"])
+
+    asyncio.run(_test())
+
+
+def test_update_user_password(
+    async_session_local,
+    create_user_data,
+):
+    """Update user password."""
+
+    async def _test():
+        async with async_session_local() as db:
+            created_user = await async_user.create(db, obj_in=create_user_data)
+
+            updated_user = await async_user.update_password(
+                db, db_user=created_user, new_password="new_password"
+            )
+
+            assert await updated_user.verify_password_async("new_password")
+            assert updated_user.token_version == 1
+            assert await async_user.get_token_version(db, uuid=created_user.uuid) == 1
+
+    asyncio.run(_test())
+
+
+def test_threadpool_crud_is_awaitable(
+    db_fixture: Session,
+    create_user_data,
+):
+    """The threadpool wrapper runs the sync CRUD methods as awaitables."""
+    threadpool_user = ThreadpoolCRUD(crud.user)
+
+    created_user = asyncio.run(
+        threadpool_user.create(db_fixture, obj_in=create_user_data)
+    )
+
+    assert created_user == crud.user.get_by_uuid(db_fixture, uuid=created_user.uuid)
+    assert threadpool_user.model is models.User
+
+
+def test_threadpool_crud_streams_as_async_iterator(
+    db_fixture: Session,
+    create_user_data,
+):
+    """The threadpool wrapper turns sync generators into async iterators."""
+    threadpool_user = ThreadpoolCRUD(crud.user)
+    created_user = crud.user.create(db_fixture, obj_in=create_user_data)
+
+    async def _test():
+        return [rows async for rows in threadpool_user.stream(db_fixture)]
+
+    partitions = asyncio.run(_test())
+
+    assert [[row.uuid for row in rows] for rows in partitions] == [[created_user.uuid]]
+
+
+def test_username_filter_skips_unknown_usernames(
+    async_session_local,
+    create_user_data,
+    create_user_data_multi,
+):
+    """Usernames ruled out by the username filter aren't looked up."""
+    username_filter = UsernameFilter(size=1024, hashes=4, refresh_seconds=60)
+    filtered_user = AsyncCRUDUser(models.User, username_filter=username_filter)
+
+    async def _test():
+        async with async_session_local() as db:
+            await async_user.create(db, obj_in=create_user_data)
+            assert await filtered_user.refresh_username_filter(db)
+            await filtered_user.create_multi(db, objs_in=create_user_data_multi)
+
+            with mock.patch.object(
+                security, "dummy_verify_password_async"
+            ) as dummy_verify, mock.patch.object(db, "execute") as execute:
+                assert not await filtered_user.authenticate(
+                    db, username="invalid", password="password"
+                )
+            dummy_verify.assert_awaited_once_with()
+            execute.assert_not_called()
+
+            for user_data in [create_user_data, *create_user_data_multi]:
+                username = user_data["username"]
+                assert await filtered_user._get_by_username(db, username=username)
+
+            removed = await filtered_user._get_by_username(
+                db, username=create_user_data["username"]
+            )
+            await filtered_user.remove_by_uuid(db, uuid=removed.uuid)
+            assert not username_filter.might_exist(create_user_data["username"])
+
+    asyncio.run(_test())
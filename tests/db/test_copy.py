@@ -0,0 +1,42 @@
+"""COPY loading tests."""
+
+from users_api.db.copy import CopyStream, copy_rows
+from users_api.models.user import User
+
+
+def test_copy_stream_reads_whole_lines():
+    """Rows are encoded as CSV, a few lines at a time."""
+    stream = CopyStream([("a", None, True), ("b,c", 'd"e', False)])
+
+    assert stream.read(1) == "a,,True\r\n"
+    assert stream.read(1) == '"b,c","d""e",False\r\n'
+    assert stream.read(1) == ""
+
+
+def test_copy_rows_skips_conflicts(db_fixture):
+    """Existing usernames, and repeated ones after the first, are skipped."""
+    db_fixture.add(User(username="existing", first_name="Old"))
+    db_fixture.commit()
+    rows = [
+        ("existing", "New"),
+        ("user1", "First"),
+        ("user2", None),
+        ("user1", "Second"),
+    ]
+
+    result = copy_rows(
+        db_fixture,
+        User,
+        ["username", "first_name"],
+        rows,
+        conflict_column="username",
+    )
+
+    assert result.rows == 4
+    assert result.inserted == 2
+    users = {user.username: user for user in db_fixture.query(User).order_by(User.id)}
+    assert users["existing"].first_name == "Old"
+    assert users["user1"].first_name == "First"
+    assert users["user2"].first_name is None
+    assert users["user2"].uuid is not None
+    assert users["user2"].is_superuser is False
@@ -0,0 +1,40 @@
+"""Database session tests."""
+
+import asyncio
+
+from pydantic import PostgresDsn
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from users_api.db import session
+
+
+def test_warm_up_pool(test_db_uri: PostgresDsn):
+    """Warming up the pool leaves the connections open and checked in."""
+    engine = create_engine(test_db_uri, pool_size=3)
+    try:
+        session.warm_up_pool(engine, 3)
+
+        assert engine.pool.checkedin() == 3
+        assert engine.pool.checkedout() == 0
+    finally:
+        engine.dispose()
+
+
+def test_warm_up_async_pool(test_db_uri: PostgresDsn):
+    """Warming up the async pool leaves the connections open and checked in."""
+
+    async def _test():
+        engine = create_async_engine(
+            test_db_uri.replace("postgresql://", "postgresql+asyncpg://", 1),
+            pool_size=3,
+        )
+        try:
+            await session.warm_up_async_pool(engine, 3)
+
+            assert engine.pool.checkedin() == 3
+            assert engine.pool.checkedout() == 0
+        finally:
+            await engine.dispose()
+
+    asyncio.run(_test())
@@ -20,3 +20,40 @@ def test_settings(client: TestClient):
     response = client.get("/settings")
 
     assert response.status_code == status.HTTP_200_OK
+
+
+def test_cache_stats(client: TestClient, mock_current_user_superuser):
+    """The User cache hit and miss counters are exposed to superusers."""
+    response = client.get("/cache")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert set(response.json()) == {"backend", "hits", "misses"}
+
+
+def test_cache_stats_unauthenticated(client: TestClient):
+    """The User cache counters require authentication."""
+    response = client.get("/cache")
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_cache_stats_forbidden(client: TestClient, mock_current_user):
+    """The User cache counters are only exposed to superusers."""
+    response = client.get("/cache")
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_jwks(client: TestClient):
+    """The JWK Set is cacheable, and not sent again if it didn't change."""
+    response = client.get("/.well-known/jwks.json")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"keys": []}
+    assert response.headers["cache-control"].startswith("public, max-age=")
+
+    response = client.get(
+        "/.well-known/jwks.json",
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
@@ -0,0 +1,85 @@
+"""Username filter tests."""
+
+from unittest import mock
+
+from users_api.bloom import CountingBloomFilter, UsernameFilter
+
+
+def test_counting_bloom_filter():
+    """Added items are found until removed, and counters are shared safely."""
+    bloom = CountingBloomFilter(size=1024, hashes=4)
+
+    bloom.add("john")
+    bloom.add("jane")
+    bloom.add("jane")
+
+    assert "john" in bloom
+    assert "jane" in bloom
+    assert "jack" not in bloom
+    bloom.remove("jane")
+    assert "jane" in bloom
+    bloom.remove("jane")
+    assert "jane" not in bloom
+    assert "john" in bloom
+    bloom.clear()
+    assert "john" not in bloom
+
+
+def test_username_filter_rules_out_nothing_until_built():
+    """Every username may exist until a first scan is loaded."""
+    username_filter = UsernameFilter(size=1024, hashes=4, refresh_seconds=1)
+    assert username_filter.stale
+    assert username_filter.might_exist("john")
+
+    username_filter.load([(1, "john"), (3, "jane")])
+    username_filter.mark_refreshed()
+
+    assert not username_filter.stale
+    assert username_filter.might_exist("john")
+    assert not username_filter.might_exist("jack")
+    # Ids skipped by the first scan are of rows removed long ago
+    assert username_filter.last_id == 3
+    assert username_filter.gap_ids == []
+
+
+def test_username_filter_scans_skipped_ids_again():
+    """Ids skipped by a refresh are scanned again, until they're too old."""
+    username_filter = UsernameFilter(size=1024, hashes=4, refresh_seconds=1)
+    username_filter.load([(1, "john")])
+    username_filter.mark_refreshed()
+
+    with mock.patch("time.monotonic", return_value=100):
+        username_filter.load([(4, "jack")])
+        username_filter.mark_refreshed()
+    assert username_filter.gap_ids == [2, 3]
+
+    with mock.patch("time.monotonic", return_value=120):
+        username_filter.load([(2, "jane"), (5, "joe")])
+        username_filter.mark_refreshed()
+    assert username_filter.might_exist("jane")
+    assert username_filter.gap_ids == [3]
+
+    with mock.patch("time.monotonic", return_value=100 + UsernameFilter.overlap):
+        username_filter.mark_refreshed()
+    assert username_filter.gap_ids == []
+
+
+def test_username_filter_created_and_removed_users():
+    """Users created and removed by this process are counted once."""
+    username_filter = UsernameFilter(size=1024, hashes=4, refresh_seconds=1)
+    username_filter.load([(1, "john")])
+    username_filter.mark_refreshed()
+
+    username_filter.add(2, "jane")
+    assert username_filter.might_exist("jane")
+    username_filter.load([(2, "jane")])
+    username_filter.discard(2, "jane")
+    assert not username_filter.might_exist("jane")
+
+    username_filter.discard(1, "john")
+    assert not username_filter.might_exist("john")
+
+    # Users never added are ignored, as they could share counters with others
+    username_filter.add(3, "jack")
+    username_filter.discard(9, "jack")
+    assert username_filter.might_exist("jack")
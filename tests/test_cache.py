@@ -0,0 +1,173 @@
+"""Cache tests."""
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from unittest import mock
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from tests.utils import FakeRedis
+from users_api import cache, crud, models
+
+
+def test_local_cache_expires_values():
+    """Values are not returned once their TTL has passed."""
+    local_cache = cache.LocalCache(max_size=10, ttl=60)
+    with mock.patch("users_api.cache.time.monotonic", return_value=1000):
+        local_cache.set("key", "value")
+        assert local_cache.get("key") == "value"
+    with mock.patch("users_api.cache.time.monotonic", return_value=1060):
+        assert local_cache.get("key") is None
+    assert len(local_cache) == 0
+
+
+def test_local_cache_evicts_least_recently_used():
+    """The least recently used values are evicted when the cache is full."""
+    local_cache = cache.LocalCache(max_size=2, ttl=60)
+    local_cache.set("a", "1")
+    local_cache.set("b", "2")
+    assert local_cache.get("a") == "1"
+
+    local_cache.set("c", "3")
+
+    assert local_cache.get("b") is None
+    assert local_cache.get("a") == "1"
+    assert local_cache.get("c") == "3"
+
+
+def test_local_cache_lease():
+    """A leased key is only filled if it wasn't invalidated since the lease."""
+    local_cache = cache.LocalCache(max_size=10, ttl=60)
+
+    lease = local_cache.lease("key")
+    assert lease is not None
+    assert local_cache.get("key") is None
+    # Another miss doesn't take over the lease
+    assert local_cache.lease("key") is None
+    assert local_cache.fill("key", lease, "value")
+    assert local_cache.get("key") == "value"
+    assert local_cache.lease("key") is None
+
+    local_cache.delete("key")
+    lease = local_cache.lease("key")
+    local_cache.delete("key")
+    assert not local_cache.fill("key", lease, "stale")
+    assert local_cache.get("key") is None
+
+
+def test_redis_cache_lease():
+    """The Redis backend takes leases and fills them atomically."""
+    client = mock.Mock()
+    redis_cache = cache.RedisCache(client, ttl=30)
+
+    client.set.return_value = True
+    lease = redis_cache.lease("key")
+    client.set.assert_called_once_with("users_api:key", lease, ex=30, nx=True)
+    client.get.return_value = lease.encode()
+    assert redis_cache.get("key") is None
+
+    client.eval.return_value = 0
+    assert not redis_cache.fill("key", lease, "value")
+    client.eval.assert_called_once_with(
+        cache.FILL_SCRIPT, 1, "users_api:key", lease, "value", 30
+    )
+
+    client.set.return_value = None
+    assert redis_cache.lease("key") is None
+
+
+def test_redis_cache():
+    """The Redis backend stores prefixed values with a TTL, and can be cleared."""
+    client = FakeRedis()
+    redis_cache = cache.RedisCache(client, ttl=30)
+
+    redis_cache.set("key", "value")
+    assert redis_cache.get("key") == "value"
+    assert client.expires["users_api:key"] == 30
+
+    redis_cache.delete("key")
+    assert redis_cache.get("key") is None
+
+    redis_cache.set("key", "value")
+    client.set("other:key", "value")
+    redis_cache.clear()
+    assert list(client.data) == ["other:key"]
+
+
+def test_model_cache_round_trip():
+    """Cached rows come back as detached objects with the same values."""
+    user_cache = cache.ModelCache(models.User, cache.RedisCache(FakeRedis(), ttl=30))
+    now = datetime.now(timezone.utc)
+    user = models.User(
+        id=1,
+        uuid=uuid.uuid4(),
+        username="username",
+        first_name=None,
+        last_name="Doe",
+        password_hash="hash",
+        is_superuser=True,
+        created_at=now,
+        updated_at=now,
+    )
+
+    assert user_cache.get(user.uuid) is None
+    user_cache.set(user)
+    cached_user = user_cache.get(user.uuid)
+
+    assert inspect(cached_user).detached
+    for column in models.User.__table__.columns:
+        assert getattr(cached_user, column.key) == getattr(user, column.key)
+    assert user_cache.stats() == {"backend": "RedisCache", "hits": 1, "misses": 1}
+
+    asyncio.run(user_cache.delete_async(user.uuid))
+    assert asyncio.run(user_cache.get_async(user.uuid)) is None
+
+
+def test_model_cache_excludes_columns(db_fixture: Session):
+    """Excluded columns aren't stored, and are loaded from the db when needed."""
+    client = FakeRedis()
+    user_cache = cache.ModelCache(
+        models.User, cache.RedisCache(client, ttl=30), exclude=("password_hash",)
+    )
+    user = crud.user.create(
+        db_fixture, obj_in={"username": "username", "password": "password"}
+    )
+
+    user_cache.set(user)
+    cached_user = user_cache.get(user.uuid)
+
+    assert all(b"hash" not in value for value in client.data.values())
+    assert "password_hash" in inspect(cached_user).unloaded
+    assert cached_user.username == user.username
+    db_fixture.expunge_all()
+    cached_user = db_fixture.merge(cached_user, load=False)
+    assert cached_user.verify_password("password")
+
+
+def test_null_cache_caches_nothing():
+    """The base backend, used when caching is disabled, never returns values."""
+    user_cache = cache.ModelCache(models.User, cache.CacheBackend())
+    user = models.User(uuid=uuid.uuid4(), username="username")
+
+    user_cache.set(user)
+
+    assert user_cache.get(user.uuid) is None
+
+
+def test_version_cache():
+    """Versions are cached as integers, under the backend's prefix."""
+    client = FakeRedis()
+    version_cache = cache.VersionCache(
+        cache.RedisCache(client, ttl=30, prefix="users_api:version:")
+    )
+    key = uuid.uuid4()
+
+    assert version_cache.get(key) is None
+    version_cache.set(key, 2)
+    assert version_cache.get(key) == 2
+    assert f"users_api:version:{key}" in client.data
+
+    asyncio.run(version_cache.delete_async(key))
+    assert asyncio.run(version_cache.get_async(key)) is None
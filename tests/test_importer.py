@@ -0,0 +1,94 @@
+"""User import tests."""
+
+import io
+
+import pytest
+
+from users_api import crud, importer, schemas
+from users_api.api import security
+from users_api.db.copy import CopyDataError
+
+
+def test_read_csv():
+    """Empty CSV values are left out, so fields get their defaults."""
+    file = io.StringIO("username,firstName,isSuperuser\nuser1,,true\nuser2,Ann,\n")
+
+    assert list(importer.read_csv(file)) == [
+        {"username": "user1", "isSuperuser": "true"},
+        {"username": "user2", "firstName": "Ann"},
+    ]
+
+
+def test_read_ndjson():
+    """Blank lines are skipped."""
+    file = io.StringIO('{"username": "user1"}\n\n{"username": "user2"}\n')
+
+    assert list(importer.read_ndjson(file)) == [
+        {"username": "user1"},
+        {"username": "user2"},
+    ]
+
+
+def test_parse_users_requires_a_password():
+    """Rows need a password or a password hash."""
+    users = importer.parse_users(
+        [{"username": "user1", "passwordHash": "hash"}, {"username": "user2"}]
+    )
+
+    assert next(users).password_hash == "hash"
+    with pytest.raises(importer.InvalidRowError, match="Row 2"):
+        next(users)
+
+
+def test_import_users(db_fixture):
+    """Passwords are hashed, precomputed hashes are kept and duplicates skipped."""
+    crud.user.create(
+        db_fixture, obj_in=schemas.UserCreateDB(username="user1", password="old")
+    )
+    password_hash = security.get_password_hash("precomputed")
+    users = importer.parse_users(
+        [
+            {"username": "user1", "password": "new"},
+            {"username": "user2", "password": "password2", "firstName": "Ann"},
+            {"username": "user3", "passwordHash": password_hash, "isSuperuser": True},
+            {"username": "user2", "password": "password3"},
+        ]
+    )
+    password_hasher = security.PasswordHasher(max_workers=2)
+
+    result = importer.import_users(
+        db_fixture, users, password_hasher=password_hasher, batch_size=1
+    )
+
+    assert result.rows == 4
+    assert result.inserted == 2
+    user1 = crud.user.authenticate(db_fixture, username="user1", password="old")
+    user2 = crud.user.authenticate(db_fixture, username="user2", password="password2")
+    user3 = crud.user.authenticate(db_fixture, username="user3", password="precomputed")
+    assert user1 and user2 and user3
+    assert user2.first_name == "Ann"
+    assert user3.is_superuser
+
+
+def test_seed_users(db_fixture):
+    """Seeding again only creates the missing Users."""
+    importer.seed_users(db_fixture, count=3, password="password")
+
+    result = importer.seed_users(db_fixture, count=5, password="password")
+
+    assert result == (5, 2)
+    assert crud.user.authenticate(db_fixture, username="user_4", password="password")
+
+
+def test_import_users_with_invalid_row(db_fixture):
+    """Nothing is imported if any row is invalid."""
+    users = importer.parse_users(
+        [{"username": "user1", "passwordHash": "hash"}, {"username": "user2"}]
+    )
+    password_hasher = security.PasswordHasher(max_workers=1)
+
+    with pytest.raises(CopyDataError, match="Row 2"):
+        importer.import_users(db_fixture, users, password_hasher=password_hasher)
+
+    db_fixture.rollback()
+    assert crud.user.get_multi(db_fixture) == []
@@ -0,0 +1,80 @@
+"""Prometheus metrics tests."""
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from pydantic import PostgresDsn
+from sqlalchemy import create_engine
+
+from tests.conftest import TEST_USER
+from users_api import metrics
+from users_api.db.pool import InstrumentedQueuePool
+
+
+def _sample(name: str, **labels: str) -> float:
+    """Get the current value of a metric sample, 0 if it doesn't exist yet."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_requests_are_labeled_by_route_template(
+    client: TestClient,
+    # override get_current_user to return TEST_USER
+    mock_current_user,
+):
+    """Requests are counted by route template, not by path."""
+    labels = {"method": "GET", "route": "/v1/users/{user_id}"}
+    count = _sample("http_requests_total", status="200", **labels)
+    size = _sample("http_response_size_bytes_sum", **labels)
+
+    response = client.get(f"/v1/users/{TEST_USER['uuid']}")
+    assert response.status_code == status.HTTP_200_OK, response.text
+
+    assert _sample("http_requests_total", status="200", **labels) == count + 1
+    assert _sample("http_request_duration_seconds_count", **labels) >= 1
+    assert _sample("http_response_size_bytes_sum", **labels) == size + len(
+        response.content
+    )
+    assert _sample("http_requests_in_progress", method="GET") == 0
+
+
+def test_unmatched_requests_share_a_label(client: TestClient):
+    """Requests that match no route don't create a label value per path."""
+    labels = {"method": "GET", "route": metrics.UNMATCHED_ROUTE, "status": "404"}
+    count = _sample("http_requests_total", **labels)
+
+    client.get("/does/not/exist")
+
+    assert _sample("http_requests_total", **labels) == count + 1
+
+
+def test_metrics_endpoint(client: TestClient):
+    """Metrics are exported in the Prometheus text format."""
+    client.get("/version")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/version",status="200"}' in (
+        response.text
+    )
+
+
+def test_engine_pool_metrics(test_db_uri: PostgresDsn):
+    """Pool stats, checkout wait times and query durations are recorded."""
+    engine = create_engine(test_db_uri, poolclass=InstrumentedQueuePool, pool_size=2)
+    metrics.instrument_engine(engine, "test")
+    checkouts = _sample("db_pool_checkout_wait_seconds_count", engine="sync")
+    try:
+        with engine.connect() as con:
+            con.execute("SELECT 1")
+            assert _sample("db_pool_checked_out_connections", engine="sync") == 1
+        assert _sample("db_pool_checked_out_connections", engine="sync") == 0
+        assert _sample("db_pool_size", engine="sync") == 2
+        assert _sample("db_pool_overflow_connections", engine="sync") == 0
+        assert _sample("db_query_duration_seconds_count", engine="test") == 1
+        assert _sample("db_pool_checkout_wait_seconds_count", engine="sync") == (
+            checkouts + 1
+        )
+    finally:
+        engine.dispose()
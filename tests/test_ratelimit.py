@@ -0,0 +1,147 @@
+"""Login rate limiting tests."""
+
+import asyncio
+from unittest import mock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from users_api import ratelimit
+
+LIMIT = ratelimit.RateLimit(burst=2, per_second=0.5)
+
+
+def test_local_token_buckets_refill():
+    """A bucket allows a burst, then one attempt per refilled token."""
+    buckets = ratelimit.LocalTokenBuckets(max_size=10)
+
+    with mock.patch("time.monotonic", return_value=100):
+        assert buckets.take([("key", LIMIT)]) == [0]
+        assert buckets.take([("key", LIMIT)]) == [0]
+        assert buckets.take([("key", LIMIT)]) == [2]
+        assert buckets.take([("other", LIMIT)]) == [0]
+    with mock.patch("time.monotonic", return_value=101):
+        assert buckets.take([("key", LIMIT)]) == [1]
+    with mock.patch("time.monotonic", return_value=102):
+        assert buckets.take([("key", LIMIT)]) == [0]
+        assert buckets.take([("key", LIMIT)]) == [2]
+
+
+def test_local_token_buckets_evict_least_recently_used():
+    """Buckets beyond the maximum size are dropped, refilling them."""
+    buckets = ratelimit.LocalTokenBuckets(max_size=2)
+    limit = ratelimit.RateLimit(burst=1, per_second=0.001)
+
+    buckets.take([("a", limit)])
+    buckets.take([("b", limit)])
+    buckets.take([("c", limit)])
+
+    assert len(buckets) == 2
+    assert buckets.take([("a", limit)]) == [0]
+    assert buckets.take([("c", limit)])[0] > 0
+
+
+def test_local_token_buckets_take_from_all_or_none():
+    """Tokens are only taken if every bucket has one."""
+    buckets = ratelimit.LocalTokenBuckets(max_size=10)
+    one = ratelimit.RateLimit(burst=1, per_second=0.5)
+
+    with mock.patch("time.monotonic", return_value=100):
+        assert buckets.take([("a", one)]) == [0]
+        assert buckets.take([("b", LIMIT), ("a", one)]) == [0, 2]
+        # The rejected attempt didn't take a token from b
+        assert buckets.take([("b", LIMIT)]) == [0]
+        assert buckets.take([("b", LIMIT)]) == [0]
+        assert buckets.take([("b", LIMIT)]) == [2]
+
+
+def test_redis_token_buckets():
+    """Buckets are updated atomically by a script, under the backend's prefix."""
+    client = mock.Mock()
+    client.eval.return_value = [b"0", b"1.5"]
+    buckets = ratelimit.RedisTokenBuckets(client)
+    other_limit = ratelimit.RateLimit(burst=5, per_second=0.1)
+
+    with mock.patch("time.time", return_value=1000.0):
+        waits = buckets.take([("ip:127.0.0.1", LIMIT), ("username:john", other_limit)])
+    assert waits == [0, 1.5]
+
+    client.eval.assert_called_once_with(
+        ratelimit.TAKE_SCRIPT,
+        2,
+        "users_api:ratelimit:ip:127.0.0.1",
+        "users_api:ratelimit:username:john",
+        1000.0,
+        2,
+        0.5,
+        5,
+        0.1,
+    )
+
+
+def test_login_rate_limiter():
+    """Attempts are limited by client IP and by username, counting rejections."""
+    limiter = ratelimit.LoginRateLimiter(
+        ratelimit.LocalTokenBuckets(max_size=10),
+        per_ip=ratelimit.RateLimit(burst=3, per_second=0.001),
+        per_username=LIMIT,
+    )
+    rejected = REGISTRY.get_sample_value(
+        "login_rate_limited_total", {"limit": "username"}
+    )
+
+    limiter.check(client_ip="10.0.0.1", username="john")
+    asyncio.run(limiter.check_async(client_ip="10.0.0.1", username="john"))
+    with pytest.raises(ratelimit.RateLimitExceededError) as exc_info:
+        limiter.check(client_ip="10.0.0.2", username="john")
+    assert exc_info.value.limit == "username"
+    assert exc_info.value.retry_after > 0
+    assert (
+        REGISTRY.get_sample_value("login_rate_limited_total", {"limit": "username"})
+        == (rejected or 0) + 1
+    )
+
+    # Attempts rejected by the username limit don't count against the IP limit
+    for _ in range(3):
+        with pytest.raises(ratelimit.RateLimitExceededError):
+            limiter.check(client_ip="10.0.0.3", username="john")
+    limiter.check(client_ip="10.0.0.3", username="jane")
+
+    limiter.check(client_ip="10.0.0.1", username="jane")
+    with pytest.raises(ratelimit.RateLimitExceededError) as exc_info:
+        limiter.check(client_ip="10.0.0.1", username="jack")
+    assert exc_info.value.limit == "ip"
+
+
+def test_login_rate_limiter_redis():
+    """With Redis, both limits are checked and counted by a single script call."""
+    client = mock.Mock()
+    client.eval.return_value = [b"0", b"30"]
+    limiter = ratelimit.LoginRateLimiter(
+        ratelimit.RedisTokenBuckets(client), per_ip=LIMIT, per_username=LIMIT
+    )
+
+    with pytest.raises(ratelimit.RateLimitExceededError) as exc_info:
+        limiter.check(client_ip="10.0.0.1", username="john")
+    assert exc_info.value.limit == "username"
+    assert exc_info.value.retry_after == 30
+    client.eval.assert_called_once()
+    assert client.eval.call_args.args[1:4] == (
+        2,
+        "users_api:ratelimit:ip:10.0.0.1",
+        "users_api:ratelimit:username:john",
+    )
+
+    client.eval.return_value = [b"0"]
+    limiter.check(client_ip=None, username="john")
+    assert client.eval.call_args.args[1:3] == (1, "users_api:ratelimit:username:john")
+
+
+def test_disabled_rate_limiter_allows_everything():
+    """The base backend, used when rate limiting is disabled, never limits."""
+    limiter = ratelimit.LoginRateLimiter(
+        ratelimit.TokenBuckets(), per_ip=LIMIT, per_username=LIMIT
+    )
+
+    for _ in range(10):
+        limiter.check(client_ip="10.0.0.1", username="john")
@@ -0,0 +1,74 @@
+"""Settings tests."""
+
+from unittest import mock
+
+import pytest
+from pydantic import ValidationError
+
+from users_api.settings import Settings
+
+
+def test_db_pool_settings():
+    """Pool settings are passed to create_engine."""
+    settings = Settings(
+        DB_POOL_SIZE=20,
+        DB_MAX_OVERFLOW=0,
+        DB_POOL_TIMEOUT=2.5,
+        DB_POOL_RECYCLE=3600,
+        DB_POOL_PRE_PING=False,
+    )
+
+    assert settings.get_db_pool_settings() == {
+        "pool_size": 20,
+        "max_overflow": 0,
+        "pool_timeout": 2.5,
+        "pool_recycle": 3600,
+        "pool_pre_ping": False,
+    }
+
+
+def test_db_pool_warmup_above_pool_size_is_invalid():
+    """The pool can't be warmed up with more connections than it keeps."""
+    assert Settings(DB_POOL_SIZE=5, DB_POOL_WARMUP=5).DB_POOL_WARMUP == 5
+    with pytest.raises(ValidationError):
+        Settings(DB_POOL_SIZE=5, DB_POOL_WARMUP=6)
+
+
+def test_gunicorn_settings():
+    """Gunicorn runs Uvicorn workers with the server settings."""
+    settings = Settings(
+        HOST="127.0.0.1",
+        PORT=8000,
+        WORKERS=3,
+        KEEP_ALIVE=10,
+        BACKLOG=128,
+        MAX_REQUESTS=500,
+        MAX_REQUESTS_JITTER=50,
+    )
+
+    gunicorn_settings = settings.get_gunicorn_settings()
+
+    assert gunicorn_settings["bind"] == "127.0.0.1:8000"
+    assert gunicorn_settings["workers"] == 3
+    assert gunicorn_settings["worker_class"] == "uvicorn.workers.UvicornWorker"
+    assert gunicorn_settings["keepalive"] == 10
+    assert gunicorn_settings["backlog"] == 128
+    assert gunicorn_settings["max_requests"] == 500
+    assert gunicorn_settings["max_requests_jitter"] == 50
+
+
+def test_gunicorn_workers_default_to_cpu_count():
+    """One worker is started per CPU unless WORKERS is set."""
+    with mock.patch("users_api.settings.os.cpu_count", return_value=6):
+        assert Settings().get_gunicorn_settings()["workers"] == 6
+
+
+def test_asymmetric_algorithm_requires_private_key(tmp_path):
+    """RS* and ES* tokens can't be signed without a private key file."""
+    key_file = tmp_path / "key.pem"
+    key_file.write_text("key")
+
+    settings = Settings(ALGORITHM="RS256", JWT_PRIVATE_KEY_FILE=key_file)
+    assert settings.JWT_PRIVATE_KEY_FILE == key_file
+    with pytest.raises(ValidationError):
+        Settings(ALGORITHM="ES256")
@@ -1,5 +1,6 @@
 """Testing utils."""
 
+import fnmatch
 import typing
 import uuid
 from datetime import datetime, timezone
@@ -38,6 +39,33 @@ class DependencyOverrider:
                 del self._app.dependency_overrides[dep]
 
 
+class FakeRedis:
+    """In-memory stand-in for a Redis client, with the methods used by RedisCache."""
+
+    def __init__(self) -> None:
+        """Initialize an empty FakeRedis."""
+        self.data: dict[str, bytes] = {}
+        self.expires: dict[str, int] = {}
+
+    def get(self, key: str) -> bytes | None:
+        """Get a value."""
+        return self.data.get(key)
+
+    def set(self, key: str, value: str, ex: int | None = None) -> None:
+        """Set a value, recording its expiry."""
+        self.data[key] = value.encode()
+        self.expires[key] = ex
+
+    def delete(self, *keys: str) -> None:
+        """Delete values."""
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match: str) -> typing.Iterator[str]:
+        """Iterate over the keys matching a glob pattern."""
+        return iter(fnmatch.filter(list(self.data), match))
+
+
 dt = datetime.now(timezone.utc)
 TEST_USER = {
     "id": 1,